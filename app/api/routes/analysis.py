@@ -0,0 +1,119 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.auth_deps import check_application_access, get_current_user
+from app.core.profiling import ProfiledRoute
+from app.models.analysis_models import AnalysisJob, AnalysisJobRequest
+from app.services.jobs_service import JobsService
+from app.utils.sse import SSE_HEADERS, format_sse
+
+router = APIRouter(
+    dependencies=[Depends(get_current_user)],
+    prefix="",
+    tags=["analysis"],
+    route_class=ProfiledRoute,
+)
+
+# Intervalo con el que el stream revisa el estado en memoria del job.
+STREAM_POLL_SECONDS = 0.5
+TERMINAL_STATUSES = {"done", "failed", "cancelled"}
+
+
+def get_jobs_service(request: Request) -> JobsService:
+    jobs_service: JobsService = request.app.state.jobs_service
+    if jobs_service is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return jobs_service
+
+
+def get_owned_job(request: Request, user: dict, job_id: str) -> dict:
+    """Job ``job_id`` si su aplicación es del usuario (404 si no existe, 403 si es ajena)."""
+    try:
+        job = get_jobs_service(request).get_job(job_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    check_application_access(request, user, job.get("application_id", ""))
+    return job
+
+
+@router.post("/analysis/jobs", response_model=AnalysisJob, status_code=202)
+def create_analysis_job(
+    body: AnalysisJobRequest,
+    request: Request,
+    git_user: str = Header(default="", alias="X-git-user"),
+    git_pat: str = Header(default="", alias="X-git-pat"),
+    user: dict = Depends(get_current_user),
+):
+    """Encola un análisis (código o funcional) de un módulo.
+
+    Las credenciales de git viajan por header y sólo se mantienen en memoria.
+    """
+    check_application_access(request, user, body.application_id)
+    jobs_service = get_jobs_service(request)
+    try:
+        return jobs_service.submit(body, credentials={"user": git_user, "token": git_pat})
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"{body.application_id} | Error al crear job de análisis: {e}")
+        raise HTTPException(status_code=500, detail="Error al crear el job de análisis")
+
+
+@router.get("/analysis/jobs/{job_id}", response_model=AnalysisJob)
+def get_analysis_job(job_id: str, request: Request, user: dict = Depends(get_current_user)):
+    return get_owned_job(request, user, job_id)
+
+
+@router.delete("/analysis/jobs/{job_id}", response_model=AnalysisJob)
+def cancel_analysis_job(job_id: str, request: Request, user: dict = Depends(get_current_user)):
+    get_owned_job(request, user, job_id)
+    try:
+        job = get_jobs_service(request).cancel(job_id)
+        request.app.state.logger.info(f"{job_id} | Cancelación de job solicitada")
+        return job
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+
+
+@router.get("/analysis/jobs/{job_id}/result")
+def get_analysis_result(job_id: str, request: Request, user: dict = Depends(get_current_user)):
+    jobs_service = get_jobs_service(request)
+    job = get_owned_job(request, user, job_id)
+    if job.get("status") != "done" or not job.get("result_path"):
+        raise HTTPException(status_code=409, detail=f"El job {job_id} no tiene resultado (estado: {job.get('status')})")
+    try:
+        return jobs_service.analysis.load_result(job["result_path"])
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail=f"El resultado del job {job_id} ya no está disponible")
+
+
+@router.get("/analysis/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str, request: Request, user: dict = Depends(get_current_user)):
+    """Stream SSE con el estado y los parciales del job hasta que termina."""
+    jobs_service = get_jobs_service(request)
+    _, job, _ = jobs_service.snapshot(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} no está activo en esta instancia")
+    check_application_access(request, user, job["application_id"])
+
+    async def events():
+        last_version = -1
+        while not await request.is_disconnected():
+            version, job, partial = jobs_service.snapshot(job_id)
+            if job is None:
+                return
+            if version != last_version:
+                last_version = version
+                payload = AnalysisJob.model_validate(job).model_dump(mode="json")
+                payload["partial_result"] = partial
+                terminal = job["status"] in TERMINAL_STATUSES
+                yield format_sse(payload, event=job["status"] if terminal else "progress", event_id=version)
+                if terminal:
+                    return
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
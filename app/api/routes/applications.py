@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from app.models.core_models import Application, Module, Repo
 from app.core.config import get_settings, Settings
 from app.services.apps_services import AppsService
+from app.services.change_feed_service import ChangeFeedService
+from app.services.graph_service import GraphService
 from app.utils.mocking import load_mock  # Para pruebas locales
-from app.core.auth_deps import get_current_user
+from app.core.auth_deps import (
+    check_application_access,
+    check_project_access,
+    get_current_user,
+    require_application_access,
+    require_project_access,
+    update_owner_index,
+)
+from app.core.graph_deps import graph_view_params
+from app.core.profiling import ProfiledRoute
+from app.services.graph_index import filter_graph
+from app.utils.graph_encoding import graph_response
 
 router = APIRouter(
     dependencies=[Depends(get_current_user)],
-    prefix="", tags=["applications"])
+    prefix="", tags=["applications"], route_class=ProfiledRoute)
 
 def get_services(request: Request) -> tuple[Settings, AppsService]:
     """Extrae dependencias compartidas desde el estado de la aplicación.
@@ -24,20 +37,52 @@ def get_services(request: Request) -> tuple[Settings, AppsService]:
         raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
     return settings, apps_service
 
+
+def get_change_feed(request: Request) -> ChangeFeedService:
+    change_feed: ChangeFeedService = request.app.state.change_feed
+    if change_feed is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return change_feed
+
+
+def refresh_graph(request: Request, application_id: str) -> None:
+    """Actualiza el fragmento de la aplicación en el grafo del proyecto.
+
+    El grafo es derivado: si falla se loguea y la escritura original sigue siendo válida.
+    """
+    graph_service: GraphService = request.app.state.graph_service
+    if graph_service is None:
+        return
+    try:
+        graph_service.on_application_changed(application_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"{application_id} | Error al actualizar el grafo de relaciones: {e}")
+
 @router.post(
     "/applications"
 )
 async def create_application(
     app_data: Application,
     request: Request,
+    user: dict = Depends(get_current_user),
 ):
+    check_project_access(request, user, app_data.project_id)
     settings, apps_service = get_services(request)
     try:
         apps_service.create_app(app_data)
+        update_owner_index(
+            request, app_data.id, lambda index: index.on_application_saved(app_data.id, app_data.project_id)
+        )
+        refresh_graph(request, app_data.id)
+        get_change_feed(request).mark_updated(settings.apps_collection, app_data.id)
         request.app.state.logger.info(f"{app_data.id} | Aplicación creada")
         return apps_service.get_app(app_data.id)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{app_data.id} | Error al crear aplicación: {e}")
         raise HTTPException(status_code=500, detail="Error al crear la aplicación")
@@ -48,30 +93,66 @@ async def create_application(
 async def update_application(
     app_data: Application,
     request: Request,
+    user: dict = Depends(get_current_user),
 ):
+    # Hay que ser dueño de la aplicación y del proyecto al que se mueve
+    check_application_access(request, user, app_data.id)
+    check_project_access(request, user, app_data.project_id)
     settings, apps_service = get_services(request)
+    owner_index = request.app.state.owner_index
     try:
+        previous_project_id = owner_index.application_project(app_data.id) if owner_index else None
         apps_service.update_app(app_data)
+        if previous_project_id != app_data.project_id:
+            update_owner_index(request, app_data.id, lambda index: index.on_application_saved(
+                app_data.id, app_data.project_id, previous_project_id=previous_project_id
+            ))
+        refresh_graph(request, app_data.id)
+        get_change_feed(request).mark_updated(settings.apps_collection, app_data.id)
         request.app.state.logger.info(f"{app_data.id} | Aplicación actualizada")
         return apps_service.get_app(app_data.id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{app_data.id} | Error al actualizar aplicación: {e}")
         raise HTTPException(status_code=500, detail="Error al actualizar la aplicación")
 
+@router.get(
+    "/applications/changes", dependencies=[Depends(require_project_access)]
+)
+def get_application_changes(
+    project_id: str,
+    request: Request,
+    since: str | None = Query(default=None, description="Token devuelto por la consulta anterior"),
+    limit: int = Query(default=500, ge=1, le=1000),
+):
+    """Aplicaciones del proyecto creadas, actualizadas o borradas desde ``since``."""
+    settings, _ = get_services(request)
+    try:
+        return get_change_feed(request).changes(
+            settings.apps_collection, since, limit=limit, project_id=project_id
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
 @router.get(
     "/applications/{app_id}"
 )
 def get_application(
     app_id: str,
     request: Request,
+    user: dict = Depends(get_current_user),
 ):
+    check_application_access(request, user, app_id)
     settings, apps_service = get_services(request)
     try:
         return apps_service.get_app(app_id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{app_id} | Error al obtener aplicación: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener la aplicación")
@@ -82,7 +163,9 @@ def get_application(
 def list_applications(
     project_id: str,
     request: Request,
+    user: dict = Depends(get_current_user),
 ):
+    check_project_access(request, user, project_id)
     settings, apps_service = get_services(request)
     try:
         apps = apps_service.list_apps(project_id)
@@ -97,7 +180,7 @@ def list_applications(
 
 
 @router.post(
-    "/applications/{application_id}/modules"
+    "/applications/{application_id}/modules", dependencies=[Depends(require_application_access)]
 )
 async def create_module(
     application_id: str,
@@ -107,16 +190,20 @@ async def create_module(
     settings, apps_service = get_services(request)
     try:
         apps_service.create_module(application_id, module)
+        refresh_graph(request, application_id)
+        get_change_feed(request).mark_updated(settings.apps_collection, application_id)
         request.app.state.logger.info(f"{application_id} | Módulo '{module.name}' creado")
         return apps_service.get_app(application_id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{application_id} | Error al crear módulo: {e}")
         raise HTTPException(status_code=500, detail="Error al crear el módulo")
 
 @router.put(
-    "/applications/{application_id}/modules"
+    "/applications/{application_id}/modules", dependencies=[Depends(require_application_access)]
 )
 async def update_module(
     application_id: str,
@@ -126,16 +213,20 @@ async def update_module(
     settings, apps_service = get_services(request)
     try:
         apps_service.update_module(application_id, module.name, module)
+        refresh_graph(request, application_id)
+        get_change_feed(request).mark_updated(settings.apps_collection, application_id)
         request.app.state.logger.info(f"{application_id} | Módulo '{module.name}' actualizado")
         return apps_service.get_app(application_id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{application_id} | Error al actualizar módulo: {e}")
         raise HTTPException(status_code=500, detail="Error al actualizar el módulo")
 
 @router.post(
-    "/applications/{application_id}/modules/{module_id}/repo"
+    "/applications/{application_id}/modules/{module_id}/repo", dependencies=[Depends(require_application_access)]
 )
 async def create_or_update_repo(
     application_id: str,
@@ -146,43 +237,73 @@ async def create_or_update_repo(
     settings, apps_service = get_services(request)
     try:
         apps_service.update_repo(application_id, module_id, repo)
+        refresh_graph(request, application_id)
+        get_change_feed(request).mark_updated(settings.apps_collection, application_id)
         request.app.state.logger.info(
             f"{application_id} | Repo actualizado para módulo '{module_id}'"
         )
         return apps_service.get_app(application_id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except HTTPException:
+        raise
     except Exception as e:
         request.app.state.logger.error(f"{application_id} | Error al actualizar repo: {e}")
         raise HTTPException(status_code=500, detail="Error al actualizar el repo")
 
         
 
-@router.get("/applications/{application_id}/tech-dependencies")
-def get_app_tech_dependencies(application_id: str, request: Request):
-    """
-    Mock: hoy siempre devuelve el mismo JSON.
-    A futuro: se reemplaza por lógica que depende de application_id.
+@router.get("/applications/{application_id}/tech-dependencies", dependencies=[Depends(require_application_access)])
+def get_app_tech_dependencies(application_id: str, request: Request, view: dict = Depends(graph_view_params)):
+    """Tecnologías que usa la aplicación, leídas del grafo materializado del proyecto.
+
+    Sin Firestore configurado devuelve el mock ``app_tech_dependencies``.
     """
-    request.app.state.logger.info(
-        f"{application_id} | MOCK tech dependencies solicitadas"
-    )
-    data = load_mock("app_tech_dependencies")
-    if isinstance(data, dict):
-        data["app_id"] = application_id  # útil desde ya, sin cambiar el mock base
-    return data
+    graph_service: GraphService = request.app.state.graph_service
+    if graph_service is None:
+        request.app.state.logger.info(
+            f"{application_id} | MOCK tech dependencies solicitadas"
+        )
+        data = load_mock("app_tech_dependencies")
+        if isinstance(data, dict):
+            data["app_id"] = application_id
+            # El primer nodo del mock es la aplicación consultada: se conserva siempre.
+            data = filter_graph(data, keep=[data["nodes"][0]["id"]] if data.get("nodes") else [], **view)
+        return graph_response(request, data)
+    try:
+        return graph_response(request, graph_service.get_app_tech_dependencies(application_id, **view))
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        request.app.state.logger.error(f"{application_id} | Error al obtener tech dependencies: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener las dependencias tecnológicas")
 
 
-@router.get("/applications/{application_id}/relations")
-def get_app_relations(application_id: str, request: Request):
-    """
-    Mock: hoy siempre devuelve el mismo JSON.
-    A futuro: se reemplaza por lógica que depende de application_id.
+@router.get("/applications/{application_id}/relations", dependencies=[Depends(require_application_access)])
+def get_app_relations(application_id: str, request: Request, view: dict = Depends(graph_view_params)):
+    """Dependencias de servicio de la aplicación, leídas del grafo materializado del proyecto.
+
+    Sin Firestore configurado devuelve el mock ``app_relations``.
     """
-    request.app.state.logger.info(
-        f"{application_id} | MOCK relations solicitadas"
-    )
-    data = load_mock("app_relations")
-    if isinstance(data, dict):
-        data["app_id"] = application_id
-    return data
+    graph_service: GraphService = request.app.state.graph_service
+    if graph_service is None:
+        request.app.state.logger.info(
+            f"{application_id} | MOCK relations solicitadas"
+        )
+        data = load_mock("app_relations")
+        if isinstance(data, dict):
+            data["app_id"] = application_id
+            # El primer nodo del mock es la aplicación consultada: se conserva siempre.
+            data = filter_graph(data, keep=[data["nodes"][0]["id"]] if data.get("nodes") else [], **view)
+        return graph_response(request, data)
+    try:
+        return graph_response(request, graph_service.get_app_relations(application_id, **view))
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        request.app.state.logger.error(f"{application_id} | Error al obtener relaciones: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener las relaciones")
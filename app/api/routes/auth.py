@@ -2,18 +2,26 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
-from app.core.auth_deps import get_current_user
+from app.core.auth_deps import get_current_user, require_admin
+from app.core.profiling import ProfiledRoute
 from app.models.auth_models import LoginRequest, LoginResponse, MeResponse
 from app.services.auth_service import AuthService
 
 
-router = APIRouter(prefix="/auth", tags=["Auth"])
+router = APIRouter(prefix="/auth", tags=["Auth"], route_class=ProfiledRoute)
 
 
 def get_auth_service(request: Request) -> AuthService:
     settings = request.app.state.settings
     db = request.app.state.firestore
-    return AuthService(db, session_ttl_hours=settings.session_ttl_hours)
+    return AuthService(
+        db,
+        session_ttl_hours=settings.session_ttl_hours,
+        users_collection=settings.users_collection,
+        emails_collection=settings.user_emails_collection,
+        user_sessions_collection=settings.user_sessions_collection,
+        password_rounds=settings.password_hash_rounds,
+    )
 
 
 @router.post("/login", response_model=LoginResponse)
@@ -25,9 +33,17 @@ def login(body: LoginRequest, request: Request, response: Response):
     if not user or not user.get("is_active", True):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
-    if not auth.verify_password(body.password, user.get("password_hash", "")):
+    valid, new_hash = auth.verify_and_update(body.password, user.get("password_hash", ""))
+    if not valid:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
+    if new_hash:
+        # El costo configurado cambió: se rehashea con la password en claro que ya tenemos
+        try:
+            auth.update_password_hash(user["id"], new_hash)
+        except Exception as e:
+            request.app.state.logger.error(f"No se pudo actualizar el hash de password de {user['id']}: {e}")
+
     session_id = auth.create_session(user)
 
     response.set_cookie(
@@ -57,16 +73,20 @@ def logout(request: Request, response: Response):
 
 
 @router.get("/me", response_model=MeResponse)
-def me(request: Request, user: dict = Depends(get_current_user)):
-    auth = get_auth_service(request)
-
-    db_user = auth.get_user_by_email(user["email"])
-    if not db_user:
-        raise HTTPException(status_code=401, detail="Usuario no encontrado")
-
+def me(user: dict = Depends(get_current_user)):
+    # El perfil viaja en la sesión (se actualiza al modificar el usuario): sin lecturas extra
     return MeResponse(
-        email=db_user["email"],
-        full_name=db_user.get("full_name", ""),
-        role=db_user.get("role", "user"),
-        id=db_user["id"]
+        email=user["email"],
+        full_name=user.get("full_name", ""),
+        role=user.get("role", "user"),
+        id=user["user_id"]
     )
+
+
+@router.get("/sessions/sweeper", dependencies=[Depends(require_admin)])
+def session_sweeper_stats(request: Request):
+    """Métricas del barrido de sesiones vencidas (sesiones borradas por corrida)."""
+    sweeper = request.app.state.session_sweeper
+    if sweeper is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return sweeper.stats()
@@ -0,0 +1,31 @@
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, REGISTRY, update_runtime_gauges
+
+router = APIRouter(tags=["metrics"])
+
+
+def check_metrics_token(request: Request) -> None:
+    """Exige ``Authorization: Bearer <METRICS_TOKEN>``; sin token configurado el endpoint no existe.
+
+    Está exento del control de admisión, así que no hace I/O: compara el token en
+    tiempo constante antes de armar la respuesta.
+    """
+    token = request.app.state.settings.metrics_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Token de métricas inválido", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Métricas del proceso en formato de texto de Prometheus."""
+    check_metrics_token(request)
+    # async: corre en el event loop, donde se puede leer el limiter del threadpool
+    update_runtime_gauges(request.app.state)
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
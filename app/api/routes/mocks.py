@@ -1,9 +1,12 @@
 import uuid
+import asyncio
 import hashlib
 from typing import Dict
-from fastapi import APIRouter, Header, Request, HTTPException
+from fastapi import APIRouter, Header, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.core_models import Project, Application, Module, Repo
 from app.utils.mocking import load_mock  # Para pruebas locales
+from app.utils.sse import SSE_HEADERS, format_sse
 
 router = APIRouter(prefix="", tags=["mock_analysis"])
 
@@ -168,3 +171,53 @@ def return_code_request_partial(
         f"MOCK | Code request analysis consultado parcial para la app dummy"
     )
     return load_mock("get_job_running")
+
+
+@router.get(
+    "/mocks/functional_analysis_request_stream/{job_id}"
+)
+async def stream_code_request(
+    job_id: str,
+    request: Request,
+    steps: int = Query(default=5, ge=1, le=100),
+    interval: float = Query(default=1.0, ge=0.0, le=30.0),
+    last_event_id: str = Header(default="", alias="Last-Event-ID"),
+):
+    """Stream SSE con el avance simulado de un job (reemplaza el polling a partial/full).
+
+    Emite un evento ``progress`` cada ``interval`` segundos durante ``steps`` pasos y
+    cierra con ``done``. Respeta ``Last-Event-ID`` para reanudar tras una reconexión.
+    """
+    request.app.state.logger.info(
+        f"MOCK | Stream de avance abierto para el job {job_id}"
+    )
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 1
+
+    async def events():
+        for step in range(start, steps + 1):
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(interval)
+            yield format_sse(
+                {
+                    "job_id": job_id,
+                    "status": "running",
+                    "progress": int(step * 100 / (steps + 1)),
+                    "partial_result": {"step": step, "total_steps": steps},
+                },
+                event="progress",
+                event_id=step,
+            )
+        await asyncio.sleep(interval)
+        yield format_sse(
+            {
+                "job_id": job_id,
+                "status": "done",
+                "progress": 100,
+                "result_url": f"/mocks/functional_analysis_request_full/{job_id}",
+            },
+            event="done",
+            event_id=steps + 1,
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,11 +1,20 @@
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 
 from app.models.core_models import Project
 from app.core.config import Settings
 from app.services.project_services import ProjectsService
-from app.core.auth_deps import get_current_user
+from app.services.change_feed_service import ChangeFeedService
+from app.services.graph_service import GraphService
+from app.services.summary_service import SummaryService
+from app.services.owner_index_service import OwnerIndexService
+from app.core.auth_deps import check_user_access, get_current_user, require_project_access, update_owner_index
+from app.core.graph_deps import graph_view_params
+from app.core.profiling import ProfiledRoute
+from app.services.graph_index import filter_graph
+from app.utils.graph_encoding import graph_response
 from app.models.project_responses import ProjectWithUserResponse
 from app.utils.mocking import load_mock  # Para pruebas locales
 
@@ -14,6 +23,7 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)],
     prefix="",
     tags=["project"],
+    route_class=ProfiledRoute,
 )
 
 
@@ -30,9 +40,18 @@ def get_services(request: Request) -> tuple[Settings, ProjectsService]:
     return settings, projects_service
 
 
+def get_change_feed(request: Request) -> ChangeFeedService:
+    change_feed: ChangeFeedService = request.app.state.change_feed
+    if change_feed is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return change_feed
+
+
 @router.post("/projects", response_model=ProjectWithUserResponse)
-async def create_project(project_data: Project, request: Request):
-    _, project_service = get_services(request)
+async def create_project(project_data: Project, request: Request, user: dict = Depends(get_current_user)):
+    check_user_access(user, project_data.user_id)
+    settings, project_service = get_services(request)
+    change_feed = get_change_feed(request)
 
     # ✅ Si viene vacío, generamos id
     if not project_data.id:
@@ -40,6 +59,8 @@ async def create_project(project_data: Project, request: Request):
 
     try:
         project_service.create_project(project_data)
+        change_feed.mark_updated(settings.projects_collection, project_data.id)
+        update_owner_index(request, project_data.id, lambda index: index.on_project_saved(project_data.id))
 
         request.app.state.logger.info(
             f"{project_data.id} | Proyecto creado con el nombre {project_data.name}"
@@ -49,39 +70,86 @@ async def create_project(project_data: Project, request: Request):
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("/projects/{project_id}", response_model=ProjectWithUserResponse)
+@router.put("/projects/{project_id}", response_model=ProjectWithUserResponse, dependencies=[Depends(require_project_access)])
 async def update_project(project_id: str, body: ProjectUpdateRequest, request: Request):
-    _, project_service = get_services(request)
+    settings, project_service = get_services(request)
+    change_feed = get_change_feed(request)
+
+    owner_index: OwnerIndexService = request.app.state.owner_index
 
     try:
+        previous_owner = owner_index.owner_of(project_id) if owner_index else None
         project_service.update_project(
             project_id, project_name=body.name, user_id=body.user_id
         )
+        change_feed.mark_updated(settings.projects_collection, project_id)
+        update_owner_index(
+            request, project_id, lambda index: index.on_project_saved(project_id, previous_owner=previous_owner)
+        )
         return project_service.get_project(project_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/projects/{project_id}", response_model=dict)
+@router.delete("/projects/{project_id}", response_model=dict, dependencies=[Depends(require_project_access)])
 async def delete_project(project_id: str, request: Request):
-    _, project_service = get_services(request)
+    settings, project_service = get_services(request)
+    change_feed = get_change_feed(request)
+
+    owner_index: OwnerIndexService = request.app.state.owner_index
 
     try:
+        previous = owner_index.project_entry(project_id) if owner_index else {}
         project_service.delete_project(project_id)
+        change_feed.mark_deleted(settings.projects_collection, project_id, user_id=previous.get("user_id"))
+        update_owner_index(
+            request,
+            project_id,
+            lambda index: index.on_project_deleted(project_id, previous.get("user_id"), previous.get("applications")),
+        )
+        if request.app.state.graph_service is not None:
+            request.app.state.graph_service.on_project_deleted(project_id)
+        if request.app.state.summary_service is not None:
+            request.app.state.summary_service.delete_project(project_id)
         return {"ok": True, "deleted_project_id": project_id}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/projects/{project_id}", response_model=ProjectWithUserResponse)
+@router.get("/projects/changes", response_model=dict)
+def get_project_changes(
+    request: Request,
+    since: str | None = Query(default=None, description="Token devuelto por la consulta anterior"),
+    limit: int = Query(default=500, ge=1, le=1000),
+    user: dict = Depends(get_current_user),
+):
+    """Proyectos creados, actualizados o borrados desde ``since``.
+
+    Los admin ven todos; el resto sólo los propios (filtro ``user_id`` en la consulta).
+    """
+    settings, _ = get_services(request)
+    user_id = None if user.get("role") == "admin" else user["user_id"]
+    try:
+        return get_change_feed(request).changes(settings.projects_collection, since, limit=limit, user_id=user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/projects/{project_id}", response_model=ProjectWithUserResponse, dependencies=[Depends(require_project_access)])
 def get_project(project_id: str, request: Request):
     service = ProjectsService(request.app.state.settings, request.app.state.logger)
     return service.get_project(project_id)
@@ -94,21 +162,131 @@ def list_projects(request: Request):
 
 
 @router.get("/projects/by-user/{user_id}", response_model=list[ProjectWithUserResponse])
-def get_projects_by_user(user_id: str, request: Request):
+def get_projects_by_user(user_id: str, request: Request, user: dict = Depends(get_current_user)):
+    """Proyectos del usuario, leídos del índice por dueño (una sola lectura)."""
+    check_user_access(user, user_id)
+    owner_index: OwnerIndexService = request.app.state.owner_index
+    if owner_index is not None:
+        return owner_index.list_projects(user_id)
     service = ProjectsService(request.app.state.settings, request.app.state.logger)
     return service.list_projects_by_user_id(user_id)
 
 
-@router.get("/projects/{project_id}/relations")
-def get_project_relations(project_id: str, request: Request):
-    """
-    Mock: hoy siempre devuelve el mismo JSON.
-    A futuro: se reemplaza por lógica que depende de project_id.
+@router.get("/projects/{project_id}/summary", dependencies=[Depends(require_project_access)])
+def get_project_summary(project_id: str, request: Request):
+    """Totales del proyecto (aplicaciones, módulos, sistemas externos, tecnologías)."""
+    summary_service: SummaryService = request.app.state.summary_service
+    if summary_service is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    try:
+        return summary_service.get_project_summary(project_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"{project_id} | Error al obtener el resumen del proyecto: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener el resumen del proyecto")
+
+
+@router.get("/projects/{project_id}/relations", dependencies=[Depends(require_project_access)])
+def get_project_relations(project_id: str, request: Request, view: dict = Depends(graph_view_params)):
+    """Grafo de relaciones materializado del proyecto.
+
+    Sin Firestore configurado devuelve el mock ``project_relations``.
     """
-    request.app.state.logger.info(
-        f"{project_id} | MOCK project relations solicitadas"
-    )
-    data = load_mock("project_relations")
-    if isinstance(data, dict):
-        data["project_id"] = project_id  # útil desde ya, sin cambiar el mock base
-    return data
+    graph_service: GraphService = request.app.state.graph_service
+    if graph_service is None:
+        request.app.state.logger.info(
+            f"{project_id} | MOCK project relations solicitadas"
+        )
+        data = load_mock("project_relations")
+        if isinstance(data, dict):
+            data["project_id"] = project_id  # útil desde ya, sin cambiar el mock base
+            data = filter_graph(data, **view)
+        return graph_response(request, data)
+    try:
+        if not view["filters"] and view["include_metadata"]:
+            return graph_response(request, graph_service.get_project_graph(project_id))
+        return graph_response(request, graph_service.get_project_view(project_id, **view))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        request.app.state.logger.error(f"{project_id} | Error al obtener el grafo del proyecto: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener las relaciones del proyecto")
+
+
+def get_graph_service(request: Request) -> GraphService:
+    graph_service: GraphService = request.app.state.graph_service
+    if graph_service is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return graph_service
+
+
+def run_graph_query(request: Request, project_id: str, query, encode: bool = False):
+    graph_service = get_graph_service(request)
+    try:
+        result = query(graph_service.get_project_index(project_id))
+        return graph_response(request, result) if encode else result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        request.app.state.logger.error(f"{project_id} | Error en consulta de grafo: {e}")
+        raise HTTPException(status_code=500, detail="Error al consultar el grafo del proyecto")
+
+
+@router.get("/projects/{project_id}/graph/neighbors", dependencies=[Depends(require_project_access)])
+def get_graph_neighbors(
+    project_id: str,
+    request: Request,
+    node_id: str = Query(..., description="Nodo desde el que se expande el vecindario"),
+    depth: int = Query(default=1, ge=1, le=6),
+    direction: Literal["out", "in", "both"] = Query(default="both"),
+):
+    """Vecindario a ``depth`` saltos de un nodo (``out``: de qué depende, ``in``: quién depende de él)."""
+    return run_graph_query(request, project_id, lambda g: g.neighborhood(node_id, depth, direction), encode=True)
+
+
+@router.get("/projects/{project_id}/graph/path", dependencies=[Depends(require_project_access)])
+def get_graph_path(
+    project_id: str,
+    request: Request,
+    source: str = Query(...),
+    target: str = Query(...),
+    directed: bool = Query(default=False, description="Seguir sólo aristas source → target"),
+):
+    """Camino más corto entre dos nodos del grafo del proyecto."""
+    return run_graph_query(request, project_id, lambda g: g.shortest_path(source, target, directed), encode=True)
+
+
+@router.get("/projects/{project_id}/graph/diff", dependencies=[Depends(require_project_access)])
+def get_graph_diff(
+    project_id: str,
+    request: Request,
+    from_job: str = Query(..., description="Job cuyo grafo se toma como base"),
+    to_job: str | None = Query(default=None, description="Job a comparar; si se omite, el grafo actual"),
+):
+    """Nodos y aristas agregados, quitados y cambiados entre dos análisis (o contra el grafo actual)."""
+    graph_service = get_graph_service(request)
+    try:
+        return graph_service.diff(project_id, from_job, to_job)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"{project_id} | Error al calcular el diff del grafo: {e}")
+        raise HTTPException(status_code=500, detail="Error al calcular el diff del grafo")
+
+
+@router.get("/projects/{project_id}/graph/impact", dependencies=[Depends(require_project_access)])
+def get_graph_impact(
+    project_id: str,
+    request: Request,
+    node_id: str = Query(...),
+    max_depth: int | None = Query(default=None, ge=1, le=20),
+):
+    """Nodos afectados si ``node_id`` falla, ponderados por criticidad y distancia."""
+    return run_graph_query(request, project_id, lambda g: g.impact(node_id, max_depth))
@@ -0,0 +1,40 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.core.auth_deps import check_project_access, get_current_user, owned_project_ids
+from app.core.profiling import ProfiledRoute
+from app.services.search_service import SearchService
+
+router = APIRouter(
+    dependencies=[Depends(get_current_user)],
+    prefix="",
+    tags=["search"],
+    route_class=ProfiledRoute,
+)
+
+
+@router.get("/search")
+def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar (sin distinguir acentos; admite prefijos)"),
+    kind: list[Literal["project", "application", "module"]] | None = Query(default=None),
+    project_id: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    user: dict = Depends(get_current_user),
+):
+    """Busca proyectos, aplicaciones y módulos por nombre o descripción (sólo de los proyectos propios salvo admin)."""
+    search_service: SearchService = request.app.state.search_service
+    if search_service is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    if project_id:
+        check_project_access(request, user, project_id)
+    return search_service.search(
+        q,
+        kinds=kind,
+        project_id=project_id,
+        project_ids=owned_project_ids(request, user),
+        limit=limit,
+        offset=offset,
+    )
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.core.auth_deps import check_project_access, get_current_user, owned_project_ids
+from app.core.profiling import ProfiledRoute
+from app.services.tech_index_service import TechIndexService
+
+router = APIRouter(
+    dependencies=[Depends(get_current_user)],
+    prefix="",
+    tags=["technologies"],
+    route_class=ProfiledRoute,
+)
+
+
+def get_tech_index(request: Request) -> TechIndexService:
+    tech_index: TechIndexService = request.app.state.tech_index
+    if tech_index is None:
+        raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
+    return tech_index
+
+
+@router.get("/technologies")
+def list_technologies(
+    request: Request,
+    lifecycle: list[str] | None = Query(default=None, description="Lifecycle(s), p. ej. eol, deprecated, supported"),
+    risk: list[str] | None = Query(default=None, description="Riesgo(s): HIGH, MEDIUM, LOW"),
+    name: str | None = Query(default=None, description="Nombre de la tecnología (sin versión)"),
+    project_id: str | None = Query(default=None, description="Restringe las aplicaciones a un proyecto"),
+    limit: int = Query(default=200, ge=1, le=1000),
+    user: dict = Depends(get_current_user),
+):
+    """Tecnologías en uso en el portafolio con las aplicaciones y módulos que las usan.
+
+    Salvo para admin, sólo se listan las aplicaciones de proyectos propios.
+    """
+    if project_id:
+        check_project_access(request, user, project_id)
+    tech_index = get_tech_index(request)
+    try:
+        return tech_index.query(
+            lifecycle=lifecycle,
+            risk=risk,
+            name=name,
+            project_id=project_id,
+            project_ids=owned_project_ids(request, user),
+            limit=limit,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"Error al consultar el índice de tecnologías: {e}")
+        raise HTTPException(status_code=500, detail="Error al consultar el índice de tecnologías")
+
+
+@router.get("/technologies/{tech_id}")
+def get_technology(tech_id: str, request: Request, user: dict = Depends(get_current_user)):
+    """Aplicaciones y módulos que usan una tecnología/versión (id de nodo ``TECH_...``)."""
+    tech_index = get_tech_index(request)
+    try:
+        return tech_index.get_technology(tech_id, project_ids=owned_project_ids(request, user))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        request.app.state.logger.error(f"{tech_id} | Error al consultar el índice de tecnologías: {e}")
+        raise HTTPException(status_code=500, detail="Error al consultar el índice de tecnologías")
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
-from app.core.auth_deps import require_admin
+from app.core.auth_deps import get_auth_service, require_admin
+from app.core.profiling import ProfiledRoute
 from app.models.user_crud_models import UserCreateRequest, UserReadModel, UserUpdateRequest
+from app.services.email_index import email_key
 from app.services.user_services import UsersService
 
 
@@ -11,6 +13,7 @@ router = APIRouter(
     prefix="",
     tags=["users"],
     dependencies=[Depends(require_admin)],  # ✅ Solo admin
+    route_class=ProfiledRoute,
 )
 
 
@@ -21,6 +24,18 @@ def _svc(request: Request) -> UsersService:
     return svc
 
 
+def _user_id(user) -> str:
+    return user["id"] if isinstance(user, dict) else user.id
+
+
+def _profile(user) -> dict | None:
+    """Perfil a embeber en las sesiones del usuario (``None`` si quedó inactivo)."""
+    data = user if isinstance(user, dict) else user.model_dump()
+    if not data.get("is_active", True):
+        return None
+    return {"email": data.get("email"), "full_name": data.get("full_name", ""), "role": data.get("role", "user")}
+
+
 @router.get("/users", response_model=list[UserReadModel])
 def list_users(
     request: Request,
@@ -28,6 +43,8 @@ def list_users(
 ):
     try:
         return _svc(request).list_users(include_inactive=include_inactive)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -38,14 +55,28 @@ def get_user(user_id: str, request: Request):
         return _svc(request).get_user(user_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/users", response_model=UserReadModel)
 def create_user(body: UserCreateRequest, request: Request):
+    email_index = request.app.state.email_index
     try:
-        return _svc(request).create_user(body)
+        svc = _svc(request)
+        # La reserva en el índice de emails es la que garantiza unicidad ante altas concurrentes
+        email_index.reserve(body.email)
+        try:
+            user = svc.create_user(body)
+        except Exception:
+            email_index.release(body.email, user_id=None)
+            raise
+        email_index.bind(body.email, _user_id(user))
+        return user
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -56,8 +87,25 @@ def create_user(body: UserCreateRequest, request: Request):
 
 @router.put("/users/{user_id}", response_model=UserReadModel)
 def update_user(user_id: str, body: UserUpdateRequest, request: Request):
+    email_index = request.app.state.email_index
     try:
-        return _svc(request).update_user(user_id, body)
+        svc = _svc(request)
+        previous_email = email_index.current_email(user_id) if body.email else None
+        changes_email = bool(body.email) and email_key(body.email) != email_key(previous_email)
+        if changes_email:
+            email_index.reserve(body.email)
+        try:
+            user = svc.update_user(user_id, body)
+        except Exception:
+            if changes_email:
+                email_index.release(body.email, user_id=None)
+            raise
+        if changes_email:
+            email_index.bind(body.email, user_id, previous_email=previous_email)
+        get_auth_service(request).refresh_user_sessions(user_id, _profile(user))
+        return user
+    except HTTPException:
+        raise
     except ValueError as e:
         # 404 si no existe, 400 si es validación (email repetido)
         msg = str(e)
@@ -76,8 +124,18 @@ def delete_user(
     request: Request,
     hard: bool = Query(default=False),
 ):
+    email_index = request.app.state.email_index
     try:
-        return _svc(request).delete_user(user_id, hard=hard)
+        svc = _svc(request)
+        previous_email = email_index.current_email(user_id) if hard else None
+        result = svc.delete_user(user_id, hard=hard)
+        # El borrado lógico conserva el email (el usuario puede reactivarse)
+        if hard:
+            email_index.release(previous_email, user_id=user_id)
+        get_auth_service(request).refresh_user_sessions(user_id, None)
+        return result
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
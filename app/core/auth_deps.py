@@ -3,15 +3,26 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, Request
 
+from app.core.profiling import profile_phase
 from app.services.auth_service import AuthService
 
 
 def get_auth_service(request: Request) -> AuthService:
-    settings = request.app.state.settings
     db = request.app.state.firestore
     if db is None:
         raise HTTPException(status_code=503, detail="Firestore no está configurado. Configurá credenciales de GCP en Vercel.")
-    return AuthService(db, session_ttl_hours=settings.session_ttl_hours)
+    return build_auth_service(db, request.app.state.settings)
+
+
+def build_auth_service(db, settings) -> AuthService:
+    return AuthService(
+        db,
+        session_ttl_hours=settings.session_ttl_hours,
+        users_collection=settings.users_collection,
+        emails_collection=settings.user_emails_collection,
+        user_sessions_collection=settings.user_sessions_collection,
+        password_rounds=settings.password_hash_rounds,
+    )
 
 
 def get_current_user(request: Request, auth: AuthService = Depends(get_auth_service)) -> dict:
@@ -21,23 +32,88 @@ def get_current_user(request: Request, auth: AuthService = Depends(get_auth_serv
     if not session_id:
         raise HTTPException(status_code=401, detail="No autenticado")
 
-    sess = auth.get_session(session_id)
-    if not sess:
-        raise HTTPException(status_code=401, detail="Sesión inválida")
+    # Fase "auth" del perfil del request (Server-Timing)
+    with profile_phase("auth", "get_current_user"):
+        sess = auth.get_session(session_id)
+        if not sess:
+            raise HTTPException(status_code=401, detail="Sesión inválida")
+
+        if auth.is_session_expired(sess):
+            auth.delete_session(session_id, user_id=sess.get("user_id"))
+            raise HTTPException(status_code=401, detail="Sesión expirada")
 
-    if auth.is_session_expired(sess):
-        auth.delete_session(session_id)
-        raise HTTPException(status_code=401, detail="Sesión expirada")
+        profile = auth.session_profile(sess)
+        if profile is None:
+            auth.delete_session(session_id, user_id=sess.get("user_id"))
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
 
-    return {
-        "user_id": sess.get("user_id"),
-        "email": sess.get("email"),
-        "role": sess.get("role", "user"),
-        "session_id": session_id,
-    }
+    return {**profile, "session_id": session_id}
 
 
 def require_admin(user: dict = Depends(get_current_user)) -> dict:
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Requiere rol admin")
     return user
+
+
+def check_project_access(request: Request, user: dict, project_id: str) -> None:
+    """403 si el usuario no es dueño del proyecto (los admin ven todo).
+
+    Usa el índice por dueño (``OwnerIndexService``, cacheado por usuario); sin Firestore
+    configurado no hay índice y no se chequea.
+    """
+    owner_index = getattr(request.app.state, "owner_index", None)
+    if owner_index is None or user.get("role") == "admin":
+        return
+    if not owner_index.owns_project(user["user_id"], project_id):
+        raise HTTPException(status_code=403, detail="Sin acceso al proyecto")
+
+
+def check_application_access(request: Request, user: dict, app_id: str) -> None:
+    """403 si la aplicación no pertenece a un proyecto del usuario (los admin ven todo)."""
+    owner_index = getattr(request.app.state, "owner_index", None)
+    if owner_index is None or user.get("role") == "admin":
+        return
+    if not owner_index.owns_application(user["user_id"], app_id):
+        raise HTTPException(status_code=403, detail="Sin acceso a la aplicación")
+
+
+def owned_project_ids(request: Request, user: dict) -> frozenset[str] | None:
+    """Proyectos visibles para el usuario; ``None`` si ve todos (admin o sin índice)."""
+    owner_index = getattr(request.app.state, "owner_index", None)
+    if owner_index is None or user.get("role") == "admin":
+        return None
+    return owner_index.project_ids(user["user_id"])
+
+
+def update_owner_index(request: Request, entity_id: str, write) -> None:
+    """Aplica ``write(owner_index)`` tras guardar un proyecto o aplicación.
+
+    El índice es derivado y la entidad ya se guardó: si falla se loguea y el request
+    sigue (como ``mark_updated``).
+    """
+    owner_index = getattr(request.app.state, "owner_index", None)
+    if owner_index is None:
+        return
+    try:
+        write(owner_index)
+    except Exception as e:
+        request.app.state.logger.error(f"{entity_id} | No se pudo actualizar el índice por dueño: {e}")
+
+
+def check_user_access(user: dict, user_id: str) -> None:
+    """403 si se piden datos de otro usuario sin ser admin."""
+    if user.get("role") != "admin" and user.get("user_id") != user_id:
+        raise HTTPException(status_code=403, detail="Sin acceso a los datos de otro usuario")
+
+
+def require_project_access(project_id: str, request: Request, user: dict = Depends(get_current_user)) -> dict:
+    check_project_access(request, user, project_id)
+    return user
+
+
+def require_application_access(
+    application_id: str, request: Request, user: dict = Depends(get_current_user)
+) -> dict:
+    check_application_access(request, user, application_id)
+    return user
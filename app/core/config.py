@@ -21,6 +21,45 @@ class Settings:
     session_cookie_name: str
     google_application_credentials: str | None = None 
     users_collection: str = "users"
+    user_emails_collection: str = "user_emails"
+    user_sessions_collection: str = "user_sessions"
+    tombstones_collection: str = "tombstones"
+    jobs_collection: str = "analysis_jobs"
+    graphs_collection: str = "relation_graphs"
+    tech_index_collection: str = "tech_index"
+    counters_collection: str = "project_counters"
+    counter_shards: int = 8
+    search_sync_seconds: float = 5.0
+    owner_index_collection: str = "user_projects"
+    owner_cache_seconds: float = 60.0
+    session_sweep_seconds: float = 900.0
+    session_sweep_page_size: int = 200
+    session_sweep_max_deletes: int = 2000
+    password_hash_rounds: int = 0
+    profile_slow_request_ms: float = 1000.0
+    metrics_token: str = ""
+    rate_limit_per_second: float = 10.0
+    rate_limit_burst: float = 60.0
+    rate_limit_backend: str = "memory"
+    trusted_proxy_hops: int = 0
+    max_concurrent_requests: int = 32
+    max_queued_requests: int = 64
+    queue_timeout_seconds: float = 5.0
+    request_budget_seconds: float = 20.0
+    firestore_call_timeout_seconds: float = 10.0
+    firestore_read_retries: int = 3
+    breaker_error_rate: float = 0.5
+    breaker_min_calls: int = 20
+    breaker_window_seconds: float = 30.0
+    breaker_open_seconds: float = 15.0
+    ollama_host: str = "http://localhost:11434"
+    ollama_model: str = "qwen2.5:7b-instruct"
+    repos_dir: str = "/tmp/repos"
+    analysis_dir: str = "/tmp/analysis"
+    analysis_workers: int = 2
+    analysis_tenant_concurrency: int = 1
+    analysis_cache_max_mb: int = 1024
+    repos_cache_max_mb: int = 10240
 
 
 @lru_cache()
@@ -124,6 +163,264 @@ def get_settings() -> Settings:
         "USERS_COLLECTION",
         cfg.get("GCP", "users_collection", fallback="users"),
     )
+    user_emails_collection = os.environ.get(
+        "USER_EMAILS_COLLECTION",
+        cfg.get("GCP", "user_emails_collection", fallback="user_emails"),
+    )
+    user_sessions_collection = os.environ.get(
+        "USER_SESSIONS_COLLECTION",
+        cfg.get("GCP", "user_sessions_collection", fallback="user_sessions"),
+    )
+
+    # -------------------------------------------------------------------------
+    # Change feed (lápidas de documentos borrados)
+    # -------------------------------------------------------------------------
+    tombstones_collection = os.environ.get(
+        "TOMBSTONES_COLLECTION",
+        cfg.get("GCP", "tombstones_collection", fallback="tombstones"),
+    )
+
+    # -------------------------------------------------------------------------
+    # Análisis (jobs, modelo y directorios de trabajo)
+    # -------------------------------------------------------------------------
+    jobs_collection = os.environ.get(
+        "JOBS_COLLECTION",
+        cfg.get("GCP", "jobs_collection", fallback="analysis_jobs"),
+    )
+
+    graphs_collection = os.environ.get(
+        "GRAPHS_COLLECTION",
+        cfg.get("GCP", "graphs_collection", fallback="relation_graphs"),
+    )
+
+    tech_index_collection = os.environ.get(
+        "TECH_INDEX_COLLECTION",
+        cfg.get("GCP", "tech_index_collection", fallback="tech_index"),
+    )
+
+    counters_collection = os.environ.get(
+        "COUNTERS_COLLECTION",
+        cfg.get("GCP", "counters_collection", fallback="project_counters"),
+    )
+
+    counter_shards = int(
+        os.environ.get(
+            "COUNTER_SHARDS",
+            cfg.get("GCP", "counter_shards", fallback="8"),
+        )
+    )
+
+    owner_index_collection = os.environ.get(
+        "OWNER_INDEX_COLLECTION",
+        cfg.get("GCP", "owner_index_collection", fallback="user_projects"),
+    )
+
+    owner_cache_seconds = float(
+        os.environ.get(
+            "OWNER_CACHE_SECONDS",
+            cfg.get("General", "owner_cache_seconds", fallback="60"),
+        )
+    )
+
+    search_sync_seconds = float(
+        os.environ.get(
+            "SEARCH_SYNC_SECONDS",
+            cfg.get("General", "search_sync_seconds", fallback="5"),
+        )
+    )
+
+    # -------------------------------------------------------------------------
+    # Barrido de sesiones vencidas (0 desactiva el barrido en segundo plano)
+    # -------------------------------------------------------------------------
+    session_sweep_seconds = float(
+        os.environ.get(
+            "SESSION_SWEEP_SECONDS",
+            cfg.get("General", "session_sweep_seconds", fallback="900"),
+        )
+    )
+    session_sweep_page_size = int(
+        os.environ.get(
+            "SESSION_SWEEP_PAGE_SIZE",
+            cfg.get("General", "session_sweep_page_size", fallback="200"),
+        )
+    )
+    session_sweep_max_deletes = int(
+        os.environ.get(
+            "SESSION_SWEEP_MAX_DELETES",
+            cfg.get("General", "session_sweep_max_deletes", fallback="2000"),
+        )
+    )
+
+    # -------------------------------------------------------------------------
+    # Costo del hash de passwords (pbkdf2_sha256). 0 = default de passlib.
+    # Se calibra con scripts/calibrate_password_hash.py
+    # -------------------------------------------------------------------------
+    password_hash_rounds = int(
+        os.environ.get(
+            "PASSWORD_HASH_ROUNDS",
+            cfg.get("General", "password_hash_rounds", fallback="0"),
+        )
+    )
+
+    # -------------------------------------------------------------------------
+    # Perfil por request (Server-Timing + log): los requests más lentos que esto
+    # se loguean con el detalle de cada llamada. 0 = nunca.
+    # -------------------------------------------------------------------------
+    profile_slow_request_ms = float(
+        os.environ.get(
+            "PROFILE_SLOW_REQUEST_MS",
+            cfg.get("General", "profile_slow_request_ms", fallback="1000"),
+        )
+    )
+
+    # -------------------------------------------------------------------------
+    # Token (Bearer) que exige GET /metrics. Vacío = endpoint deshabilitado (404).
+    # -------------------------------------------------------------------------
+    metrics_token = os.environ.get(
+        "METRICS_TOKEN",
+        cfg.get("General", "metrics_token", fallback=""),
+    )
+
+    # -------------------------------------------------------------------------
+    # Control de admisión (rate limit por sesión/IP y concurrencia global).
+    # 0 desactiva el límite correspondiente.
+    # -------------------------------------------------------------------------
+    rate_limit_per_second = float(
+        os.environ.get(
+            "RATE_LIMIT_PER_SECOND",
+            cfg.get("General", "rate_limit_per_second", fallback="10"),
+        )
+    )
+    rate_limit_burst = float(
+        os.environ.get(
+            "RATE_LIMIT_BURST",
+            cfg.get("General", "rate_limit_burst", fallback="60"),
+        )
+    )
+    rate_limit_backend = os.environ.get(
+        "RATE_LIMIT_BACKEND",
+        cfg.get("General", "rate_limit_backend", fallback="memory"),
+    )
+    # Proxies propios delante de la app (Vercel: 1). Sólo se confía en esa cantidad de
+    # entradas de X-Forwarded-For; con 0 se usa la IP de la conexión.
+    trusted_proxy_hops = int(
+        os.environ.get(
+            "TRUSTED_PROXY_HOPS",
+            cfg.get("General", "trusted_proxy_hops", fallback="0"),
+        )
+    )
+    max_concurrent_requests = int(
+        os.environ.get(
+            "MAX_CONCURRENT_REQUESTS",
+            cfg.get("General", "max_concurrent_requests", fallback="32"),
+        )
+    )
+    max_queued_requests = int(
+        os.environ.get(
+            "MAX_QUEUED_REQUESTS",
+            cfg.get("General", "max_queued_requests", fallback="64"),
+        )
+    )
+    queue_timeout_seconds = float(
+        os.environ.get(
+            "QUEUE_TIMEOUT_SECONDS",
+            cfg.get("General", "queue_timeout_seconds", fallback="5"),
+        )
+    )
+
+    # -------------------------------------------------------------------------
+    # Resiliencia de Firestore (deadline por request, reintentos, circuit breaker)
+    # -------------------------------------------------------------------------
+    request_budget_seconds = float(
+        os.environ.get(
+            "REQUEST_BUDGET_SECONDS",
+            cfg.get("GCP", "request_budget_seconds", fallback="20"),
+        )
+    )
+    firestore_call_timeout_seconds = float(
+        os.environ.get(
+            "FIRESTORE_CALL_TIMEOUT_SECONDS",
+            cfg.get("GCP", "firestore_call_timeout_seconds", fallback="10"),
+        )
+    )
+    firestore_read_retries = int(
+        os.environ.get(
+            "FIRESTORE_READ_RETRIES",
+            cfg.get("GCP", "firestore_read_retries", fallback="3"),
+        )
+    )
+    breaker_error_rate = float(
+        os.environ.get(
+            "BREAKER_ERROR_RATE",
+            cfg.get("GCP", "breaker_error_rate", fallback="0.5"),
+        )
+    )
+    breaker_min_calls = int(
+        os.environ.get(
+            "BREAKER_MIN_CALLS",
+            cfg.get("GCP", "breaker_min_calls", fallback="20"),
+        )
+    )
+    breaker_window_seconds = float(
+        os.environ.get(
+            "BREAKER_WINDOW_SECONDS",
+            cfg.get("GCP", "breaker_window_seconds", fallback="30"),
+        )
+    )
+    breaker_open_seconds = float(
+        os.environ.get(
+            "BREAKER_OPEN_SECONDS",
+            cfg.get("GCP", "breaker_open_seconds", fallback="15"),
+        )
+    )
+
+    ollama_host = os.environ.get(
+        "OLLAMA_HOST",
+        cfg.get("Analysis", "ollama_host", fallback="http://localhost:11434"),
+    )
+
+    ollama_model = os.environ.get(
+        "OLLAMA_MODEL",
+        cfg.get("Analysis", "ollama_model", fallback="qwen2.5:7b-instruct"),
+    )
+
+    repos_dir = os.environ.get(
+        "REPOS_DIR",
+        cfg.get("Analysis", "repos_dir", fallback="/tmp/repos"),
+    )
+
+    analysis_dir = os.environ.get(
+        "ANALYSIS_DIR",
+        cfg.get("Analysis", "analysis_dir", fallback="/tmp/analysis"),
+    )
+
+    analysis_workers = int(
+        os.environ.get(
+            "ANALYSIS_WORKERS",
+            cfg.get("Analysis", "workers", fallback="2"),
+        )
+    )
+
+    analysis_tenant_concurrency = int(
+        os.environ.get(
+            "ANALYSIS_TENANT_CONCURRENCY",
+            cfg.get("Analysis", "tenant_concurrency", fallback="1"),
+        )
+    )
+
+    analysis_cache_max_mb = int(
+        os.environ.get(
+            "ANALYSIS_CACHE_MAX_MB",
+            cfg.get("Analysis", "cache_max_mb", fallback="1024"),
+        )
+    )
+
+    repos_cache_max_mb = int(
+        os.environ.get(
+            "REPOS_CACHE_MAX_MB",
+            cfg.get("Analysis", "repos_cache_max_mb", fallback="10240"),
+        )
+    )
 
     # -------------------------------------------------------------------------
     # Logging / Frontend
@@ -165,5 +462,44 @@ def get_settings() -> Settings:
         session_ttl_hours=session_ttl_hours,
         session_cookie_name=session_cookie_name,
         google_application_credentials=google_application_credentials,
-        users_collection=users_collection
+        users_collection=users_collection,
+        user_emails_collection=user_emails_collection,
+        user_sessions_collection=user_sessions_collection,
+        tombstones_collection=tombstones_collection,
+        jobs_collection=jobs_collection,
+        graphs_collection=graphs_collection,
+        tech_index_collection=tech_index_collection,
+        counters_collection=counters_collection,
+        counter_shards=counter_shards,
+        search_sync_seconds=search_sync_seconds,
+        owner_index_collection=owner_index_collection,
+        owner_cache_seconds=owner_cache_seconds,
+        session_sweep_seconds=session_sweep_seconds,
+        session_sweep_page_size=session_sweep_page_size,
+        session_sweep_max_deletes=session_sweep_max_deletes,
+        password_hash_rounds=password_hash_rounds,
+        profile_slow_request_ms=profile_slow_request_ms,
+        metrics_token=metrics_token,
+        rate_limit_per_second=rate_limit_per_second,
+        rate_limit_burst=rate_limit_burst,
+        rate_limit_backend=rate_limit_backend,
+        trusted_proxy_hops=trusted_proxy_hops,
+        max_concurrent_requests=max_concurrent_requests,
+        max_queued_requests=max_queued_requests,
+        queue_timeout_seconds=queue_timeout_seconds,
+        request_budget_seconds=request_budget_seconds,
+        firestore_call_timeout_seconds=firestore_call_timeout_seconds,
+        firestore_read_retries=firestore_read_retries,
+        breaker_error_rate=breaker_error_rate,
+        breaker_min_calls=breaker_min_calls,
+        breaker_window_seconds=breaker_window_seconds,
+        breaker_open_seconds=breaker_open_seconds,
+        ollama_host=ollama_host,
+        ollama_model=ollama_model,
+        repos_dir=repos_dir,
+        analysis_dir=analysis_dir,
+        analysis_workers=analysis_workers,
+        analysis_tenant_concurrency=analysis_tenant_concurrency,
+        analysis_cache_max_mb=analysis_cache_max_mb,
+        repos_cache_max_mb=repos_cache_max_mb,
     )
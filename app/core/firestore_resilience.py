@@ -0,0 +1,446 @@
+"""Llamadas a Firestore con deadline, reintentos y circuit breaker.
+
+``ResilientClient`` envuelve al cliente de Firestore con la misma API que usan los
+servicios (``collection``/``document``/consultas/``batch``/``get_all``/``transaction``), así que se
+inyecta una sola vez en ``app.state.firestore`` y lo usan todos los servicios y
+``AuthService``.
+
+- **Deadline**: cada request HTTP tiene un presupuesto (``request_budget_seconds``,
+  ``RequestBudgetMiddleware``); cada llamada usa como timeout lo que quede del
+  presupuesto, con tope ``firestore_call_timeout_seconds``. Sin presupuesto restante
+  falla con 504 sin llamar al backend. Fuera de un request (threads de fondo) sólo
+  aplica el tope por llamada.
+- **Reintentos**: sólo las lecturas (``get``, ``stream``, ``get_all``), ante errores
+  transitorios, con backoff exponencial con jitter y sin pasarse del presupuesto.
+  ``stream`` se reintenta hasta recibir el primer documento y después entrega el resto
+  a medida que llega, sin materializar el resultado. Las
+  escrituras no se reintentan (``Increment``/``ArrayUnion`` no son idempotentes). En
+  las lecturas se desactiva el retry propio del cliente para no duplicar reintentos.
+- **Circuit breaker**: si en la ventana ``breaker_window_seconds`` la tasa de errores
+  transitorios supera ``breaker_error_rate`` (con al menos ``breaker_min_calls``
+  llamadas), las llamadas fallan al instante con 503 durante ``breaker_open_seconds``;
+  después se deja pasar una llamada de prueba que cierra o reabre el circuito.
+
+Cada llamada se registra en las métricas de Firestore (``app.core.metrics``) con la
+colección, la operación y el método del servicio que la originó, y como fase
+``firestore`` en el perfil del request (``app.core.profiling``).
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from fastapi import HTTPException
+from google.api_core import exceptions as gexc
+
+from app.core.metrics import firestore_caller, observe_firestore
+from app.core.profiling import record_phase
+from app.core.rate_limit import is_event_stream
+
+# Errores del backend que vale la pena reintentar (y que cuentan para el breaker).
+TRANSIENT_ERRORS = (
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.InternalServerError,
+    gexc.TooManyRequests,
+    gexc.GatewayTimeout,
+)
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_MAX_SECONDS = 1.0
+
+_deadline: ContextVar[float | None] = ContextVar("firestore_deadline", default=None)
+
+
+class FirestoreUnavailable(HTTPException):
+    """Firestore no responde (circuito abierto o reintentos agotados)."""
+
+    def __init__(self, detail: str = "Firestore no está disponible. Reintentá en unos segundos.", retry_after: float = 1):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class FirestoreTimeout(HTTPException):
+    """Se agotó el presupuesto de tiempo del request esperando a Firestore."""
+
+    def __init__(self, detail: str = "Se agotó el tiempo de espera de Firestore."):
+        super().__init__(status_code=504, detail=detail)
+
+
+@contextmanager
+def request_budget(seconds: float | None):
+    """Fija el deadline de las llamadas a Firestore dentro del bloque."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> float | None:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class RequestBudgetMiddleware:
+    """Middleware ASGI que abre un ``request_budget`` por request (salvo streams SSE)."""
+
+    def __init__(self, app, *, seconds: float):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.seconds or is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        with request_budget(self.seconds):
+            await self.app(scope, receive, send)
+
+
+class CircuitBreaker:
+    """Breaker por tasa de errores en una ventana deslizante de tiempo."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        error_rate: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._events: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe = False
+            if self.state == self.HALF_OPEN:
+                if self._probe:
+                    self.rejected += 1
+                    return False
+                self._probe = True
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                self._probe = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._events.clear()
+                    self._failures = 0
+                else:
+                    self._open(now)
+                return
+
+            self._events.append((now, ok))
+            self._failures += not ok
+            while self._events and now - self._events[0][0] > self.window_seconds:
+                _, old_ok = self._events.popleft()
+                self._failures -= not old_ok
+            calls = len(self._events)
+            if self.state == self.CLOSED and calls >= self.min_calls and self._failures / calls >= self.error_rate:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+        self._events.clear()
+        self._failures = 0
+
+
+class FirestoreGuard:
+    """Política de llamadas: deadline, reintentos de lecturas y breaker."""
+
+    def __init__(self, settings, logger=None, *, breaker: CircuitBreaker | None = None, sleep=time.sleep):
+        self.call_timeout = settings.firestore_call_timeout_seconds
+        self.read_retries = settings.firestore_read_retries
+        self.logger = logger
+        self.breaker = breaker or CircuitBreaker(
+            settings.breaker_error_rate,
+            settings.breaker_min_calls,
+            settings.breaker_window_seconds,
+            settings.breaker_open_seconds,
+        )
+        self.sleep = sleep
+
+    def _timeout(self) -> float:
+        remaining = remaining_budget()
+        if remaining is None:
+            return self.call_timeout
+        if remaining <= 0:
+            raise FirestoreTimeout()
+        return min(self.call_timeout, remaining)
+
+    def call(self, fn: Callable[[float], object], *, idempotent: bool, op: str = "", collection: str = ""):
+        """Ejecuta ``fn(timeout)`` aplicando la política y registra la llamada en las métricas."""
+        service, method = firestore_caller()
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            result = self._call(fn, idempotent, op)
+            outcome = "ok"
+            return result
+        except FirestoreTimeout:
+            outcome = "timeout"
+            raise
+        except FirestoreUnavailable:
+            outcome = "unavailable"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_firestore(service, method, collection, op, outcome, elapsed)
+            record_phase("firestore", elapsed, f"{method} {op} {collection}".strip(), started)
+
+    def _call(self, fn, idempotent: bool, op: str):
+        attempts = 1 + (self.read_retries if idempotent else 0)
+        for attempt in range(attempts):
+            timeout = self._timeout()
+            if not self.breaker.allow():
+                raise FirestoreUnavailable(retry_after=self.breaker.retry_after)
+            try:
+                result = fn(timeout)
+            except TRANSIENT_ERRORS as e:
+                self.breaker.record(False)
+                backoff = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                remaining = remaining_budget()
+                if attempt + 1 >= attempts or (remaining is not None and remaining <= backoff):
+                    if self.logger:
+                        self.logger.warning(f"Firestore {op} falló tras {attempt + 1} intento(s): {e}")
+                    raise _unavailable(e) from e
+                self.sleep(backoff)
+                continue
+            except Exception:
+                # Errores del request (NotFound, AlreadyExists, ...): el backend respondió
+                self.breaker.record(True)
+                raise
+            self.breaker.record(True)
+            return result
+
+
+def _unavailable(error: Exception) -> HTTPException:
+    """Excepción HTTP (504 o 503) para un error transitorio sin más reintentos."""
+    if isinstance(error, (gexc.DeadlineExceeded, gexc.GatewayTimeout)):
+        return FirestoreTimeout()
+    return FirestoreUnavailable()
+
+
+def _unwrap(ref):
+    return ref._inner if isinstance(ref, _Wrapper) else ref
+
+
+class _Wrapper:
+    # ``_collection``: id de la colección de la referencia (label de las métricas)
+    __slots__ = ("_inner", "_guard", "_collection")
+
+    def __init__(self, inner, guard: FirestoreGuard, collection: str = ""):
+        self._inner = inner
+        self._guard = guard
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def _read(self, fn, op):
+        return self._guard.call(fn, idempotent=True, op=op, collection=self._collection)
+
+    def _write(self, fn, op):
+        return self._guard.call(fn, idempotent=False, op=op, collection=self._collection)
+
+
+class ResilientQuery(_Wrapper):
+    __slots__ = ()
+
+    def _chain(self, name, *args, **kwargs):
+        return ResilientQuery(getattr(self._inner, name)(*args, **kwargs), self._guard, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._chain("where", *args, **kwargs)
+
+    def order_by(self, *args, **kwargs):
+        return self._chain("order_by", *args, **kwargs)
+
+    def limit(self, *args, **kwargs):
+        return self._chain("limit", *args, **kwargs)
+
+    def select(self, *args, **kwargs):
+        return self._chain("select", *args, **kwargs)
+
+    def start_at(self, *args, **kwargs):
+        return self._chain("start_at", *args, **kwargs)
+
+    def start_after(self, *args, **kwargs):
+        return self._chain("start_after", *args, **kwargs)
+
+    def stream(self, **kwargs):
+        # Se reintenta hasta el primer documento; el resto se entrega a medida que llega
+        def first(timeout):
+            docs = iter(self._inner.stream(timeout=timeout, retry=None, **kwargs))
+            return next(docs, None), docs
+
+        head, docs = self._read(first, "stream")
+        return self._rest(head, docs)
+
+    def _rest(self, head, docs):
+        if head is None:
+            return
+        yield head
+        try:
+            yield from docs
+        except TRANSIENT_ERRORS as e:
+            # Con documentos ya entregados no se puede reintentar sin repetirlos
+            self._guard.breaker.record(False)
+            if self._guard.logger:
+                self._guard.logger.warning(f"Firestore stream se cortó a mitad del resultado: {e}")
+            raise _unavailable(e) from e
+
+    def get(self, **kwargs):
+        return self._read(lambda timeout: list(self._inner.stream(timeout=timeout, retry=None, **kwargs)), "query")
+
+
+class ResilientCollection(ResilientQuery):
+    __slots__ = ()
+
+    def document(self, *args):
+        return ResilientDocument(self._inner.document(*args), self._guard, self._collection)
+
+    def add(self, data, **kwargs):
+        return self._write(lambda timeout: self._inner.add(data, timeout=timeout, **kwargs), "add")
+
+
+class ResilientDocument(_Wrapper):
+    __slots__ = ()
+
+    def collection(self, name):
+        return ResilientCollection(self._inner.collection(name), self._guard, name)
+
+    def get(self, **kwargs):
+        return self._read(lambda timeout: self._inner.get(timeout=timeout, retry=None, **kwargs), "get")
+
+    def set(self, data, **kwargs):
+        return self._write(lambda timeout: self._inner.set(data, timeout=timeout, **kwargs), "set")
+
+    def create(self, data, **kwargs):
+        return self._write(lambda timeout: self._inner.create(data, timeout=timeout, **kwargs), "create")
+
+    def update(self, data, **kwargs):
+        return self._write(lambda timeout: self._inner.update(data, timeout=timeout, **kwargs), "update")
+
+    def delete(self, **kwargs):
+        return self._write(lambda timeout: self._inner.delete(timeout=timeout, **kwargs), "delete")
+
+
+class ResilientBatch(_Wrapper):
+    __slots__ = ()
+
+    def set(self, ref, data, **kwargs):
+        self._inner.set(_unwrap(ref), data, **kwargs)
+        return self
+
+    def create(self, ref, data):
+        self._inner.create(_unwrap(ref), data)
+        return self
+
+    def update(self, ref, data, **kwargs):
+        self._inner.update(_unwrap(ref), data, **kwargs)
+        return self
+
+    def delete(self, ref, **kwargs):
+        self._inner.delete(_unwrap(ref), **kwargs)
+        return self
+
+    def commit(self, **kwargs):
+        return self._write(lambda timeout: self._inner.commit(timeout=timeout, **kwargs), "commit")
+
+
+class ResilientTransaction(_Wrapper):
+    """Transacción para ``firestore.transactional``: lecturas, inicio y commit pasan por el guard.
+
+    Un ``Aborted`` del commit (contención) no es transitorio para el guard: lo reintenta
+    el decorador con la transacción completa.
+    """
+
+    __slots__ = ()
+
+    def get(self, ref_or_query, **kwargs):
+        target = _unwrap(ref_or_query)
+        return iter(self._guard.call(
+            lambda timeout: list(self._inner.get(target, timeout=timeout, retry=None, **kwargs)),
+            idempotent=True, op="transaction_get", collection=getattr(ref_or_query, "_collection", ""),
+        ))
+
+    def set(self, ref, data, **kwargs):
+        self._inner.set(_unwrap(ref), data, **kwargs)
+        return self
+
+    def update(self, ref, data, **kwargs):
+        self._inner.update(_unwrap(ref), data, **kwargs)
+        return self
+
+    def delete(self, ref, **kwargs):
+        self._inner.delete(_unwrap(ref), **kwargs)
+        return self
+
+    def _begin(self, retry_id=None):
+        return self._write(lambda timeout: self._inner._begin(retry_id=retry_id), "begin")
+
+    def _commit(self):
+        return self._write(lambda timeout: self._inner._commit(), "commit")
+
+
+class ResilientClient(_Wrapper):
+    """Cliente de Firestore con la política de ``FirestoreGuard`` en cada llamada."""
+
+    __slots__ = ()
+
+    def __init__(self, inner, settings, logger=None, *, guard: FirestoreGuard | None = None):
+        super().__init__(inner, guard or FirestoreGuard(settings, logger))
+
+    @property
+    def guard(self) -> FirestoreGuard:
+        return self._guard
+
+    def collection(self, name):
+        return ResilientCollection(self._inner.collection(name), self._guard, name)
+
+    def batch(self):
+        return ResilientBatch(self._inner.batch(), self._guard, "batch")
+
+    def transaction(self, **kwargs):
+        return ResilientTransaction(self._inner.transaction(**kwargs), self._guard, "transaction")
+
+    def get_all(self, refs, **kwargs):
+        refs = list(refs)
+        collection = getattr(refs[0], "_collection", "") if refs else ""
+        refs = [_unwrap(ref) for ref in refs]
+        return iter(self._guard.call(
+            lambda timeout: list(self._inner.get_all(refs, timeout=timeout, retry=None, **kwargs)),
+            idempotent=True, op="get_all", collection=collection,
+        ))
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from fastapi import Query
+
+from app.services.graph_index import parse_filters
+
+
+def graph_view_params(
+    domain: list[str] | None = Query(default=None, description="Dominio(s) de nodo; repetible o separado por comas"),
+    type: list[str] | None = Query(default=None, description="Tipo(s) de nodo (ApplicationComponent, ExternalSystem, ...)"),
+    criticality: list[str] | None = Query(default=None, description="Criticidad(es): high, medium, low"),
+    risk: list[str] | None = Query(default=None, description="Valor(es) de metadata.risk"),
+    include_metadata: bool = Query(default=True, description="Incluir metadata de nodos y aristas"),
+) -> dict:
+    """Parámetros de filtrado de grafos compartidos por los endpoints de relaciones.
+
+    Devuelve kwargs para ``GraphService`` (``filters`` e ``include_metadata``).
+    """
+    filters = parse_filters(domain=domain, type=type, criticality=criticality, risk=risk)
+    return {"filters": filters, "include_metadata": include_metadata}
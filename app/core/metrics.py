@@ -0,0 +1,308 @@
+"""Métricas del proceso en formato de exposición de Prometheus (``GET /metrics``).
+
+Registro propio y mínimo (contadores, gauges e histogramas con labels) para no sumar
+dependencias: cada operación es un lock y una suma, así que la instrumentación queda
+siempre activa.
+
+- ``http_request_duration_seconds{method,route,status}``: latencia por template de ruta
+  (``/projects/{project_id}``, no el path concreto). Los streams SSE no se miden.
+- ``http_requests_in_flight``: requests en curso.
+- ``firestore_calls_total`` / ``firestore_call_duration_seconds``: por servicio, método
+  del servicio que hizo la llamada, colección y operación (ver ``firestore_caller``).
+- ``cache_requests_total{cache,result}`` y ``cache_hit_ratio{cache}``.
+- ``threadpool_*`` y ``admission_*``: saturación del threadpool de los endpoints sync y
+  del control de admisión; se actualizan al momento del scrape.
+- ``admission_shed_requests_total``, ``rate_limited_requests_total`` y
+  ``firestore_breaker_rejected_calls_total``: contadores que llevan el componente
+  (admisión, rate limiter, breaker) y se copian al momento del scrape.
+
+Los valores son por proceso: con varios workers cada uno expone los suyos.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from app.core.rate_limit import is_event_stream
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Módulos cuyas funciones se usan como "método de servicio" en las métricas de Firestore.
+CALLER_PREFIXES = ("app.services.", "app.api.routes.", "app.core.auth_deps", "scripts.")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list[tuple[tuple, object]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class MirroredCounter(Counter):
+    """Contador cuyo total lleva otro componente y se copia con ``set`` al scrape.
+
+    Se expone como ``counter`` (``rate()`` funciona): el valor copiado sólo crece
+    mientras el proceso vive.
+    """
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [conteo por bucket (no acumulado) + overflow, suma]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1])) for key, state in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Latencia de los requests HTTP.", ("method", "route", "status"),
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "Requests HTTP en curso."))
+FIRESTORE_CALLS = REGISTRY.register(Counter(
+    "firestore_calls_total", "Llamadas a Firestore por resultado.",
+    ("service", "method", "collection", "op", "outcome"),
+))
+FIRESTORE_DURATION = REGISTRY.register(Histogram(
+    "firestore_call_duration_seconds", "Latencia de las llamadas a Firestore (con reintentos).",
+    ("service", "method", "collection", "op"),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Consultas a caches en memoria/disco.", ("cache", "result"),
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge("cache_hit_ratio", "Hits / consultas por cache.", ("cache",)))
+THREADPOOL_BUSY = REGISTRY.register(Gauge("threadpool_busy_threads", "Threads del threadpool en uso."))
+THREADPOOL_SIZE = REGISTRY.register(Gauge("threadpool_max_threads", "Tamaño del threadpool."))
+THREADPOOL_WAITING = REGISTRY.register(Gauge("threadpool_waiting_tasks", "Tareas esperando un thread libre."))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge("admission_in_flight", "Requests admitidos en curso."))
+ADMISSION_QUEUED = REGISTRY.register(Gauge("admission_queued", "Requests esperando lugar."))
+ADMISSION_SHED = REGISTRY.register(MirroredCounter(
+    "admission_shed_requests_total", "Requests rechazados por saturación (503) desde el arranque.",
+))
+RATE_LIMITED = REGISTRY.register(MirroredCounter(
+    "rate_limited_requests_total", "Requests rechazados por rate limit (429) desde el arranque.",
+))
+BREAKER_OPEN = REGISTRY.register(Gauge(
+    "firestore_breaker_open", "1 si el circuit breaker de Firestore no está cerrado.",
+))
+BREAKER_REJECTED = REGISTRY.register(MirroredCounter(
+    "firestore_breaker_rejected_calls_total", "Llamadas cortadas por el breaker desde el arranque.",
+))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def firestore_caller() -> tuple[str, str]:
+    """``(servicio, método)`` del primer frame de la app que llamó a Firestore.
+
+    Recorre la pila hasta el primer módulo de ``CALLER_PREFIXES`` (unos pocos frames; es
+    despreciable frente al round-trip a Firestore). El servicio es el nombre corto del
+    módulo y el método el ``__qualname__`` de la función, p. ej.
+    ``("owner_index_service", "OwnerIndexService._owned")``.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(CALLER_PREFIXES):
+            return module.rsplit(".", 1)[-1], frame.f_code.co_qualname
+        frame = frame.f_back
+    return "other", ""
+
+
+def observe_firestore(service: str, method: str, collection: str, op: str, outcome: str, seconds: float) -> None:
+    FIRESTORE_CALLS.inc(service=service, method=method, collection=collection, op=op, outcome=outcome)
+    FIRESTORE_DURATION.observe(seconds, service=service, method=method, collection=collection, op=op)
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: requests en curso y latencia por (método, template, status)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stream = is_event_stream(scope)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            if not stream:
+                HTTP_REQUEST_DURATION.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"], route=route_template(scope), status=status,
+                )
+
+
+def update_runtime_gauges(state) -> None:
+    """Actualiza los gauges y contadores copiados al momento del scrape (threadpool, admisión, breaker).
+
+    Debe llamarse desde el event loop: el limiter de threads de anyio es por loop.
+    """
+    try:
+        from anyio import to_thread
+
+        limiter = to_thread.current_default_thread_limiter()
+        THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+        THREADPOOL_SIZE.set(limiter.total_tokens)
+        THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+    except Exception:
+        pass
+
+    admission = getattr(state, "admission", None) or {}
+    concurrency = admission.get("concurrency")
+    if concurrency is not None:
+        ADMISSION_IN_FLIGHT.set(concurrency.in_flight)
+        ADMISSION_QUEUED.set(concurrency.waiting)
+        ADMISSION_SHED.set(concurrency.shed)
+    rate_limiter = admission.get("rate_limiter")
+    if rate_limiter is not None:
+        RATE_LIMITED.set(rate_limiter.rejected)
+
+    guard = getattr(getattr(state, "firestore", None), "guard", None)
+    if guard is not None:
+        BREAKER_OPEN.set(0 if guard.breaker.state == guard.breaker.CLOSED else 1)
+        BREAKER_REJECTED.set(guard.breaker.rejected)
+
+    totals: dict[str, list[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.samples():
+        totals.setdefault(cache, [0, 0])[result == "hit"] += value
+    for cache, (misses, hits) in totals.items():
+        CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0, cache=cache)
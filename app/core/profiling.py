@@ -0,0 +1,225 @@
+"""Perfil por request: en qué fases se fue el tiempo.
+
+``ProfilerMiddleware`` abre un ``RequestProfile`` por request (en un ``ContextVar``, que
+anyio copia a los threads de los endpoints sync) y acumula tiempo y cantidad de llamadas
+por fase:
+
+- ``auth``: ``get_current_user`` (lectura de la sesión, incluye sus llamadas a Firestore).
+- ``service``: la función del endpoint (servicios y lógica de la ruta).
+- ``firestore``: cada llamada a Firestore (``FirestoreGuard``); se superpone con
+  ``auth`` y ``service``, que la contienen.
+- ``validation``: el resto del manejo de FastAPI (parseo y validación Pydantic del
+  request y del ``response_model``).
+- ``encoding``: serialización JSON de la respuesta (``ProfiledJSONResponse``).
+
+Las fases se devuelven en el header ``Server-Timing`` y se loguea una línea JSON por
+request. Si el request supera ``profile_slow_request_ms`` la línea incluye además cada
+llamada individual (fase, detalle, inicio y duración) y se loguea como warning.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from app.core.metrics import route_template
+from app.core.rate_limit import is_event_stream
+
+# Llamadas individuales que se guardan por request para el muestreo completo.
+MAX_EVENTS = 200
+# Fases medidas dentro del handler de la ruta (``validation`` es lo que queda).
+HANDLER_PHASES = ("auth", "service", "encoding")
+
+
+class RequestProfile:
+    """Tiempo y llamadas por fase de un request, más el detalle de cada llamada."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, list[float]] = {}
+        self.events: list[tuple[str, str, float, float]] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float, detail: str = "", started: float | None = None) -> None:
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+            if len(self.events) < MAX_EVENTS:
+                start = (started if started is not None else time.perf_counter() - seconds) - self.started
+                self.events.append((phase, detail, start, seconds))
+            else:
+                self.dropped += 1
+
+    def seconds(self, *phases: str) -> float:
+        with self._lock:
+            return sum(self.phases.get(phase, (0.0, 0))[0] for phase in phases)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases.items())
+        parts = [f'{name};dur={seconds * 1000:.1f};desc="{calls} llamada(s)"' for name, (seconds, calls) in phases]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def summary(self, full: bool = False) -> dict:
+        with self._lock:
+            data = {
+                "phases": {
+                    name: {"ms": round(seconds * 1000, 2), "calls": calls}
+                    for name, (seconds, calls) in sorted(self.phases.items())
+                },
+            }
+            if full:
+                data["events"] = [
+                    {"phase": phase, "detail": detail, "start_ms": round(start * 1000, 2), "ms": round(dur * 1000, 2)}
+                    for phase, detail, start, dur in self.events
+                ]
+                data["dropped_events"] = self.dropped
+        return data
+
+
+_profile: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> RequestProfile | None:
+    return _profile.get()
+
+
+def record_phase(phase: str, seconds: float, detail: str = "", started: float | None = None) -> None:
+    """Suma ``seconds`` a ``phase`` en el perfil del request en curso (si hay uno)."""
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(phase, seconds, detail, started)
+
+
+@contextmanager
+def profile_phase(phase: str, detail: str = ""):
+    """Mide el bloque como una llamada de ``phase``; no hace nada fuera de un request."""
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(phase, time.perf_counter() - started, detail, started)
+
+
+def _profiled_call(call, phase: str):
+    detail = getattr(call, "__qualname__", "")
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            with profile_phase(phase, detail):
+                return await call(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        with profile_phase(phase, detail):
+            return call(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledJSONResponse(JSONResponse):
+    """``JSONResponse`` que mide la serialización como fase ``encoding``."""
+
+    def render(self, content) -> bytes:
+        with profile_phase("encoding"):
+            return super().render(content)
+
+
+class ProfiledRoute(APIRoute):
+    """Ruta que mide la función del endpoint (``service``) y el resto del handler (``validation``).
+
+    Se usa como ``route_class`` de los routers. El endpoint se envuelve en
+    ``dependant.call`` (después de analizar la firma) para no alterar la resolución de
+    anotaciones ni los parámetros que FastAPI infiere de la función original.
+    """
+
+    def get_route_handler(self):
+        self.dependant.call = _profiled_call(self.dependant.call, "service")
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            profile = _profile.get()
+            if profile is None:
+                return await handler(request)
+            inner = profile.seconds(*HANDLER_PHASES)
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                elapsed = time.perf_counter() - started
+                measured = profile.seconds(*HANDLER_PHASES) - inner
+                profile.add("validation", max(0.0, elapsed - measured), started=started)
+
+        return profiled_handler
+
+
+class ProfilerMiddleware:
+    """Middleware ASGI: ``Server-Timing`` y una línea de log por request (salvo streams SSE)."""
+
+    def __init__(self, app, *, logger=None, slow_ms: float = 0):
+        self.app = app
+        self.logger = logger
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile.reset(token)
+            self._log(scope, status, profile)
+
+    def _log(self, scope, status: int, profile: RequestProfile) -> None:
+        if self.logger is None:
+            return
+        total_ms = profile.elapsed_ms()
+        slow = bool(self.slow_ms) and total_ms >= self.slow_ms
+        entry = {
+            "event": "request_profile",
+            "method": scope["method"],
+            "route": route_template(scope),
+            "path": scope["path"],
+            "status": status,
+            "total_ms": round(total_ms, 2),
+            "slow": slow,
+            **profile.summary(full=slow),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        if slow:
+            self.logger.warning(line)
+        else:
+            self.logger.info(line)
@@ -0,0 +1,346 @@
+"""Control de admisión: rate limit por usuario/IP y límite global de concurrencia.
+
+- **Token bucket** por IP y por usuario (el de la sesión de la cookie, resuelta con
+  ``SessionUserCache``; una cookie inválida sólo cuenta por IP): cada request consume
+  tokens según su costo (``request_cost``: login y escrituras cuestan más que lecturas)
+  y los buckets se recargan a ``rate_limit_per_second`` hasta ``rate_limit_burst``.
+  Sin tokens -> 429 con ``Retry-After``.
+- **Concurrencia global**: como mucho ``max_concurrent_requests`` requests en curso y
+  ``max_queued_requests`` esperando (hasta ``queue_timeout_seconds``). Si la cola está
+  llena o la espera vence -> 503 con ``Retry-After`` en vez de acumular threads.
+
+El estado de los buckets vive en proceso (``InMemoryBucketBackend``). Para compartirlo
+entre instancias se configura ``RATE_LIMIT_BACKEND=paquete.modulo:Clase`` con una
+implementación de ``BucketBackend`` (p. ej. sobre Redis).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Protocol
+
+# Costos por request (tokens del bucket).
+LOGIN_COST = 5.0
+WRITE_COST = 3.0
+READ_COST = 1.0
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Costos específicos por (método, path); el resto se resuelve por método.
+ROUTE_COSTS = {("POST", "/auth/login"): LOGIN_COST}
+# Sin control de admisión (chequeos de vida de la plataforma y scrape de métricas). El
+# scrape no se descarta con la app saturada; /metrics exige su propio token Bearer.
+EXEMPT_PATHS = {"/healthz", "/metrics"}
+# Buckets que se mantienen en memoria (los menos usados se descartan).
+MAX_BUCKETS = 100_000
+# Endpoints SSE (GET): streams largos que no ocupan lugar en la concurrencia ni cuentan
+# como requests en métricas, perfil y presupuesto. Es una lista fija del servidor: nunca
+# se decide por headers del cliente (``Accept``) ni por sufijos del path.
+SSE_ROUTES = (
+    re.compile(r"/analysis/jobs/[^/]+/events"),
+    re.compile(r"/mocks/functional_analysis_request_stream/[^/]+"),
+)
+# TTL de ``session_id -> user_id`` en el rate limit (las sesiones inválidas, menos).
+SESSION_CACHE_SECONDS = 60.0
+INVALID_SESSION_CACHE_SECONDS = 10.0
+
+
+def request_cost(method: str, path: str) -> float:
+    cost = ROUTE_COSTS.get((method, path.rstrip("/") or "/"))
+    if cost is not None:
+        return cost
+    return WRITE_COST if method in WRITE_METHODS else READ_COST
+
+
+class BucketBackend(Protocol):
+    """Almacenamiento de buckets. ``take`` debe ser atómico por clave."""
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Consume ``cost`` tokens de ``key``.
+
+        Returns:
+            0 si se admitió; si no, segundos hasta que haya tokens suficientes.
+        """
+        ...
+
+
+class InMemoryBucketBackend:
+    """Buckets en memoria del proceso, con desalojo LRU."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def load_backend(spec: str) -> BucketBackend:
+    """``"memory"`` o ``"paquete.modulo:Clase"`` (se instancia sin argumentos)."""
+    if not spec or spec == "memory":
+        return InMemoryBucketBackend()
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"RATE_LIMIT_BACKEND inválido: {spec!r} (esperado 'paquete.modulo:Clase')")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class RateLimiter:
+    """Token buckets por clave sobre un ``BucketBackend``."""
+
+    def __init__(self, backend: BucketBackend, rate: float, burst: float):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.rejected = 0
+
+    def check(self, keys: list[str], cost: float) -> float:
+        """Consume ``cost`` de cada clave; devuelve el ``Retry-After`` (0 = admitido)."""
+        cost = min(cost, self.burst)
+        wait = max((self.backend.take(key, cost, self.rate, self.burst) for key in keys), default=0.0)
+        if wait:
+            self.rejected += 1
+        return wait
+
+
+class SessionUserCache:
+    """``session_id -> user_id`` para las claves del rate limit, con TTL y desalojo LRU.
+
+    ``lookup(session_id)`` devuelve el usuario de una sesión vigente o ``None``
+    (``AuthService.session_user_id``); las sesiones inválidas también se cachean, así
+    una cookie inventada no genera una lectura por request.
+    """
+
+    def __init__(self, lookup: Callable[[str], str | None], max_entries: int = MAX_BUCKETS):
+        self.lookup = lookup
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, session_id: str) -> tuple[bool, str | None]:
+        """``(hit, user_id)`` sin I/O."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self._entries.move_to_end(session_id)
+            return True, entry[1]
+
+    def resolve(self, session_id: str) -> str | None:
+        """Usuario de la sesión (lee con ``lookup`` si no está en caché)."""
+        hit, user_id = self.cached(session_id)
+        if hit:
+            return user_id
+        try:
+            user_id = self.lookup(session_id)
+        except Exception:
+            # Sin poder validar la sesión se limita sólo por IP (y no se cachea)
+            return None
+        ttl = SESSION_CACHE_SECONDS if user_id else INVALID_SESSION_CACHE_SECONDS
+        with self._lock:
+            self._entries[session_id] = (time.monotonic() + ttl, user_id)
+            self._entries.move_to_end(session_id)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user_id
+
+
+class ConcurrencyLimiter:
+    """Límite de requests en curso con una cola acotada y timeout de espera."""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queued:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+def client_ip(scope, trusted_hops: int = 0) -> str:
+    """IP del cliente para el rate limit.
+
+    Cada proxy agrega al final de ``X-Forwarded-For`` la IP de quien le habló, así que
+    sólo las últimas ``trusted_hops`` entradas las escribieron proxies propios; lo que
+    está a su izquierda lo controla el cliente. Con ``trusted_hops`` proxies delante la
+    IP real es la entrada ``trusted_hops``-ésima desde la derecha. Sin proxies confiables
+    (o sin header) se usa la IP de la conexión.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if trusted_hops <= 0:
+        return peer
+    forwarded = []
+    for name, value in scope.get("headers") or []:
+        if name == b"x-forwarded-for":
+            forwarded.extend(ip.strip() for ip in value.decode("latin-1").split(",") if ip.strip())
+    if not forwarded:
+        return peer
+    return forwarded[-min(trusted_hops, len(forwarded))]
+
+
+def session_cookie(scope, cookie_name: str) -> str | None:
+    for name, value in scope.get("headers") or []:
+        if name != b"cookie":
+            continue
+        for part in value.decode("latin-1").split(";"):
+            key, _, val = part.strip().partition("=")
+            if key == cookie_name and val:
+                return val
+    return None
+
+
+def is_event_stream(scope) -> bool:
+    """Si el request va a un endpoint SSE de ``SSE_ROUTES`` (por método y path)."""
+    return scope.get("method") == "GET" and any(route.fullmatch(scope["path"]) for route in SSE_ROUTES)
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI que aplica ``RateLimiter`` y ``ConcurrencyLimiter``.
+
+    Los streams SSE sólo pasan por el rate limit: quedan abiertos minutos y no deben
+    ocupar lugares del límite de concurrencia.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        rate_limiter: RateLimiter | None = None,
+        concurrency: ConcurrencyLimiter | None = None,
+        cookie_name: str = "session",
+        trusted_proxy_hops: int = 0,
+        session_users: SessionUserCache | None = None,
+    ):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.cookie_name = cookie_name
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.session_users = session_users
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter is not None:
+            cost = request_cost(scope["method"], scope["path"])
+            # Primero la IP: las sesiones se resuelven (con una posible lectura) sólo si pasó
+            wait = self.rate_limiter.check([f"ip:{client_ip(scope, self.trusted_proxy_hops)}"], cost)
+            if not wait:
+                user_id = await self._session_user(scope)
+                if user_id:
+                    wait = self.rate_limiter.check([f"user:{user_id}"], cost)
+            if wait:
+                await _reject(send, 429, "Demasiadas solicitudes. Reintentá en unos segundos.", wait)
+                return
+
+        if self.concurrency is None or is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.concurrency.acquire():
+            await _reject(
+                send, 503, "El servidor está saturado. Reintentá en unos segundos.", self.concurrency.retry_after
+            )
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency.release()
+
+    async def _session_user(self, scope) -> str | None:
+        session = session_cookie(scope, self.cookie_name)
+        if not session or self.session_users is None:
+            return None
+        hit, user_id = self.session_users.cached(session)
+        if hit:
+            return user_id
+        return await asyncio.to_thread(self.session_users.resolve, session)
+
+
+def build_admission_control(settings, session_lookup: Callable[[str], str | None] | None = None) -> dict:
+    """Kwargs de ``AdmissionControlMiddleware`` según ``Settings`` (0 desactiva cada límite).
+
+    ``session_lookup`` resuelve el usuario de una sesión; sin él (sin Firestore) el rate
+    limit es sólo por IP.
+    """
+    rate_limiter = None
+    if settings.rate_limit_per_second > 0:
+        rate_limiter = RateLimiter(
+            load_backend(settings.rate_limit_backend), settings.rate_limit_per_second, settings.rate_limit_burst
+        )
+    concurrency = None
+    if settings.max_concurrent_requests > 0:
+        concurrency = ConcurrencyLimiter(
+            settings.max_concurrent_requests, settings.max_queued_requests, settings.queue_timeout_seconds
+        )
+    return {
+        "rate_limiter": rate_limiter,
+        "concurrency": concurrency,
+        "cookie_name": settings.session_cookie_name,
+        "trusted_proxy_hops": settings.trusted_proxy_hops,
+        "session_users": SessionUserCache(session_lookup) if rate_limiter and session_lookup else None,
+    }
@@ -2,13 +2,27 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from google.auth.exceptions import DefaultCredentialsError
 
-from app.api.routes import applications, projects, health, mocks, auth
+from app.api.routes import applications, projects, health, mocks, auth, analysis, technologies, search, metrics
+from app.core.auth_deps import build_auth_service
 from app.core.config import get_settings
 from app.core.logging import get_logger
 from app.core.firestore import get_firestore_client
+from app.core.rate_limit import AdmissionControlMiddleware, build_admission_control
+from app.core.firestore_resilience import RequestBudgetMiddleware, ResilientClient
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfiledJSONResponse, ProfilerMiddleware
 
 from app.services.project_services import ProjectsService
 from app.services.apps_services import AppsService
+from app.services.change_feed_service import ChangeFeedService
+from app.services.jobs_service import JobsService
+from app.services.graph_service import GraphService
+from app.services.tech_index_service import TechIndexService
+from app.services.summary_service import SummaryService
+from app.services.search_service import SearchService
+from app.services.owner_index_service import OwnerIndexService
+from app.services.email_index import EmailIndex
+from app.services.session_sweeper import SessionSweeper
 from app.api.routes import users
 
 
@@ -19,16 +33,8 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="Application Management API",
         version="1.0.0",
-    )
-
-    # CORS (necesario para cookies/sesiones desde el front)
-    origins = [o.strip() for o in settings.frontend_origins.split(",") if o.strip()]
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=origins,
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        # Mide la serialización de las respuestas (fase "encoding" del perfil por request)
+        default_response_class=ProfiledJSONResponse,
     )
 
     try:
@@ -44,8 +50,38 @@ def create_app() -> FastAPI:
             f"Motivo: {e}"
         )
 
+    if firestore is not None:
+        # Deadlines, reintentos de lecturas y circuit breaker para todos los servicios
+        firestore = ResilientClient(firestore, settings, logger)
     app.state.firestore = firestore
 
+    # Presupuesto de tiempo por request para las llamadas a Firestore (ver firestore_resilience)
+    app.add_middleware(RequestBudgetMiddleware, seconds=settings.request_budget_seconds)
+
+    # Control de admisión (rate limit + concurrencia). Se registra antes que CORS para
+    # que las respuestas 429/503 también lleven los headers de CORS.
+    # Las claves por usuario resuelven la sesión de la cookie (sin Firestore, sólo por IP)
+    session_lookup = build_auth_service(firestore, settings).session_user_id if firestore else None
+    app.state.admission = build_admission_control(settings, session_lookup)
+    app.add_middleware(AdmissionControlMiddleware, **app.state.admission)
+
+    # Latencia por ruta y requests en curso (incluye los rechazos del control de admisión)
+    app.add_middleware(MetricsMiddleware)
+
+    # Perfil por fases de cada request: header Server-Timing + una línea de log
+    app.add_middleware(ProfilerMiddleware, logger=logger, slow_ms=settings.profile_slow_request_ms)
+
+    # CORS (necesario para cookies/sesiones desde el front)
+    origins = [o.strip() for o in settings.frontend_origins.split(",") if o.strip()]
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+
     # Settings & logger
     app.state.settings = settings
     app.state.logger = logger
@@ -54,10 +90,40 @@ def create_app() -> FastAPI:
     # Services (si no hay Firestore, quedan deshabilitados y los endpoints devolverán 503)
     app.state.projects_service = ProjectsService(firestore, settings, logger) if firestore else None
     app.state.apps_service = AppsService(firestore, settings, logger) if firestore else None
+    app.state.change_feed = ChangeFeedService(firestore, settings, logger) if firestore else None
+    app.state.graph_service = GraphService(firestore, settings, logger) if firestore else None
+    app.state.tech_index = TechIndexService(firestore, settings, logger) if firestore else None
+    app.state.summary_service = SummaryService(firestore, settings, logger) if firestore else None
+    if app.state.graph_service:
+        app.state.graph_service.add_fragment_listener(app.state.tech_index.on_fragment)
+        app.state.graph_service.add_fragment_writer(app.state.summary_service.write_fragments)
+    app.state.owner_index = OwnerIndexService(firestore, settings, logger) if firestore else None
+    app.state.search_service = SearchService(firestore, settings, logger, app.state.change_feed) if firestore else None
+    if app.state.search_service:
+        app.add_event_handler("startup", app.state.search_service.start)
+    app.state.jobs_service = JobsService(firestore, settings, logger) if firestore else None
+    if app.state.jobs_service:
+        change_feed = app.state.change_feed
+        graph_service = app.state.graph_service
+        # Primero el grafo (que reescribe el summary de la app) y después el aviso del feed;
+        # el historial y el summary ya sellan ``updated_at`` en su propia escritura
+        app.state.jobs_service.add_completion_hook(graph_service.on_job_completed)
+        app.state.jobs_service.add_completion_hook(
+            lambda job: change_feed.notify(settings.apps_collection, job["application_id"])
+        )
+        app.add_event_handler("startup", app.state.jobs_service.start)
+        app.add_event_handler("shutdown", app.state.jobs_service.stop)
     app.state.users_service = None
     if firestore:
         from app.services.user_services import UsersService
         app.state.users_service = UsersService(firestore, settings, logger)
+    app.state.email_index = (
+        EmailIndex(firestore, settings.user_emails_collection, settings.users_collection) if firestore else None
+    )
+    app.state.session_sweeper = SessionSweeper(firestore, settings, logger) if firestore else None
+    if app.state.session_sweeper:
+        app.add_event_handler("startup", app.state.session_sweeper.start)
+        app.add_event_handler("shutdown", app.state.session_sweeper.stop)
 
 
     # Routers
@@ -67,6 +133,10 @@ def create_app() -> FastAPI:
     app.include_router(health.router)
     app.include_router(mocks.router)
     app.include_router(users.router)
+    app.include_router(analysis.router)
+    app.include_router(technologies.router)
+    app.include_router(search.router)
+    app.include_router(metrics.router)
     return app
 
 
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+AnalysisKind = Literal["code", "functional"]
+JobStatus = Literal["queued", "running", "done", "failed", "cancelled"]
+
+
+class AnalysisJobRequest(BaseModel):
+    application_id: str  # uuid-4
+    module_name: str = Field(..., max_length=140)
+    kind: AnalysisKind = "code"
+    priority: int = Field(default=5, ge=0, le=9)  # 9 = más prioritario
+
+
+class AnalysisJob(BaseModel):
+    id: str  # uuid-4
+    kind: AnalysisKind
+    tenant_id: str  # project_id de la aplicación
+    application_id: str
+    module_name: str
+    repo_url: str
+    repo_branch: str
+    priority: int = 5
+    status: JobStatus = "queued"
+    progress: int = 0
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    result_path: str | None = None
+    error: str | None = None
+    commit_sha: str | None = None
+    cache_hit: bool = False
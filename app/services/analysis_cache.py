@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+
+class AnalysisResultCache:
+    """Cache de resultados de análisis direccionado por contenido.
+
+    La clave es ``sha256(repo_url, branch, commit_sha, kind, model)``: el mismo commit
+    analizado con el mismo modelo produce el mismo resultado, así que un re-envío sin
+    cambios de código no vuelve a pasar por el LLM. Los resultados viven en
+    ``ANALYSIS_DIR/cache/<key>.json`` y se desalojan por LRU (mtime) cuando el total
+    supera ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(repo_url: str, branch: str, commit_sha: str, kind: str, model: str = "") -> str:
+        raw = "\n".join([repo_url.strip().rstrip("/"), branch, commit_sha, kind, model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        """Ruta del resultado cacheado o ``None``; un hit lo marca como usado recientemente."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return str(path)
+
+    def put(self, key: str, result_path: str) -> str:
+        """Copia un resultado al cache y aplica la política de desalojo."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        shutil.copyfile(result_path, tmp)
+        tmp.replace(path)
+        self.evict()
+        return str(path)
+
+    def evict(self) -> list[str]:
+        """Borra los resultados menos usados hasta quedar dentro de ``max_bytes``."""
+        removed = []
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed.append(path.stem)
+        return removed
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import json
+import re
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.services.repo_cache import RepoCache
+from app.utils.git import auth_env, run_git
+
+
+# Extensiones que se envían al modelo; el resto del repo se ignora.
+SOURCE_EXTENSIONS = {
+    ".py", ".java", ".kt", ".scala", ".cs", ".go", ".rb", ".php",
+    ".js", ".jsx", ".ts", ".tsx", ".sql",
+    ".xml", ".json", ".yml", ".yaml", ".toml", ".gradle", ".properties",
+}
+MAX_FILE_BYTES = 64 * 1024
+
+# Versión de los prompts: forma parte de la clave de cache de resultados y de la
+# compatibilidad con el job base, así un cambio de prompt no reutiliza análisis viejos.
+PROMPT_VERSION = 2
+LIFECYCLES = ("supported", "deprecated", "eol", "unknown")
+RISKS = ("LOW", "MEDIUM", "HIGH", "UNKNOWN")
+
+PROMPTS = {
+    "code": (
+        "Analizá el siguiente archivo de código fuente ({path}). Respondé SOLO con un JSON con las claves "
+        "\"summary\" (texto breve), \"technologies\" (lista de objetos con name, version, category, "
+        "lifecycle y risk) y \"external_systems\" (lista de objetos con name, protocol, description). "
+        "lifecycle es el estado de soporte de esa versión: \"supported\", \"deprecated\", \"eol\" (sin "
+        "soporte del fabricante) o \"unknown\". risk es el riesgo de seguir usándola: \"LOW\", \"MEDIUM\" "
+        "o \"HIGH\" (versiones sin soporte o con vulnerabilidades conocidas).\n\n{content}"
+    ),
+    "functional": (
+        "Describí la funcionalidad de negocio que implementa el siguiente archivo ({path}). Respondé SOLO "
+        "con un JSON con las claves \"summary\" (texto breve) y \"capabilities\" (lista de textos).\n\n{content}"
+    ),
+}
+
+
+class JobCancelled(Exception):
+    """El job fue cancelado mientras se ejecutaba."""
+
+
+class OllamaClient:
+    """Cliente mínimo de la API HTTP de Ollama (``/api/generate``)."""
+
+    def __init__(self, host: str, model: str, *, timeout: float = 300.0):
+        self.host = host.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+    def generate(self, prompt: str) -> str:
+        body = json.dumps({
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json",
+        }).encode("utf-8")
+        req = urllib.request.Request(
+            f"{self.host}/api/generate",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8")).get("response", "")
+
+
+def parse_model_json(text: str) -> dict:
+    """Parsea la respuesta del modelo tolerando texto alrededor del JSON."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else None
+        except ValueError:
+            data = None
+    return data if isinstance(data, dict) else {"summary": (text or "").strip()}
+
+
+class AnalysisService:
+    """Ejecuta el análisis de un módulo: checkout del repo, análisis por archivo con el
+    modelo (Ollama) y resultado agregado en ``ANALYSIS_DIR/<job_id>.json``."""
+
+    def __init__(
+        self,
+        settings,
+        logger,
+        model_client: OllamaClient | None = None,
+        repo_cache: RepoCache | None = None,
+    ):
+        self.settings = settings
+        self.logger = logger
+        self.model = model_client or OllamaClient(settings.ollama_host, settings.ollama_model)
+        self.repos_dir = Path(settings.repos_dir)
+        self.analysis_dir = Path(settings.analysis_dir)
+        self.repo_cache = repo_cache or RepoCache(
+            self.repos_dir, settings.repos_cache_max_mb * 1024 * 1024, logger
+        )
+
+    # ------------------------------------------------------------------
+    # Fuentes
+    # ------------------------------------------------------------------
+    def checkout(self, job: dict, credentials: dict | None = None) -> Path:
+        """Actualiza el mirror del repo y crea el worktree del job.
+
+        Se usa el commit resuelto al encolar (el mismo que da la clave de cache); si ya
+        no existe en el remoto se toma la punta actual del branch.
+        """
+        branch_ref = f"refs/heads/{job['repo_branch']}"
+        revs = [job["commit_sha"], branch_ref] if job.get("commit_sha") else [branch_ref]
+        return self.repo_cache.sync_checkout(job["repo_url"], revs, self.repos_dir / "jobs" / job["id"], credentials)
+
+    def resolve_commit(self, repo_url: str, branch: str, credentials: dict | None = None) -> str | None:
+        """SHA actual de ``branch`` en el remoto (``git ls-remote``), o ``None`` si no existe."""
+        creds = credentials or {}
+        env = auth_env(repo_url, creds.get("user", ""), creds.get("token", ""))
+        out = run_git("ls-remote", repo_url, f"refs/heads/{branch}", timeout=60.0, env=env)
+        return out.split()[0] if out.strip() else None
+
+    def release(self, job: dict, checkout: Path) -> None:
+        self.repo_cache.release(job["repo_url"], checkout)
+
+    @staticmethod
+    def list_files(root: Path) -> list[Path]:
+        files = []
+        for path in sorted(root.rglob("*")):
+            if ".git" in path.relative_to(root).parts or not path.is_file():
+                continue
+            if path.suffix.lower() in SOURCE_EXTENSIONS and path.stat().st_size <= MAX_FILE_BYTES:
+                files.append(path)
+        return files
+
+    # ------------------------------------------------------------------
+    # Análisis
+    # ------------------------------------------------------------------
+    def analyze_file(self, kind: str, rel_path: str, content: str) -> dict:
+        prompt = PROMPTS[kind].format(path=rel_path, content=content)
+        return parse_model_json(self.model.generate(prompt))
+
+    @staticmethod
+    def file_hashes(checkout: Path) -> dict[str, str]:
+        """Hash de contenido (blob id de git) de cada archivo del commit; no lee los archivos."""
+        hashes = {}
+        for line in run_git("ls-tree", "-r", "HEAD", cwd=checkout).splitlines():
+            meta, _, path = line.partition("\t")
+            parts = meta.split()
+            if len(parts) == 3 and parts[1] == "blob":
+                hashes[path] = parts[2]
+        return hashes
+
+    def reusable_files(self, job: dict, base_result: dict | None) -> tuple[dict[str, dict], dict[str, str]]:
+        """Análisis por archivo y hashes del job base, si es compatible con este job."""
+        if not base_result:
+            return {}, {}
+        if base_result.get("kind") != job["kind"] or base_result.get("model") != self.settings.ollama_model:
+            return {}, {}
+        if base_result.get("prompt_version") != PROMPT_VERSION:
+            return {}, {}
+        return base_result.get("files") or {}, base_result.get("file_hashes") or {}
+
+    def run(self, job: dict, ctx) -> str:
+        """Analiza el módulo del job y devuelve la ruta del resultado.
+
+        Si ``ctx.base_result`` trae el resultado del último job exitoso del módulo, sólo se
+        envían al modelo los archivos cuyo hash cambió; el resto se toma del resultado base.
+
+        Args:
+            job: Registro del job (ver ``AnalysisJob``).
+            ctx: ``JobContext`` para reportar avance y consultar cancelación.
+
+        Raises:
+            JobCancelled: Si se pidió cancelar el job durante la ejecución.
+        """
+        checkout = self.checkout(job, ctx.credentials)
+        try:
+            commit_sha = run_git("rev-parse", "HEAD", cwd=checkout).strip()
+            ctx.commit_sha = commit_sha
+            hashes = self.file_hashes(checkout)
+            base_files, base_hashes = self.reusable_files(job, getattr(ctx, "base_result", None))
+
+            results: dict[str, dict] = {}
+            pending: list[tuple[str, Path]] = []
+            for path in self.list_files(checkout):
+                rel = path.relative_to(checkout).as_posix()
+                if rel in base_files and hashes.get(rel) and base_hashes.get(rel) == hashes[rel]:
+                    results[rel] = base_files[rel]
+                else:
+                    pending.append((rel, path))
+            reused = len(results)
+
+            for i, (rel, path) in enumerate(pending, start=1):
+                ctx.check_cancelled()
+                content = path.read_text(encoding="utf-8", errors="replace")
+                results[rel] = self.analyze_file(job["kind"], rel, content)
+                ctx.report(
+                    int(i * 100 / (len(pending) + 1)),
+                    {"files_done": reused + i, "files_total": reused + len(pending), "files_reused": reused},
+                )
+
+            incremental = {
+                "base_job_id": (ctx.base_result or {}).get("job_id") if base_files else None,
+                "files_reused": reused,
+                "files_analyzed": len(pending),
+            }
+            file_hashes = {rel: hashes[rel] for rel in results if rel in hashes}
+            return self.write_result(job, commit_sha, results, file_hashes=file_hashes, incremental=incremental)
+        finally:
+            self.release(job, checkout)
+
+    def write_result(
+        self,
+        job: dict,
+        commit_sha: str,
+        files: dict[str, dict],
+        *,
+        file_hashes: dict[str, str] | None = None,
+        incremental: dict | None = None,
+    ) -> str:
+        result = {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "application_id": job["application_id"],
+            "module_name": job["module_name"],
+            "repo_url": job["repo_url"],
+            "repo_branch": job["repo_branch"],
+            "commit_sha": commit_sha,
+            "model": self.settings.ollama_model,
+            "prompt_version": PROMPT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "files": files,
+            "file_hashes": file_hashes or {},
+            **(incremental or {}),
+            **aggregate(files),
+        }
+        self.analysis_dir.mkdir(parents=True, exist_ok=True)
+        path = self.analysis_dir / f"{job['id']}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+        return str(path)
+
+    def load_result(self, result_path: str) -> dict:
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def aggregate(files: dict[str, dict]) -> dict:
+    """Consolida tecnologías y sistemas externos de los análisis por archivo."""
+    technologies: dict[tuple, dict] = {}
+    external: dict[str, dict] = {}
+    for analysis in files.values():
+        for tech in analysis.get("technologies") or []:
+            if isinstance(tech, dict) and tech.get("name"):
+                key = (str(tech["name"]).strip().lower(), str(tech.get("version") or "").strip())
+                current = technologies.setdefault(key, tech)
+                # Otro archivo puede traer lifecycle/risk que el primero no informó
+                for field, unknown in (("lifecycle", "unknown"), ("risk", "UNKNOWN")):
+                    if str(current.get(field) or unknown) == unknown and tech.get(field):
+                        technologies[key] = current = {**current, field: tech[field]}
+        for system in analysis.get("external_systems") or []:
+            if isinstance(system, dict) and system.get("name"):
+                external.setdefault(str(system["name"]).strip().lower(), system)
+    return {
+        "technologies": list(technologies.values()),
+        "external_systems": list(external.values()),
+    }
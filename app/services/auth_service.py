@@ -1,46 +1,123 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from google.api_core.exceptions import NotFound
+from google.cloud import firestore
 from passlib.context import CryptContext
 
+from app.services.email_index import EmailIndex, email_key, email_variants
+
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 
+@lru_cache()
+def get_pwd_context(rounds: int = 0) -> CryptContext:
+    """Contexto de hashing con ``rounds`` fijas (0 = default de passlib).
+
+    Con ``rounds`` explícitas también se fijan mínimo y máximo, así ``needs_update``
+    marca los hashes hechos con otro costo (más alto o más bajo) para rehashearlos.
+    Las rounds se calibran con ``scripts/calibrate_password_hash.py``.
+    """
+    if not rounds:
+        return pwd_context
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+        pbkdf2_sha256__max_rounds=rounds,
+    )
+
+# Datos del usuario que se copian en la sesión para servir ``/auth/me`` sin leer ``users``.
+PROFILE_FIELDS = ("email", "full_name", "role")
+# Máximo de escrituras por batch de Firestore.
+BATCH_SIZE = 500
+
+
 class AuthService:
-    def __init__(self, db, *, session_ttl_hours: int = 8, users_collection: str = "users", sessions_collection: str = "sessions"):
+    def __init__(
+        self,
+        db,
+        *,
+        session_ttl_hours: int = 8,
+        users_collection: str = "users",
+        sessions_collection: str = "sessions",
+        emails_collection: str = "user_emails",
+        user_sessions_collection: str = "user_sessions",
+        password_rounds: int = 0,
+    ):
         self.db = db
         self.users = db.collection(users_collection)
+        self.emails = EmailIndex(db, emails_collection, users_collection)
         self.sessions = db.collection(sessions_collection)
+        # ``user_sessions/{user_id}.session_ids``: sesiones abiertas de cada usuario
+        self.user_sessions = db.collection(user_sessions_collection)
         self.session_ttl_hours = session_ttl_hours
+        self.pwd_context = get_pwd_context(password_rounds)
 
     def get_user_by_email(self, email: str) -> dict | None:
-        docs = list(self.users.where("email", "==", email).limit(1).stream())
-        if not docs:
+        user_id = self.emails.user_id_for(email)
+        if user_id:
+            doc = self.users.document(user_id).get()
+            data = (doc.to_dict() or {}) if doc.exists else {}
+            if email_key(data.get("email")) == email_key(email):
+                data["id"] = doc.id
+                return data
+
+        if not email_key(email) or self.emails.is_backfilled():
             return None
-        doc = docs[0]
-        data = doc.to_dict() or {}
-        data["id"] = doc.id
-        return data
+        # Usuarios creados antes del índice (hasta correr scripts/backfill_email_index.py):
+        # se buscan por igualdad con las variantes del email y se indexan
+        for doc in self.users.where("email", "in", email_variants(email)).stream():
+            data = doc.to_dict() or {}
+            if email_key(data.get("email")) != email_key(email):
+                continue
+            data["id"] = doc.id
+            self.emails.backfill(email, doc.id)
+            return data
+        return None
 
     def verify_password(self, plain: str, hashed: str) -> bool:
-        return pwd_context.verify(plain, hashed)
+        return self.pwd_context.verify(plain, hashed)
+
+    def verify_and_update(self, plain: str, hashed: str) -> tuple[bool, str | None]:
+        """Verifica ``plain`` y, si el hash usa otros parámetros, devuelve uno nuevo."""
+        if not hashed:
+            return False, None
+        return self.pwd_context.verify_and_update(plain, hashed)
 
     def hash_password(self, plain: str) -> str:
-        return pwd_context.hash(plain)
+        return self.pwd_context.hash(plain)
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        self.users.document(user_id).update({
+            "password_hash": password_hash,
+            "password_updated_at": datetime.now(timezone.utc),
+        })
 
     def create_session(self, user: dict) -> str:
         now = datetime.now(timezone.utc)
         expires = now + timedelta(hours=self.session_ttl_hours)
 
         doc_ref = self.sessions.document()  # auto id
-        doc_ref.set({
+        batch = self.db.batch()
+        batch.set(doc_ref, {
             "user_id": user["id"],
             "email": user["email"],
+            "full_name": user.get("full_name", ""),
             "role": user.get("role", "user"),
             "created_at": now,
             "expires_at": expires,
         })
+        batch.set(self.user_sessions.document(user["id"]), {
+            "user_id": user["id"],
+            "session_ids": firestore.ArrayUnion([doc_ref.id]),
+            "updated_at": now,
+        }, merge=True)
+        batch.commit()
         return doc_ref.id
 
     def get_session(self, session_id: str) -> dict | None:
@@ -51,11 +128,130 @@ class AuthService:
         data["id"] = doc.id
         return data
 
-    def delete_session(self, session_id: str) -> None:
-        self.sessions.document(session_id).delete()
+    def session_user_id(self, session_id: str) -> str | None:
+        """Usuario de una sesión vigente (``None`` si no existe o venció)."""
+        doc = self.sessions.document(session_id).get(field_paths=["user_id", "expires_at"])
+        session = (doc.to_dict() or {}) if doc.exists else {}
+        if not session or self.is_session_expired(session):
+            return None
+        return session.get("user_id")
+
+    def delete_session(self, session_id: str, user_id: str | None = None) -> None:
+        ref = self.sessions.document(session_id)
+        if user_id is None:
+            doc = ref.get(field_paths=["user_id"])
+            user_id = (doc.to_dict() or {}).get("user_id") if doc.exists else None
+        batch = self.db.batch()
+        batch.delete(ref)
+        if user_id:
+            unindex_sessions(batch, self.user_sessions, user_id, [session_id])
+        batch.commit()
+
+    def session_profile(self, session: dict) -> dict | None:
+        """Perfil embebido en la sesión (``None`` si el usuario ya no existe).
+
+        Las sesiones creadas antes de embeber el perfil no tienen ``full_name``: se lee
+        el usuario una vez y se guarda en la sesión para las próximas llamadas.
+        """
+        if "full_name" not in session:
+            doc = self.users.document(session.get("user_id") or "-").get(field_paths=list(PROFILE_FIELDS))
+            if not doc.exists:
+                return None
+            profile = {k: v for k, v in (doc.to_dict() or {}).items() if k in PROFILE_FIELDS}
+            profile.setdefault("full_name", "")
+            self.sessions.document(session["id"]).update(profile)
+            session = {**session, **profile}
+        return {
+            "user_id": session.get("user_id"),
+            "email": session.get("email"),
+            "full_name": session.get("full_name", ""),
+            "role": session.get("role", "user"),
+        }
+
+    def refresh_user_sessions(self, user_id: str, profile: dict | None) -> int:
+        """Propaga un cambio del usuario a sus sesiones abiertas.
+
+        Las sesiones se resuelven con el índice ``user_sessions/{user_id}`` (una lectura
+        más un ``get_all``). Las sesiones abiertas antes del índice no figuran en él
+        aunque el documento exista: mientras el índice no tenga ``backfilled`` se une la
+        consulta por ``user_id``, las sesiones que encuentra se agregan y se marca
+        ``backfilled`` (las sesiones nuevas se indexan al crearse, así que la consulta
+        corre una sola vez por usuario). Todo se actualiza o borra en un único batch, que
+        además quita del índice las sesiones que ya no existen.
+
+        Args:
+            user_id: Usuario modificado.
+            profile: Datos nuevos (``email``, ``full_name``, ``role``). ``None`` revoca las
+                sesiones (usuario borrado o desactivado).
+
+        Returns:
+            Cantidad de sesiones tocadas.
+        """
+        index_ref = self.user_sessions.document(user_id)
+        index_doc = index_ref.get()
+        index = (index_doc.to_dict() or {}) if index_doc.exists else {}
+        session_ids = list(index.get("session_ids") or [])
+        refs = [self.sessions.document(sid) for sid in session_ids]
+        docs = {doc.id: doc for doc in (self.db.get_all(refs) if refs else []) if doc.exists}
+        backfilled = bool(index.get("backfilled"))
+        if not backfilled:
+            for doc in self.sessions.where("user_id", "==", user_id).stream():
+                docs.setdefault(doc.id, doc)
+
+        changes = {k: v for k, v in (profile or {}).items() if k in PROFILE_FIELDS}
+        stale = [sid for sid in session_ids if sid not in docs]
+        unindexed = [sid for sid in docs if sid not in session_ids]
+        writes = [
+            (doc.reference, (lambda b, ref=doc.reference: b.delete(ref)) if profile is None
+             else (lambda b, ref=doc.reference: b.update(ref, changes)))
+            for doc in docs.values()
+        ]
+        if profile is None:
+            writes.append((None, lambda b: b.delete(index_ref)))
+        else:
+            if stale:
+                writes.append((None, lambda b: unindex_sessions(b, self.user_sessions, user_id, stale)))
+            if unindexed or not backfilled:
+                data = {"user_id": user_id, "backfilled": True, "updated_at": datetime.now(timezone.utc)}
+                if unindexed:
+                    data["session_ids"] = firestore.ArrayUnion(unindexed)
+                writes.append((None, lambda b: b.set(index_ref, data, merge=True)))
+        for start in range(0, len(writes), BATCH_SIZE):
+            self._commit_session_writes(writes[start:start + BATCH_SIZE])
+        return len(docs)
+
+    def _commit_session_writes(self, writes: list) -> None:
+        """Commitea ``writes`` (``(ref de la sesión | None, write)``) en un batch.
+
+        Si una sesión se borró (logout, barrido) entre la lectura y el commit, el
+        ``update`` hace fallar el batch entero con ``NotFound``: se descartan las
+        sesiones que ya no existen y se reintenta con el resto.
+        """
+        while writes:
+            batch = self.db.batch()
+            for _, write in writes:
+                write(batch)
+            try:
+                batch.commit()
+                return
+            except NotFound:
+                refs = [ref for ref, _ in writes if ref is not None]
+                live = {doc.id for doc in self.db.get_all(refs) if doc.exists} if refs else set()
+                remaining = [(ref, write) for ref, write in writes if ref is None or ref.id in live]
+                if len(remaining) == len(writes):
+                    raise
+                writes = remaining
 
     def is_session_expired(self, session: dict) -> bool:
         exp = session.get("expires_at")
         if not exp:
             return False
         return exp < datetime.now(timezone.utc)
+
+
+def unindex_sessions(batch, user_sessions, user_id: str, session_ids: list[str]) -> None:
+    """Agrega a ``batch`` la baja de ``session_ids`` del índice de sesiones del usuario."""
+    batch.set(user_sessions.document(user_id), {
+        "session_ids": firestore.ArrayRemove(list(session_ids)),
+        "updated_at": datetime.now(timezone.utc),
+    }, merge=True)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from google.cloud import firestore
+
+# El token del snapshot inicial se toma con el reloj local y los sellos son del servidor:
+# se retrocede este margen para no perder escrituras por desfase de relojes (los eventos
+# repetidos son upserts idempotentes).
+SNAPSHOT_SKEW_SECONDS = 5
+
+
+def encode_token(ts: datetime, doc_id: str = "") -> str:
+    """Serializa la posición del feed (timestamp + id de desempate) como token opaco."""
+    raw = f"{ts.isoformat()}|{doc_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token: str) -> tuple[datetime, str]:
+    """Inversa de ``encode_token``.
+
+    Raises:
+        ValueError: Si el token no tiene el formato esperado.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        ts_raw, doc_id = raw.split("|", 1)
+        ts = datetime.fromisoformat(ts_raw)
+    except Exception:
+        raise ValueError(f"Token de cambios inválido: {token}")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts, doc_id
+
+
+def _filters(**values: str | None) -> dict[str, str]:
+    return {field: value for field, value in values.items() if value}
+
+
+def _after(query, field: str, ts: datetime, last_id: str):
+    """``query`` desde el cursor del token: después de ``(ts, last_id)``, o desde ``ts``
+    inclusive si el token no tiene id (snapshot inicial)."""
+    if last_id:
+        return query.start_after({field: ts, "__name__": last_id})
+    return query.start_at({field: ts})
+
+
+class ChangeFeedService:
+    """Feed incremental de cambios sobre colecciones de Firestore.
+
+    Cada escritura sella el documento con ``updated_at`` (``SERVER_TIMESTAMP``) y cada
+    borrado deja una lápida en la colección de tombstones. Consultar
+    ``changes(since=token)`` lee sólo los documentos posteriores al token, así el costo
+    del polling depende de lo que cambió y no del tamaño total. El token es
+    ``(timestamp, id)``: las consultas ordenan por ambos y siguen desde ese cursor, así
+    una página avanza aunque más de ``limit`` documentos compartan el timestamp.
+
+    Quien escribe la entidad debería sellarla en la misma escritura (``stamp``) y
+    avisar con ``notify``; ``mark_updated``/``mark_deleted`` sellan con una escritura
+    aparte para las entidades que se guardan fuera de este servicio.
+    """
+
+    def __init__(self, db, settings, logger):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.tombstones = db.collection(settings.tombstones_collection)
+        self._listeners: list[Callable[[str, str], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        """Registra ``listener(collection, doc_id)``, llamado tras cada ``mark_updated``/``mark_deleted``."""
+        self._listeners.append(listener)
+
+    def notify(self, collection: str, doc_id: str) -> None:
+        """Avisa a los listeners de un documento ya sellado con ``stamp``."""
+        self._notify(collection, doc_id)
+
+    def _notify(self, collection: str, doc_id: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(collection, doc_id)
+            except Exception as e:
+                self.logger.error(f"{doc_id} | Listener del feed de cambios falló: {e}")
+
+    # ------------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------------
+    @staticmethod
+    def stamp(data: dict) -> dict:
+        """``data`` con ``updated_at`` sellado por el servidor, para la escritura de la entidad."""
+        return {**data, "updated_at": firestore.SERVER_TIMESTAMP}
+
+    def tombstone(
+        self, writes, collection: str, doc_id: str, *, project_id: str | None = None, user_id: str | None = None
+    ) -> None:
+        """Agrega la lápida de ``doc_id`` a ``writes`` (el batch o transacción del borrado).
+
+        ``project_id``/``user_id`` son los del documento borrado, para los feeds filtrados.
+        """
+        writes.set(self.tombstones.document(f"{collection}:{doc_id}"), {
+            "collection": collection,
+            "doc_id": doc_id,
+            "project_id": project_id,
+            "user_id": user_id,
+            "deleted_at": firestore.SERVER_TIMESTAMP,
+        })
+
+    def mark_updated(self, collection: str, doc_id: str) -> bool:
+        """Sella ``updated_at`` en un documento recién creado/actualizado.
+
+        La entidad ya se guardó: si el sello falla se loguea y se devuelve ``False`` en
+        vez de hacer fallar el request (el documento entra al feed con su próxima escritura).
+        """
+        try:
+            self.db.collection(collection).document(doc_id).set(self.stamp({}), merge=True)
+        except Exception as e:
+            self.logger.error(f"{doc_id} | No se pudo sellar el cambio en {collection}: {e}")
+            return False
+        self._notify(collection, doc_id)
+        return True
+
+    def mark_deleted(
+        self, collection: str, doc_id: str, *, project_id: str | None = None, user_id: str | None = None
+    ) -> bool:
+        """Registra la lápida de un documento borrado (si falla se loguea, como ``mark_updated``)."""
+        try:
+            batch = self.db.batch()
+            self.tombstone(batch, collection, doc_id, project_id=project_id, user_id=user_id)
+            batch.commit()
+        except Exception as e:
+            self.logger.error(f"{doc_id} | No se pudo registrar el borrado en {collection}: {e}")
+            return False
+        self._notify(collection, doc_id)
+        return True
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def changes(
+        self,
+        collection: str,
+        since: str | None = None,
+        *,
+        limit: int = 500,
+        project_id: str | None = None,
+        user_id: str | None = None,
+    ) -> dict[str, Any]:
+        """Devuelve los documentos creados/actualizados/borrados desde ``since``.
+
+        Args:
+            collection: Colección de Firestore a observar.
+            since: Token devuelto por una llamada anterior. Sin token se devuelve
+                el snapshot completo (sincronización inicial).
+            limit: Máximo de eventos por página.
+            project_id: Filtra los documentos por ``project_id`` (aplicaciones).
+            user_id: Filtra los documentos por dueño (``user_id``, proyectos).
+
+        Returns:
+            dict con ``changes`` (documentos vigentes), ``deleted`` (ids borrados),
+            ``next_token`` y ``has_more``.
+
+        Raises:
+            ValueError: Si el token es inválido.
+        """
+        filters = _filters(project_id=project_id, user_id=user_id)
+        if since is None:
+            return self._snapshot(collection, filters)
+
+        ts, last_id = decode_token(since)
+        upserts = self.db.collection(collection)
+        tombstones = self.tombstones.where("collection", "==", collection)
+        # Los filtros van en la consulta (índices compuestos en ``firestore.indexes.json``):
+        # así ``limit`` cuenta sólo los cambios que se devuelven.
+        for field, value in filters.items():
+            upserts = upserts.where(field, "==", value)
+            tombstones = tombstones.where(field, "==", value)
+
+        # Cada consulta sigue desde el cursor (timestamp, id): los empates de timestamp
+        # se recorren por id, así cada página avanza.
+        events: list[tuple[datetime, str, str, dict | None]] = []
+        upserts = _after(upserts.order_by("updated_at").order_by("__name__"), "updated_at", ts, last_id)
+        for doc in upserts.limit(limit).stream():
+            data = doc.to_dict() or {}
+            events.append((data["updated_at"], doc.id, "upsert", data))
+        saturated = len(events) >= limit
+
+        # El id de la lápida es "{collection}:{doc_id}", con el mismo orden que doc_id
+        tombstones = _after(
+            tombstones.order_by("deleted_at").order_by("__name__"),
+            "deleted_at", ts, f"{collection}:{last_id}" if last_id else "",
+        )
+        n_tombstones = 0
+        for doc in tombstones.limit(limit).stream():
+            data = doc.to_dict() or {}
+            events.append((data["deleted_at"], data["doc_id"], "delete", data))
+            n_tombstones += 1
+        saturated = saturated or n_tombstones >= limit
+
+        events.sort(key=lambda e: (e[0], e[1], e[2]))
+        has_more = saturated or len(events) > limit
+        events = events[:limit]
+
+        changed: list[dict] = []
+        deleted: list[str] = []
+        for _, doc_id, kind, data in events:
+            if kind == "upsert":
+                changed.append(self._public(doc_id, data))
+            else:
+                deleted.append(doc_id)
+
+        next_token = encode_token(events[-1][0], events[-1][1]) if events else since
+        return {"changes": changed, "deleted": deleted, "next_token": next_token, "has_more": has_more}
+
+    def _snapshot(self, collection: str, filters: dict[str, str]) -> dict[str, Any]:
+        # El token se toma antes de leer: lo escrito durante el listado vuelve en el próximo poll.
+        token = encode_token(datetime.now(timezone.utc) - timedelta(seconds=SNAPSHOT_SKEW_SECONDS))
+        query = self.db.collection(collection)
+        for field, value in filters.items():
+            query = query.where(field, "==", value)
+        changed = [self._public(doc.id, doc.to_dict() or {}) for doc in query.stream()]
+        return {"changes": changed, "deleted": [], "next_token": token, "has_more": False}
+
+    @staticmethod
+    def _public(doc_id: str, data: dict) -> dict:
+        data = {k: v for k, v in data.items() if k != "updated_at"}
+        data.setdefault("id", doc_id)
+        for module in data.get("modules") or []:
+            repo = module.get("repo") if isinstance(module, dict) else None
+            if isinstance(repo, dict):
+                # repo_token / repo_usr son write-only
+                repo.pop("repo_token", None)
+                repo.pop("repo_usr", None)
+        return data
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from google.api_core.exceptions import AlreadyExists
+
+# Una reserva sin confirmar más vieja que esto se considera abandonada (p. ej. la
+# instancia murió entre ``reserve`` y ``bind``) y puede tomarla otro alta.
+RESERVATION_TTL = timedelta(minutes=5)
+# Documento del índice que marca que ya se indexaron todos los usuarios previos
+# (``backfill_all``). No es un email válido, así que no choca con ninguna entrada.
+BACKFILL_MARKER = "_backfill"
+# Usuarios leídos por página durante ``backfill_all``.
+BACKFILL_PAGE_SIZE = 500
+
+# Índices ya completos, por cliente: la marca no se borra, así que una vez vista no se relee.
+_backfilled: "weakref.WeakKeyDictionary[object, set[str]]" = weakref.WeakKeyDictionary()
+
+
+def email_key(email: str | None) -> str:
+    """Clave normalizada del índice (sin espacios y en minúsculas)."""
+    return str(email or "").strip().lower()
+
+
+def email_variants(email: str | None) -> list[str]:
+    """Formas en que un email previo al índice pudo quedar guardado en ``users.email``.
+
+    Firestore compara por igualdad exacta: hasta completar el índice se busca con
+    ``in`` por lo recibido, sin espacios y normalizado.
+    """
+    raw = str(email or "")
+    return [v for v in dict.fromkeys((raw, raw.strip(), email_key(raw))) if v]
+
+
+class EmailIndex:
+    """Índice único ``email -> user_id`` en ``user_emails/{email}``.
+
+    La unicidad la garantiza ``create()``: sólo una escritura puede crear el documento
+    de un email, así que dos altas concurrentes con el mismo email no pueden ganar las
+    dos. El flujo de escritura es:
+
+    - ``reserve(email)`` antes de crear/cambiar el usuario (falla si el email ya existe).
+    - ``bind(email, user_id, previous_email)`` al confirmar: apunta la reserva al usuario
+      y libera el email anterior en el mismo batch.
+    - ``release(email)`` si la escritura del usuario falla o el usuario se borra.
+
+    Las lecturas (login, ``/auth/me``, seed) pasan a ser lecturas puntuales por id.
+    Los usuarios creados antes del índice se incorporan una vez con ``backfill_all``
+    (``scripts/backfill_email_index.py``), que deja la marca ``BACKFILL_MARKER``;
+    hasta entonces quien no encuentre un email en el índice debe buscarlo en ``users``.
+    """
+
+    def __init__(self, db, collection: str = "user_emails", users_collection: str = "users"):
+        self.db = db
+        self.collection = collection
+        self.index = db.collection(collection)
+        self.users = db.collection(users_collection)
+
+    def _ref(self, email: str):
+        key = email_key(email)
+        if not key or "/" in key or "@" not in key:
+            raise ValueError(f"Email inválido: {email!r}")
+        return self.index.document(key)
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+    def user_id_for(self, email: str) -> str | None:
+        try:
+            doc = self._ref(email).get()
+        except ValueError:
+            return None
+        return (doc.to_dict() or {}).get("user_id") if doc.exists else None
+
+    def is_backfilled(self) -> bool:
+        """Si ya están indexados todos los usuarios previos al índice (``backfill_all``)."""
+        if self.collection in _backfilled.get(self.db, ()):
+            return True
+        doc = self.index.document(BACKFILL_MARKER).get()
+        if not (doc.exists and (doc.to_dict() or {}).get("backfilled")):
+            return False
+        _backfilled.setdefault(self.db, set()).add(self.collection)
+        return True
+
+    def current_email(self, user_id: str) -> str | None:
+        doc = self.users.document(user_id).get(field_paths=["email"])
+        return (doc.to_dict() or {}).get("email") if doc.exists else None
+
+    # ------------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------------
+    def reserve(self, email: str) -> None:
+        """Reserva ``email`` para un alta o cambio de email.
+
+        Raises:
+            ValueError: Si el email ya pertenece a otro usuario (o a una reserva vigente).
+        """
+        ref = self._ref(email)
+        now = datetime.now(timezone.utc)
+        data = {"email": email_key(email), "user_id": None, "reserved_at": now}
+        try:
+            ref.create(data)
+            return
+        except AlreadyExists:
+            pass
+
+        doc = ref.get()
+        current = (doc.to_dict() or {}) if doc.exists else {}
+        reserved_at = current.get("reserved_at")
+        if doc.exists and (current.get("user_id") or not reserved_at or now - reserved_at < RESERVATION_TTL):
+            raise ValueError(f"El email {email} ya está registrado")
+        # Reserva abandonada (o borrada entre el create y el get): se reintenta una vez
+        if doc.exists:
+            ref.delete()
+        try:
+            ref.create(data)
+        except AlreadyExists:
+            raise ValueError(f"El email {email} ya está registrado")
+
+    def bind(self, email: str, user_id: str, previous_email: str | None = None) -> None:
+        """Confirma la reserva de ``email`` para ``user_id`` y libera ``previous_email``."""
+        now = datetime.now(timezone.utc)
+        batch = self.db.batch()
+        batch.set(self._ref(email), {"email": email_key(email), "user_id": user_id, "updated_at": now})
+        if previous_email and email_key(previous_email) != email_key(email):
+            batch.delete(self._ref(previous_email))
+        batch.commit()
+
+    def release(self, email: str | None, user_id: str | None = None) -> None:
+        """Libera ``email``; con ``user_id`` sólo si la entrada es de ese usuario o una reserva."""
+        if not email_key(email):
+            return
+        ref = self._ref(email)
+        if user_id is not None:
+            doc = ref.get()
+            if not doc.exists or (doc.to_dict() or {}).get("user_id") not in (None, user_id):
+                return
+        ref.delete()
+
+    def backfill(self, email: str, user_id: str) -> bool:
+        """Indexa un usuario creado antes del índice (si nadie tomó el email mientras tanto).
+
+        Returns:
+            ``True`` si el email quedó apuntando a ``user_id`` (recién creado o ya estaba).
+        """
+        try:
+            self._ref(email).create({
+                "email": email_key(email),
+                "user_id": user_id,
+                "updated_at": datetime.now(timezone.utc),
+            })
+            return True
+        except ValueError:
+            return False
+        except AlreadyExists:
+            return self.user_id_for(email) == user_id
+
+    def backfill_all(self, log: Callable[[str], None] | None = None) -> dict:
+        """Indexa todos los usuarios de ``users`` y, si no hubo conflictos, deja la marca.
+
+        Es idempotente: se puede volver a correr tras resolver los conflictos (dos
+        usuarios cuyos emails sólo difieren en mayúsculas/espacios, o emails inválidos).
+
+        Returns:
+            dict con ``indexed`` (usuarios recorridos con el email indexado) y
+            ``conflicts`` (``{"user_id", "email", "indexed_user_id"}`` por usuario sin indexar).
+        """
+        result = {"indexed": 0, "conflicts": []}
+        query = self.users.order_by("__name__").limit(BACKFILL_PAGE_SIZE)
+        page = list(query.stream())
+        while page:
+            for doc in page:
+                email = (doc.to_dict() or {}).get("email")
+                if email and self.backfill(email, doc.id):
+                    result["indexed"] += 1
+                else:
+                    result["conflicts"].append({
+                        "user_id": doc.id,
+                        "email": email,
+                        "indexed_user_id": self.user_id_for(email) if email else None,
+                    })
+            if log:
+                log(f"{result['indexed']} usuarios indexados, {len(result['conflicts'])} con conflicto")
+            page = list(query.start_after({"__name__": page[-1].id}).stream())
+
+        if not result["conflicts"]:
+            self.index.document(BACKFILL_MARKER).set({"backfilled": True, "updated_at": datetime.now(timezone.utc)})
+            _backfilled.setdefault(self.db, set()).add(self.collection)
+        return result
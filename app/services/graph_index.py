@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+from app.core.metrics import record_cache
+
+# Peso de cada nivel de criticidad en los recorridos de impacto.
+CRITICALITY_WEIGHTS = {"critical": 5, "high": 3, "medium": 2, "low": 1}
+DEFAULT_WEIGHT = 1
+
+DIRECTIONS = ("out", "in", "both")
+
+# Atributos filtrables de nodo -> ruta dentro del nodo.
+FILTER_ATTRIBUTES = {
+    "domain": ("domain",),
+    "type": ("type",),
+    "criticality": ("criticality",),
+    "risk": ("metadata", "risk"),
+}
+
+
+def _norm(value) -> str:
+    return str(value).strip().lower()
+
+
+def _attr(node: dict, path: tuple[str, ...]):
+    cur = node
+    for key in path:
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(key)
+    return cur
+
+
+def parse_filters(**values: list[str] | None) -> dict[str, set[str]]:
+    """Normaliza filtros ``attr -> valores``; acepta valores repetidos o separados por coma."""
+    filters = {}
+    for attr, raw in values.items():
+        if attr not in FILTER_ATTRIBUTES:
+            raise ValueError(f"Atributo de filtro no soportado: {attr}")
+        wanted = {_norm(v) for item in raw or [] for v in str(item).split(",") if v.strip()}
+        if wanted:
+            filters[attr] = wanted
+    return filters
+
+
+def _strip_metadata(item: dict) -> dict:
+    return {k: v for k, v in item.items() if k != "metadata"}
+
+
+def _csr(count: int, pairs: list[tuple[int, int]]) -> tuple[array, array]:
+    """Arma (offsets, targets) CSR a partir de pares (origen, destino) ya internados."""
+    offsets = array("i", [0]) * (count + 1)
+    for src, _ in pairs:
+        offsets[src + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    targets = array("i", [0]) * len(pairs)
+    cursor = array("i", offsets[:count])
+    for src, dst in pairs:
+        targets[cursor[src]] = dst
+        cursor[src] += 1
+    return offsets, targets
+
+
+class CompactGraph:
+    """Índice de adyacencia compacto de un grafo ``{nodes, links}``.
+
+    Los ids de nodo se internan a enteros y las aristas se guardan en arrays CSR
+    (``array('i')``) de salida y de entrada; los atributos completos de nodos y
+    aristas se conservan aparte sólo para armar las respuestas.
+
+    Convención de aristas: ``source`` depende de ``target``. Recorrer aristas de
+    entrada desde X devuelve quién depende de X (su impacto).
+    """
+
+    def __init__(self, graph: dict):
+        self.version = graph.get("version")
+        self.project_id = graph.get("project_id")
+        self.nodes: list[dict] = []
+        self.index: dict[str, int] = {}
+        for node in graph.get("nodes") or []:
+            if node.get("id") not in self.index:
+                self.index[node["id"]] = len(self.nodes)
+                self.nodes.append(node)
+
+        self.links: list[dict] = []
+        out_pairs, in_pairs = [], []
+        for link in graph.get("links") or []:
+            src, dst = self.index.get(link.get("source")), self.index.get(link.get("target"))
+            if src is None or dst is None:
+                continue
+            out_pairs.append((src, len(self.links)))
+            in_pairs.append((dst, len(self.links)))
+            self.links.append(link)
+
+        # Los arrays de aristas guardan el índice de la arista; el vecino sale de link_src/link_dst.
+        count = len(self.nodes)
+        self.link_src = array("i", (self.index[l["source"]] for l in self.links))
+        self.link_dst = array("i", (self.index[l["target"]] for l in self.links))
+        self.out_offsets, self.out_links = _csr(count, out_pairs)
+        self.in_offsets, self.in_links = _csr(count, in_pairs)
+        self.weights = array("i", (
+            CRITICALITY_WEIGHTS.get(str(n.get("criticality") or "").lower(), DEFAULT_WEIGHT) for n in self.nodes
+        ))
+        # Índices por atributo: valor normalizado -> índices de nodo.
+        self.attr_index: dict[str, dict[str, set[int]]] = {attr: {} for attr in FILTER_ATTRIBUTES}
+        for idx, node in enumerate(self.nodes):
+            for attr, path in FILTER_ATTRIBUTES.items():
+                value = _attr(node, path)
+                if value is not None:
+                    self.attr_index[attr].setdefault(_norm(value), set()).add(idx)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node_index(self, node_id: str) -> int:
+        try:
+            return self.index[node_id]
+        except KeyError:
+            raise ValueError(f"Nodo {node_id} no encontrado en el grafo") from None
+
+    def edges(self, idx: int, direction: str):
+        """Itera ``(vecino, índice_de_arista)`` de ``idx`` en la dirección pedida."""
+        if direction in ("out", "both"):
+            for pos in range(self.out_offsets[idx], self.out_offsets[idx + 1]):
+                link = self.out_links[pos]
+                yield self.link_dst[link], link
+        if direction in ("in", "both"):
+            for pos in range(self.in_offsets[idx], self.in_offsets[idx + 1]):
+                link = self.in_links[pos]
+                yield self.link_src[link], link
+
+    def _bfs(self, start: int, direction: str, max_depth: int | None = None):
+        """BFS desde ``start``; devuelve (distancias, padres, aristas recorridas)."""
+        dist = {start: 0}
+        parent: dict[int, tuple[int, int]] = {}
+        edges: set[int] = set()
+        queue = deque([start])
+        while queue:
+            idx = queue.popleft()
+            if max_depth is not None and dist[idx] >= max_depth:
+                continue
+            for nxt, link in self.edges(idx, direction):
+                edges.add(link)
+                if nxt not in dist:
+                    dist[nxt] = dist[idx] + 1
+                    parent[nxt] = (idx, link)
+                    queue.append(nxt)
+        return dist, parent, edges
+
+    # ------------------------------------------------------------------
+    # Filtros
+    # ------------------------------------------------------------------
+    def select(self, filters: dict[str, set[str]]) -> set[int] | None:
+        """Nodos que cumplen todos los filtros (OR dentro de un atributo); ``None`` si no hay filtros."""
+        selected = None
+        for attr, values in filters.items():
+            index = self.attr_index[attr]
+            matches = set().union(*(index.get(v, ()) for v in values))
+            selected = matches if selected is None else selected & matches
+        return selected
+
+    def view(
+        self,
+        nodes=None,
+        links=None,
+        filters: dict[str, set[str]] | None = None,
+        keep=(),
+        include_metadata: bool = True,
+    ) -> dict:
+        """Proyección ``{nodes, links}`` del grafo.
+
+        Args:
+            nodes: Índices de nodo a considerar (todos si es ``None``).
+            links: Índices de arista a considerar (todas si es ``None``).
+            filters: Filtros por atributo (ver ``parse_filters``); sólo se conservan las
+                aristas cuyos dos extremos sobreviven.
+            keep: Índices de nodo que se conservan aunque no cumplan los filtros.
+            include_metadata: Si es ``False`` se omite ``metadata`` de nodos y aristas.
+        """
+        allowed = set(range(len(self.nodes))) if nodes is None else set(nodes)
+        selected = self.select(filters or {})
+        if selected is not None:
+            allowed = (allowed & selected) | (allowed & set(keep))
+        link_ids = range(len(self.links)) if links is None else sorted(links)
+        out_links = [
+            self.links[e] for e in link_ids
+            if self.link_src[e] in allowed and self.link_dst[e] in allowed
+        ]
+        out_nodes = [self.nodes[i] for i in sorted(allowed)]
+        if not include_metadata:
+            out_nodes = [_strip_metadata(n) for n in out_nodes]
+            out_links = [_strip_metadata(l) for l in out_links]
+        return {"nodes": out_nodes, "links": out_links}
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def neighborhood(self, node_id: str, depth: int = 1, direction: str = "both") -> dict:
+        """Subgrafo a ``depth`` saltos de ``node_id``."""
+        start = self.node_index(node_id)
+        dist, _, edges = self._bfs(start, direction, max_depth=depth)
+        edges = {e for e in edges if self.link_src[e] in dist and self.link_dst[e] in dist}
+        return {
+            "node_id": node_id,
+            "depth": depth,
+            "direction": direction,
+            "nodes": [{**self.nodes[i], "distance": d} for i, d in sorted(dist.items(), key=lambda x: (x[1], x[0]))],
+            "links": [self.links[e] for e in sorted(edges)],
+        }
+
+    def shortest_path(self, source: str, target: str, directed: bool = False) -> dict:
+        """Camino más corto (en saltos) entre dos nodos; ``found=False`` si no están conectados."""
+        start, goal = self.node_index(source), self.node_index(target)
+        dist, parent, _ = self._bfs(start, "out" if directed else "both")
+        if goal not in dist:
+            return {"source": source, "target": target, "found": False, "length": None, "nodes": [], "links": []}
+        path_nodes, path_links = [goal], []
+        while path_nodes[-1] != start:
+            prev, link = parent[path_nodes[-1]]
+            path_nodes.append(prev)
+            path_links.append(link)
+        path_nodes.reverse()
+        path_links.reverse()
+        return {
+            "source": source,
+            "target": target,
+            "found": True,
+            "length": len(path_links),
+            "nodes": [self.nodes[i] for i in path_nodes],
+            "links": [self.links[e] for e in path_links],
+        }
+
+    def impact(self, node_id: str, max_depth: int | None = None) -> dict:
+        """Nodos que dependen (directa o transitivamente) de ``node_id``.
+
+        Cada nodo afectado aporta su peso de criticidad dividido por la distancia, de
+        modo que una aplicación crítica que depende directamente pesa más que una
+        de baja criticidad a varios saltos.
+        """
+        start = self.node_index(node_id)
+        dist, _, _ = self._bfs(start, "in", max_depth=max_depth)
+        affected = []
+        for idx, d in dist.items():
+            if idx == start:
+                continue
+            weight = self.weights[idx]
+            affected.append({**self.nodes[idx], "distance": d, "weight": weight, "score": round(weight / d, 4)})
+        affected.sort(key=lambda n: (-n["score"], n["distance"], n["id"]))
+        return {
+            "node_id": node_id,
+            "max_depth": max_depth,
+            "affected_count": len(affected),
+            "impact_score": round(sum(n["score"] for n in affected), 4),
+            "affected": affected,
+        }
+
+
+def filter_graph(graph: dict, filters: dict[str, set[str]], include_metadata: bool = True, keep=()) -> dict:
+    """Aplica ``CompactGraph.view`` a un grafo en formato ``{nodes, links}`` conservando el resto de claves."""
+    index = CompactGraph(graph)
+    keep_idx = [index.index[k] for k in keep if k in index.index]
+    return {**graph, **index.view(filters=filters, keep=keep_idx, include_metadata=include_metadata)}
+
+
+def _digest(item: dict) -> str:
+    canonical = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _keyed(items: list[dict], key) -> dict[str, tuple[str, dict]]:
+    """``hash(clave) -> (hash(contenido), item)`` para comparar en tiempo lineal."""
+    out = {}
+    for item in items:
+        k = hashlib.blake2b(key(item).encode("utf-8"), digest_size=16).hexdigest()
+        out[k] = (_digest(item), item)
+    return out
+
+
+def _diff_items(before: list[dict], after: list[dict], key) -> dict:
+    old, new = _keyed(before, key), _keyed(after, key)
+    added = [item for k, (_, item) in new.items() if k not in old]
+    removed = [item for k, (_, item) in old.items() if k not in new]
+    changed = [
+        {"before": old[k][1], "after": item}
+        for k, (digest, item) in new.items()
+        if k in old and old[k][0] != digest
+    ]
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def diff_graphs(before: dict, after: dict) -> dict:
+    """Delta entre dos grafos ``{nodes, links}``: nodos y aristas agregados, quitados y cambiados.
+
+    Los nodos se identifican por ``id`` y las aristas por ``(source, target, label)``;
+    cada lado se indexa por hash de la clave y se compara el hash del contenido.
+    """
+    nodes = _diff_items(before.get("nodes") or [], after.get("nodes") or [], lambda n: str(n.get("id")))
+    links = _diff_items(
+        before.get("links") or [],
+        after.get("links") or [],
+        lambda l: f"{l.get('source')}\x1f{l.get('target')}\x1f{l.get('label')}",
+    )
+    return {
+        "nodes": nodes,
+        "links": links,
+        "summary": {
+            f"{kind}_{change}": len(section[change])
+            for kind, section in (("nodes", nodes), ("links", links))
+            for change in ("added", "removed", "changed")
+        },
+    }
+
+
+class GraphIndexCache:
+    """Cache LRU de ``CompactGraph`` por proyecto, validado por ``version`` del grafo."""
+
+    def __init__(self, max_projects: int = 64):
+        self.max_projects = max_projects
+        self._items: OrderedDict[str, CompactGraph] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, project_id: str, version) -> CompactGraph | None:
+        with self._lock:
+            index = self._items.get(project_id)
+            if index is None or index.version != version:
+                record_cache("graph_index", False)
+                return None
+            self._items.move_to_end(project_id)
+        record_cache("graph_index", True)
+        return index
+
+    def put(self, project_id: str, index: CompactGraph) -> None:
+        with self._lock:
+            self._items[project_id] = index
+            self._items.move_to_end(project_id)
+            while len(self._items) > self.max_projects:
+                self._items.popitem(last=False)
+
+    def invalidate(self, project_id: str) -> None:
+        with self._lock:
+            self._items.pop(project_id, None)
@@ -0,0 +1,507 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from google.cloud import firestore
+
+from app.core.metrics import record_cache
+from app.services.analysis_service import LIFECYCLES, RISKS
+from app.services.graph_index import CompactGraph, GraphIndexCache, diff_graphs
+
+
+SERVICE_DEPENDENCY = "SERVICE_DEPENDENCY"
+USES_TECH = "USES_TECH"
+# El documento del grafo sólo guarda la versión: nodos y aristas salen de los fragmentos.
+GRAPH_FIELDS = ["project_id", "version", "updated_at", "fragments"]
+# Subcolección con un documento por aplicación (``relation_graphs/{project_id}/fragments/{app_id}``).
+FRAGMENTS_COLLECTION = "fragments"
+# Máximo de escrituras por batch de Firestore.
+BATCH_SIZE = 500
+# Diffs entre snapshots guardados en memoria (por par de jobs).
+DIFF_CACHE_SIZE = 128
+
+
+def slug(text: str) -> str:
+    folded = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^A-Z0-9]+", "_", folded.upper()).strip("_")
+
+
+def tech_node_id(name: str, version: str = "") -> str:
+    return f"TECH_{slug(name)}" + (f"_{slug(version)}" if version else "")
+
+
+def link_id(source: str, target: str, label: str) -> str:
+    return f"REL_{source}__{target}__{label}"
+
+
+class GraphService:
+    """Grafo de relaciones materializado por proyecto.
+
+    Cada aplicación aporta un *fragmento* (su nodo, las tecnologías que usa y los sistemas
+    de los que depende según sus análisis), guardado en su propio documento de
+    ``relation_graphs/{project_id}/fragments``; ``relation_graphs/{project_id}`` sólo
+    guarda la versión. Así ningún documento crece con el proyecto (límite de 1 MiB de
+    Firestore): el grafo se arma uniendo los fragmentos guardados, sin volver a leer
+    aplicaciones, jobs ni resultados, y el índice en cache se reutiliza mientras la
+    versión no cambie. Cuando una aplicación o módulo cambia sólo se recalcula su
+    fragmento; un proyecto sin grafo se materializa en la primera lectura.
+
+    Fragmentos y versión se escriben en una transacción de Firestore que lee todos los
+    fragmentos: si otra instancia cambia alguno en el medio, la transacción se reintenta
+    y ningún cambio se pierde.
+
+    Convención de aristas (igual que ``mock_project_relation_graph.json``): ``source``
+    depende de ``target``.
+    """
+
+    def __init__(self, db, settings, logger):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.graphs = db.collection(settings.graphs_collection)
+        self.apps = db.collection(settings.apps_collection)
+        self.projects = db.collection(settings.projects_collection)
+        self.jobs = db.collection(settings.jobs_collection)
+        self._locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._listeners: list[Callable[[str, dict], None]] = []
+        self._fragment_listeners: list[Callable[[str, str, dict | None, dict | None], None]] = []
+        self._fragment_writers: list[Callable[[object, str, dict, dict], None]] = []
+        self.indexes = GraphIndexCache()
+        self.snapshots_dir = Path(settings.analysis_dir) / "graphs"
+        self._diffs: OrderedDict[tuple, dict] = OrderedDict()
+        self._diffs_lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, dict], None]) -> None:
+        """Registra ``listener(project_id, graph)``, llamado tras cada materialización."""
+        self._listeners.append(listener)
+
+    def add_fragment_listener(self, listener: Callable[[str, str, dict | None, dict | None], None]) -> None:
+        """Registra ``listener(project_id, app_id, fragment, previous)``.
+
+        ``fragment`` es ``None`` si la aplicación salió del grafo y ``previous`` si no estaba.
+        """
+        self._fragment_listeners.append(listener)
+
+    def add_fragment_writer(self, writer: Callable[[object, str, dict, dict], None]) -> None:
+        """Registra ``writer(transaction, project_id, changes, previous)``.
+
+        Se llama dentro de la transacción que guarda los fragmentos, así sus escrituras
+        (p. ej. el ``summary`` de cada aplicación) se confirman junto con el grafo. Puede
+        ejecutarse más de una vez si la transacción se reintenta.
+        """
+        self._fragment_writers.append(writer)
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+    def get_project_graph(self, project_id: str) -> dict:
+        """Grafo del proyecto, unido a partir de los fragmentos guardados.
+
+        Si el proyecto existe pero su grafo todavía no se materializó, se construye y se
+        guarda en esta lectura; las siguientes leen lo guardado.
+
+        Raises:
+            ValueError: Si el proyecto no existe.
+        """
+        doc = self.graphs.document(project_id).get(field_paths=GRAPH_FIELDS)
+        if not doc.exists:
+            if not self.projects.document(project_id).get(field_paths=["id"]).exists:
+                raise ValueError(f"Proyecto {project_id} no encontrado")
+            return self.rebuild_project(project_id)
+        current = doc.to_dict() or {}
+        # Grafos guardados con los fragmentos embebidos (se migran con la próxima escritura)
+        fragments = dict(current.get("fragments") or {})
+        for fragment in self._fragments(project_id).stream():
+            fragments[fragment.id] = fragment.to_dict() or {}
+        graph = materialize(fragments)
+        graph.update(project_id=project_id, version=current.get("version"), updated_at=current.get("updated_at"))
+        return graph
+
+    def get_project_index(self, project_id: str) -> CompactGraph:
+        """Índice compacto del grafo del proyecto para consultas de recorrido.
+
+        Sólo se lee ``version`` para validar el índice en cache; si otra instancia
+        re-materializó el grafo la versión cambia y el índice se reconstruye.
+        """
+        doc = self.graphs.document(project_id).get(field_paths=["version"])
+        version = (doc.to_dict() or {}).get("version") if doc.exists else None
+        index = self.indexes.get(project_id, version) if version is not None else None
+        if index is None:
+            index = CompactGraph(self.get_project_graph(project_id))
+            self.indexes.put(project_id, index)
+        return index
+
+    def get_project_view(self, project_id: str, filters: dict | None = None, include_metadata: bool = True) -> dict:
+        """Grafo del proyecto filtrado por atributos de nodo, resuelto sobre el índice en cache."""
+        index = self.get_project_index(project_id)
+        view = index.view(filters=filters, include_metadata=include_metadata)
+        return {"project_id": project_id, "version": index.version, **view}
+
+    def get_app_relations(self, app_id: str, filters: dict | None = None, include_metadata: bool = True) -> dict:
+        """Subgrafo de dependencias de servicio alrededor de una aplicación."""
+        return self._app_view(app_id, SERVICE_DEPENDENCY, "both", filters, include_metadata)
+
+    def get_app_tech_dependencies(self, app_id: str, filters: dict | None = None, include_metadata: bool = True) -> dict:
+        """Tecnologías que usa una aplicación (aristas ``USES_TECH``)."""
+        return self._app_view(app_id, USES_TECH, "out", filters, include_metadata)
+
+    def _app_view(self, app_id: str, label: str, direction: str, filters, include_metadata) -> dict:
+        index = self.get_project_index(self._project_of(app_id))
+        center = index.node_index(app_id)
+        nodes, links = {center}, set()
+        for neighbor, link in index.edges(center, direction):
+            if index.links[link]["label"] == label:
+                nodes.add(neighbor)
+                links.add(link)
+        view = index.view(nodes, links, filters=filters, keep=[center], include_metadata=include_metadata)
+        return {"app_id": app_id, **view}
+
+    def _project_of(self, app_id: str) -> str:
+        doc = self.apps.document(app_id).get()
+        if not doc.exists:
+            raise ValueError(f"Aplicación {app_id} no encontrada")
+        return (doc.to_dict() or {}).get("project_id", "")
+
+    # ------------------------------------------------------------------
+    # Actualización incremental
+    # ------------------------------------------------------------------
+    def on_application_changed(self, app_id: str) -> dict:
+        """Recalcula el fragmento de una aplicación y re-materializa su proyecto."""
+        doc = self.apps.document(app_id).get()
+        if not doc.exists:
+            raise ValueError(f"Aplicación {app_id} no encontrada")
+        app_data = doc.to_dict() or {}
+        app_data.setdefault("id", app_id)
+        project_id = app_data.get("project_id", "")
+        if not self.graphs.document(project_id).get(field_paths=["version"]).exists:
+            # Sin grafo previo no hay fragmentos del resto de las aplicaciones: se arma completo.
+            return self.rebuild_project(project_id)
+        fragment = self.build_fragment(app_data)
+        return self._update(project_id, {app_id: fragment})
+
+    def on_application_deleted(self, app_id: str, project_id: str) -> dict:
+        return self._update(project_id, {app_id: None})
+
+    def on_job_completed(self, job: dict) -> dict:
+        """Hook de fin de análisis: actualiza el grafo y guarda el snapshot resultante del job."""
+        graph = self.on_application_changed(job["application_id"])
+        self.save_snapshot(job["id"], graph)
+        return graph
+
+    def on_project_deleted(self, project_id: str) -> None:
+        with self._locks[project_id]:
+            ref = self.graphs.document(project_id)
+            doc = ref.get(field_paths=["fragments"])
+            previous = ((doc.to_dict() or {}).get("fragments") or {}) if doc.exists else {}
+            refs = [ref]
+            for fragment in self._fragments(project_id).stream():
+                previous[fragment.id] = fragment.to_dict() or {}
+                refs.append(fragment.reference)
+            for start in range(0, len(refs), BATCH_SIZE):
+                batch = self.db.batch()
+                for item in refs[start:start + BATCH_SIZE]:
+                    batch.delete(item)
+                batch.commit()
+            if self._fragment_writers and previous:
+                batch = self.db.batch()
+                for writer in self._fragment_writers:
+                    writer(batch, project_id, dict.fromkeys(previous), previous)
+                batch.commit()
+        self.indexes.invalidate(project_id)
+        self._notify_fragments(project_id, dict.fromkeys(previous), previous)
+
+    def rebuild_project(self, project_id: str) -> dict:
+        """Construye y guarda el grafo completo del proyecto desde las aplicaciones guardadas."""
+        return self._update(project_id, self._build_fragments(project_id), replace=True)
+
+    def _build_fragments(self, project_id: str) -> dict[str, dict]:
+        fragments = {}
+        for doc in self.apps.where("project_id", "==", project_id).stream():
+            app_data = doc.to_dict() or {}
+            app_data.setdefault("id", doc.id)
+            fragments[doc.id] = self.build_fragment(app_data)
+        return fragments
+
+    def _fragments(self, project_id: str):
+        return self.graphs.document(project_id).collection(FRAGMENTS_COLLECTION)
+
+    def _update(self, project_id: str, changes: dict[str, dict | None], *, replace: bool = False) -> dict:
+        # El lock evita reintentos entre threads de esta instancia; entre instancias
+        # resuelve la transacción.
+        with self._locks[project_id]:
+            try:
+                graph, changes, previous = firestore.transactional(self._write_graph)(
+                    self.db.transaction(), project_id, changes, replace
+                )
+            except ValueError as e:
+                # Errores del cliente (p. ej. una referencia inválida en la transacción): no
+                # son "no encontrado" y las rutas no deben responderlos como 404.
+                raise RuntimeError(f"No se pudo escribir el grafo del proyecto {project_id}: {e}") from e
+            self.indexes.invalidate(project_id)
+        for listener in self._listeners:
+            try:
+                listener(project_id, graph)
+            except Exception as e:
+                self.logger.error(f"{project_id} | Listener de grafo falló: {e}")
+        self._notify_fragments(project_id, changes, previous)
+        return graph
+
+    def _write_graph(self, transaction, project_id: str, changes: dict[str, dict | None], replace: bool):
+        """Cuerpo de la transacción: aplica ``changes`` a los fragmentos y re-materializa.
+
+        Devuelve ``(grafo, cambios aplicados, fragmentos previos)``.
+        """
+        ref = self.graphs.document(project_id)
+        doc = next(iter(transaction.get(ref)), None)
+        current = (doc.to_dict() or {}) if doc is not None and doc.exists else {}
+        # Grafos guardados con los fragmentos embebidos: se migran en esta escritura.
+        legacy = current.get("fragments") or {}
+        # ``Transaction.get`` acepta documentos o consultas, no colecciones
+        fragments_query = self._fragments(project_id).order_by("__name__")
+        stored = {item.id: item.to_dict() or {} for item in transaction.get(fragments_query)}
+        previous = {**legacy, **stored}
+
+        fragments = dict(previous)
+        if replace:
+            # Las aplicaciones que ya no están en el proyecto salen del grafo.
+            changes = {**dict.fromkeys(set(previous) - set(changes)), **changes}
+        for app_id, fragment in changes.items():
+            if fragment is None:
+                fragments.pop(app_id, None)
+            else:
+                fragments[app_id] = fragment
+
+        collection = self._fragments(project_id)
+        writes = {**{app_id: legacy[app_id] for app_id in legacy if app_id not in stored}, **changes}
+        for app_id, fragment in writes.items():
+            if fragment is None:
+                transaction.delete(collection.document(app_id))
+            else:
+                transaction.set(collection.document(app_id), fragment)
+        for writer in self._fragment_writers:
+            writer(transaction, project_id, changes, previous)
+
+        header = {
+            "project_id": project_id,
+            "version": int(current.get("version") or 0) + 1,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        # Sin ``merge``: reemplaza los nodos/aristas/fragmentos de documentos anteriores
+        transaction.set(ref, header)
+        return {**materialize(fragments), **header}, changes, previous
+
+    def _notify_fragments(self, project_id: str, changes: dict[str, dict | None], previous: dict[str, dict]) -> None:
+        for app_id, fragment in changes.items():
+            for listener in self._fragment_listeners:
+                try:
+                    listener(project_id, app_id, fragment, previous.get(app_id))
+                except Exception as e:
+                    self.logger.error(f"{app_id} | Listener de fragmento falló: {e}")
+
+    # ------------------------------------------------------------------
+    # Snapshots y diffs
+    # ------------------------------------------------------------------
+    def save_snapshot(self, job_id: str, graph: dict) -> str:
+        """Guarda el grafo del proyecto tal como quedó tras ``job_id`` (junto a los resultados)."""
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        path = self.snapshots_dir / f"{job_id}.json"
+        snapshot = {**graph, "job_id": job_id}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot, ensure_ascii=False, default=str), encoding="utf-8")
+        tmp.replace(path)
+        return str(path)
+
+    def load_snapshot(self, job_id: str) -> dict:
+        """Snapshot guardado por ``save_snapshot``.
+
+        Raises:
+            ValueError: Si ``job_id`` no es un id de job (uuid) o no tiene snapshot.
+        """
+        try:
+            job_id = str(uuid.UUID(job_id))
+        except (TypeError, ValueError):
+            raise ValueError(f"No hay snapshot de grafo para el job {job_id}") from None
+        path = self.snapshots_dir / f"{job_id}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No hay snapshot de grafo para el job {job_id}") from None
+
+    def diff(self, project_id: str, from_job: str, to_job: str | None = None) -> dict:
+        """Delta entre el grafo de ``from_job`` y el de ``to_job`` (o el grafo actual).
+
+        Los snapshots son inmutables, así que el diff de un par de jobs se calcula una
+        sola vez; contra el grafo actual la clave incluye su ``version``.
+        """
+        before = self._project_snapshot(project_id, from_job)
+        if to_job:
+            after = self._project_snapshot(project_id, to_job)
+            key = (project_id, from_job, to_job)
+        else:
+            after = self.get_project_graph(project_id)
+            key = (project_id, from_job, "current", after.get("version"))
+
+        with self._diffs_lock:
+            cached = self._diffs.get(key)
+            if cached is not None:
+                self._diffs.move_to_end(key)
+        record_cache("graph_diff", cached is not None)
+        if cached is not None:
+            return cached
+
+        result = {
+            "project_id": project_id,
+            "from_job": from_job,
+            "to_job": to_job,
+            "from_version": before.get("version"),
+            "to_version": after.get("version"),
+            **diff_graphs(before, after),
+        }
+        with self._diffs_lock:
+            self._diffs[key] = result
+            while len(self._diffs) > DIFF_CACHE_SIZE:
+                self._diffs.popitem(last=False)
+        return result
+
+    def _project_snapshot(self, project_id: str, job_id: str) -> dict:
+        snapshot = self.load_snapshot(job_id)
+        if snapshot.get("project_id") != project_id:
+            raise ValueError(f"El job {job_id} no pertenece al proyecto {project_id}")
+        return snapshot
+
+    # ------------------------------------------------------------------
+    # Fragmentos
+    # ------------------------------------------------------------------
+    def build_fragment(self, app_data: dict) -> dict:
+        """Nodo de la aplicación + tecnologías y dependencias de sus últimos análisis."""
+        technologies: dict[str, dict] = {}
+        dependencies: dict[str, dict] = {}
+        for module in app_data.get("modules") or []:
+            result = self._latest_result(module)
+            if not result:
+                continue
+            for tech in result.get("technologies") or []:
+                node = tech_node(tech)
+                entry = technologies.setdefault(node["id"], {"node": node, "modules": []})
+                entry["modules"].append(module.get("name"))
+            for system in result.get("external_systems") or []:
+                name = str(system.get("name") or "").strip()
+                if name:
+                    dependencies.setdefault(name.lower(), {
+                        "name": name,
+                        "protocol": system.get("protocol"),
+                        "description": system.get("description"),
+                    })
+
+        app_node = {
+            "id": app_data["id"],
+            "label": app_data.get("name", ""),
+            "type": "ApplicationComponent",
+            "domain": app_data.get("domain"),
+            "criticality": app_data.get("criticality"),
+            "metadata": {
+                "owner": app_data.get("owner"),
+                "tech_stack": sorted({t["node"]["label"] for t in technologies.values()}),
+                "modules": len(app_data.get("modules") or []),
+            },
+        }
+        return {
+            "app": app_node,
+            "technologies": [
+                {**t["node"], "modules": sorted(m for m in t["modules"] if m)} for t in technologies.values()
+            ],
+            "dependencies": list(dependencies.values()),
+        }
+
+    def _latest_result(self, module: dict) -> dict | None:
+        history = module.get("code_analysis_history") or []
+        for item in sorted(history, key=lambda h: str(h.get("date")), reverse=True):
+            doc = self.jobs.document(item.get("job_id", "")).get()
+            result_path = (doc.to_dict() or {}).get("result_path") if doc.exists else None
+            if not result_path:
+                continue
+            try:
+                with open(result_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                continue
+        return None
+
+
+def tech_node(tech: dict) -> dict:
+    name = str(tech.get("name") or "").strip()
+    version = str(tech.get("version") or "").strip()
+    category = tech.get("category") or "unknown"
+    # Sólo valores conocidos: lo que el modelo invente queda como desconocido
+    lifecycle = str(tech.get("lifecycle") or "").strip().lower()
+    risk = str(tech.get("risk") or "").strip().upper()
+    return {
+        "id": tech_node_id(name, version),
+        "label": name,
+        "type": "TechnologyService" if category in {"database", "messaging", "cache"} else "SystemSoftware",
+        "category": category,
+        "metadata": {
+            "version": version,
+            "lifecycle": lifecycle if lifecycle in LIFECYCLES else "unknown",
+            "risk": risk if risk in RISKS else "UNKNOWN",
+        },
+    }
+
+
+def materialize(fragments: dict[str, dict]) -> dict:
+    """Une los fragmentos de las aplicaciones en el grafo ``{nodes, links}`` del proyecto."""
+    nodes: dict[str, dict] = {}
+    links: dict[str, dict] = {}
+    apps_by_name = {
+        str(f["app"].get("label") or "").strip().lower(): app_id for app_id, f in fragments.items()
+    }
+
+    for app_id in sorted(fragments):
+        nodes[app_id] = fragments[app_id]["app"]
+
+    for app_id in sorted(fragments):
+        fragment = fragments[app_id]
+        for tech in fragment.get("technologies") or []:
+            node = {k: v for k, v in tech.items() if k != "modules"}
+            nodes.setdefault(node["id"], node)
+            rid = link_id(app_id, node["id"], USES_TECH)
+            links[rid] = {
+                "id": rid,
+                "source": app_id,
+                "target": node["id"],
+                "label": USES_TECH,
+                "metadata": {"modules": tech.get("modules") or []},
+            }
+        for dep in fragment.get("dependencies") or []:
+            target = apps_by_name.get(dep["name"].strip().lower())
+            if target == app_id:
+                continue
+            if target is None:
+                target = f"EXT_{slug(dep['name'])}"
+                nodes.setdefault(target, {
+                    "id": target,
+                    "label": dep["name"],
+                    "type": "ExternalSystem",
+                    "domain": "External",
+                    "criticality": None,
+                    "metadata": {},
+                })
+            rid = link_id(app_id, target, SERVICE_DEPENDENCY)
+            links[rid] = {
+                "id": rid,
+                "source": app_id,
+                "target": target,
+                "label": SERVICE_DEPENDENCY,
+                "direction": "outbound",
+                "metadata": {"protocol": dep.get("protocol"), "description": dep.get("description")},
+            }
+    return {"nodes": list(nodes.values()), "links": list(links.values())}
@@ -0,0 +1,569 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+from google.cloud import firestore
+
+from app.core.metrics import record_cache
+from app.models.analysis_models import AnalysisJobRequest
+from app.models.core_models import AnalysisHistoryItem
+from app.services.analysis_cache import AnalysisResultCache
+from app.services.analysis_service import PROMPT_VERSION, AnalysisService, JobCancelled
+from app.services.change_feed_service import ChangeFeedService
+
+
+ACTIVE_STATUSES = ("queued", "running")
+HISTORY_FIELDS = {"code": "code_analysis_history", "functional": "functional_analysis_history"}
+
+# Escritura mínima entre actualizaciones de avance persistidas (cuidar cuota de Firestore).
+PROGRESS_PERSIST_SECONDS = 5.0
+# Jobs terminados que se mantienen en memoria para consultas/streams sin I/O.
+MAX_FINISHED_IN_MEMORY = 500
+# Intentos (con backoff) para persistir el estado final de un job si Firestore falla.
+PERSIST_ATTEMPTS = 3
+PERSIST_BACKOFF_SECONDS = 0.5
+# Lease de los jobs activos: la instancia dueña lo renueva cada tercio del plazo; vencido,
+# cualquier instancia puede reclamar el job (``recover``).
+JOB_LEASE_SECONDS = 60.0
+# Máximo de escrituras por batch de Firestore.
+BATCH_SIZE = 500
+
+
+class JobContext:
+    """Canal entre el job en ejecución y el motor: avance, parciales y cancelación."""
+
+    def __init__(self, engine: "JobsService", job_id: str, credentials: dict | None):
+        self._engine = engine
+        self.job_id = job_id
+        self.credentials = credentials or {}
+        self.cancel_event = threading.Event()
+        self.shutdown_event = engine._shutdown
+        self.commit_sha: str | None = None
+        self.base_result: dict | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def interrupted(self) -> bool:
+        """El servicio se está deteniendo (sin cancelación pedida por el usuario)."""
+        return self.shutdown_event.is_set() and not self.cancelled
+
+    def check_cancelled(self) -> None:
+        if self.cancelled or self.shutdown_event.is_set():
+            raise JobCancelled(self.job_id)
+
+    def report(self, progress: int, partial: dict | None = None) -> None:
+        self._engine._on_progress(self.job_id, progress, partial)
+
+
+class JobsService:
+    """Motor de jobs de análisis en proceso.
+
+    - Tabla de jobs persistida en Firestore (``settings.jobs_collection``). Cada job
+      activo lleva ``owner`` y ``lease_until``: la instancia dueña renueva el lease y al
+      arrancar (y periódicamente) se reclaman en una transacción los jobs
+      ``queued``/``running`` cuyo lease venció, así con varias instancias cada job corre
+      en una sola.
+    - Pool de ``settings.analysis_workers`` threads con cola por prioridad y límite de
+      concurrencia por tenant (``project_id`` de la aplicación).
+    - Cancelación de jobs encolados o en ejecución.
+    - Al completar agrega un ``AnalysisHistoryItem`` al módulo y dispara los hooks
+      registrados con ``add_completion_hook``.
+    - Los resultados se cachean por (repo, branch, commit, tipo, modelo): un re-envío
+      del mismo commit se completa al instante apuntando al resultado cacheado.
+    """
+
+    def __init__(
+        self,
+        db,
+        settings,
+        logger,
+        analysis_service: AnalysisService | None = None,
+        result_cache: AnalysisResultCache | None = None,
+        *,
+        workers: int | None = None,
+        tenant_concurrency: int | None = None,
+    ):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.analysis = analysis_service or AnalysisService(settings, logger)
+        self.result_cache = result_cache or AnalysisResultCache(
+            Path(settings.analysis_dir) / "cache",
+            settings.analysis_cache_max_mb * 1024 * 1024,
+        )
+        self.jobs = db.collection(settings.jobs_collection)
+        self.apps = db.collection(settings.apps_collection)
+        self.workers = workers or settings.analysis_workers
+        self.tenant_concurrency = tenant_concurrency or settings.analysis_tenant_concurrency
+
+        self._cond = threading.Condition()
+        self._queue: list[tuple[int, int, str]] = []
+        self._seq = itertools.count()
+        self._jobs: dict[str, dict] = {}
+        self._versions: dict[str, int] = defaultdict(int)
+        self._partials: dict[str, dict] = {}
+        self._contexts: dict[str, JobContext] = {}
+        self._running_by_tenant: dict[str, int] = defaultdict(int)
+        self._last_persist: dict[str, float] = {}
+        self._finished: deque[str] = deque()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        # Apagado de la instancia: corta los jobs en curso sin terminarlos (ver ``stop``)
+        self._shutdown = threading.Event()
+        self._hooks: list[Callable[[dict], None]] = []
+        self._app_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self.instance_id = f"{socket.gethostname()}-{uuid4().hex[:8]}"
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._shutdown.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            t = threading.Thread(target=self._lease_loop, name="analysis-leases", daemon=True)
+            t.start()
+            self._threads.append(t)
+        self.recover()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Detiene los workers (shutdown de la instancia).
+
+        Los jobs en curso se interrumpen pero no se cancelan: quedan ``queued``/``running``
+        en Firestore con el lease liberado, para que ``recover`` los re-encole en otra
+        instancia (o en la próxima) sin esperar a que venza.
+        """
+        with self._cond:
+            self._stopping = True
+            self._shutdown.set()
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        try:
+            self._write_leases({"owner": None, "lease_until": None})
+        except Exception as e:
+            self.logger.error(f"No se pudieron liberar los leases de los jobs de análisis: {e}")
+
+    def recover(self) -> int:
+        """Reclama y re-encola los jobs activos sin lease vigente (instancia caída o apagada).
+
+        Cada job se reclama en una transacción que verifica el lease y lo toma
+        (``owner`` + ``lease_until``): si varias instancias lo intentan, sólo una lo encola.
+        """
+        recovered = 0
+        now = datetime.now(timezone.utc)
+        for doc in self.jobs.where("status", "in", list(ACTIVE_STATUSES)).stream():
+            job = doc.to_dict() or {}
+            if not job.get("id") or job["id"] in self._jobs or _leased(job, now):
+                continue
+            try:
+                job = firestore.transactional(self._claim)(self.db.transaction(), doc.reference)
+            except Exception as e:
+                self.logger.error(f"{job['id']} | No se pudo reclamar el job de análisis: {e}")
+                continue
+            if job is None:
+                continue
+            job["status"] = "queued"
+            job["progress"] = 0
+            self._enqueue(job, credentials=None)
+            recovered += 1
+        if recovered:
+            self.logger.info(f"Jobs de análisis reclamados de otra instancia o reinicio: {recovered}")
+        return recovered
+
+    def _claim(self, transaction, ref) -> dict | None:
+        """Cuerpo de la transacción de ``recover``: toma el lease si el job sigue libre."""
+        doc = next(iter(transaction.get(ref)), None)
+        job = (doc.to_dict() or {}) if doc is not None and doc.exists else {}
+        now = datetime.now(timezone.utc)
+        if job.get("status") not in ACTIVE_STATUSES or _leased(job, now):
+            return None
+        lease = {"owner": self.instance_id, "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)}
+        transaction.update(ref, lease)
+        return {**job, **lease}
+
+    def _lease_loop(self) -> None:
+        """Renueva los leases de los jobs propios y reclama los que quedaron huérfanos."""
+        while not self._shutdown.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                self._write_leases({"owner": self.instance_id})
+                self.recover()
+            except Exception as e:
+                self.logger.error(f"No se pudieron renovar los leases de los jobs de análisis: {e}")
+
+    def _write_leases(self, data: dict) -> None:
+        """Escribe ``data`` (más ``lease_until`` renovado, salvo que venga) en los jobs activos en memoria."""
+        with self._cond:
+            ids = [job_id for job_id, job in self._jobs.items() if job["status"] in ACTIVE_STATUSES]
+        data = {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS), **data}
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = self.db.batch()
+            for job_id in ids[start:start + BATCH_SIZE]:
+                batch.set(self.jobs.document(job_id), data, merge=True)
+            batch.commit()
+
+    def add_completion_hook(self, hook: Callable[[dict], None]) -> None:
+        """Registra un callback ``hook(job)`` que corre al terminar un job con éxito."""
+        self._hooks.append(hook)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def submit(self, request: AnalysisJobRequest, *, credentials: dict | None = None) -> dict:
+        """Crea y encola un job de análisis para un módulo.
+
+        Raises:
+            ValueError: Si la aplicación o el módulo no existen.
+        """
+        app_data, module = self._load_module(request.application_id, request.module_name)
+        repo = module.get("repo") or {}
+        job = {
+            "id": str(uuid4()),
+            "kind": request.kind,
+            "tenant_id": app_data.get("project_id", ""),
+            "application_id": request.application_id,
+            "module_name": request.module_name,
+            "repo_url": repo.get("repo_url", ""),
+            "repo_branch": repo.get("repo_branch", ""),
+            "priority": request.priority,
+            "status": "queued",
+            "progress": 0,
+            "created_at": datetime.now(timezone.utc),
+            "started_at": None,
+            "finished_at": None,
+            "result_path": None,
+            "error": None,
+            "commit_sha": None,
+            "cache_hit": False,
+        }
+        job["commit_sha"] = self._resolve_commit(job, credentials)
+        cached = self._cached_result(job)
+        if cached:
+            now = datetime.now(timezone.utc)
+            job.update(result_path=cached, cache_hit=True, started_at=now)
+            with self._cond:
+                self._jobs[job["id"]] = job
+            self.logger.info(f"{job['id']} | Resultado de análisis tomado del cache ({job['commit_sha']})")
+            self._complete(job)
+            return dict(job)
+
+        self._persist(job)
+        self._enqueue(job, credentials)
+        self.logger.info(f"{job['id']} | Job de análisis {job['kind']} encolado para {job['application_id']}/{job['module_name']}")
+        return dict(job)
+
+    def get_job(self, job_id: str) -> dict:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        doc = self.jobs.document(job_id).get()
+        if not doc.exists:
+            raise ValueError(f"Job {job_id} no encontrado")
+        return doc.to_dict() or {}
+
+    def cancel(self, job_id: str) -> dict:
+        """Cancela un job encolado (inmediato) o en ejecución (al terminar el archivo en curso).
+
+        Raises:
+            ValueError: Si el job no existe.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == "queued":
+                self._mark_finished(job, "cancelled")
+                snapshot = dict(job)
+            elif job is not None and job["status"] == "running":
+                self._contexts[job_id].cancel_event.set()
+                return dict(job)
+            else:
+                snapshot = None
+        if snapshot is not None:
+            self._persist_safely(snapshot, attempts=PERSIST_ATTEMPTS)
+            return snapshot
+        return self.get_job(job_id)
+
+    def snapshot(self, job_id: str) -> tuple[int, dict | None, dict | None]:
+        """Estado en memoria del job (versión, job, último parcial); no hace I/O."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return self._versions[job_id], (dict(job) if job else None), self._partials.get(job_id)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(1 for j in self._jobs.values() if j["status"] == "queued")
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def _enqueue(self, job: dict, credentials: dict | None) -> None:
+        with self._cond:
+            self._jobs[job["id"]] = job
+            self._contexts[job["id"]] = JobContext(self, job["id"], credentials)
+            heapq.heappush(self._queue, (-int(job.get("priority", 5)), next(self._seq), job["id"]))
+            self._bump(job["id"])
+            self._cond.notify()
+
+    def _next_job(self) -> dict | None:
+        """Saca el job más prioritario cuyo tenant tenga cupo (con el lock tomado)."""
+        skipped = []
+        chosen = None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            job = self._jobs.get(entry[2])
+            if job is None or job["status"] != "queued":
+                continue
+            if self._running_by_tenant[job["tenant_id"]] >= self.tenant_concurrency:
+                skipped.append(entry)
+                continue
+            chosen = job
+            break
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return chosen
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._stopping:
+                    self._cond.wait()
+                    job = self._next_job()
+                if self._stopping:
+                    return
+                job["status"] = "running"
+                job["started_at"] = datetime.now(timezone.utc)
+                self._running_by_tenant[job["tenant_id"]] += 1
+                ctx = self._contexts[job["id"]]
+                self._bump(job["id"])
+            try:
+                # El estado en memoria manda; si Firestore no responde el job corre igual
+                self._persist_safely(job)
+                self._run(job, ctx)
+            except Exception as e:
+                # Nunca dejar morir al worker: el job se marca fallido y se sigue
+                self.logger.error(f"{job['id']} | Error inesperado en el worker: {e}")
+                self._finish(job, "failed", error=str(e))
+            finally:
+                with self._cond:
+                    self._running_by_tenant[job["tenant_id"]] -= 1
+                    self._cond.notify_all()
+
+    def _run(self, job: dict, ctx: JobContext) -> None:
+        try:
+            ctx.base_result = self._base_result(job)
+            result_path = self.analysis.run(job, ctx)
+        except JobCancelled:
+            if ctx.interrupted:
+                # Apagado: el job queda activo en Firestore y lo retoma ``recover``
+                self.logger.info(f"{job['id']} | Job de análisis interrumpido por apagado; se retomará al reiniciar")
+                return
+            self._finish(job, "cancelled")
+            self.logger.info(f"{job['id']} | Job de análisis cancelado")
+            return
+        except Exception as e:
+            self._finish(job, "failed", error=str(e))
+            self.logger.error(f"{job['id']} | Job de análisis falló: {e}")
+            return
+
+        with self._cond:
+            job["result_path"] = result_path
+            job["commit_sha"] = ctx.commit_sha or job.get("commit_sha")
+        if job.get("commit_sha"):
+            try:
+                self.result_cache.put(self._cache_key(job), result_path)
+            except OSError as e:
+                self.logger.warning(f"{job['id']} | No se pudo guardar el resultado en cache: {e}")
+        self._complete(job)
+        self.logger.info(f"{job['id']} | Job de análisis completado")
+
+    def _complete(self, job: dict) -> None:
+        """Registra historial, marca ``done`` y ejecuta los hooks de finalización."""
+        try:
+            self._append_history(job)
+        except Exception as e:
+            self.logger.error(f"{job['id']} | No se pudo registrar el historial de análisis: {e}")
+        self._finish(job, "done")
+        for hook in self._hooks:
+            try:
+                hook(dict(job))
+            except Exception as e:
+                self.logger.error(f"{job['id']} | Hook de finalización falló: {e}")
+
+    def _finish(self, job: dict, status: str, *, error: str | None = None) -> None:
+        """Marca el job como terminado y lo persiste (la escritura va fuera del lock)."""
+        with self._cond:
+            self._mark_finished(job, status, error)
+            snapshot = dict(job)
+        self._persist_safely(snapshot, attempts=PERSIST_ATTEMPTS)
+
+    def _mark_finished(self, job: dict, status: str, error: str | None = None) -> None:
+        """Cambia el estado en memoria (con ``_cond`` tomado); no hace I/O."""
+        job["status"] = status
+        job["finished_at"] = datetime.now(timezone.utc)
+        job["error"] = error
+        if status == "done":
+            job["progress"] = 100
+        self._contexts.pop(job["id"], None)
+        self._last_persist.pop(job["id"], None)
+        self._bump(job["id"])
+        self._finished.append(job["id"])
+        while len(self._finished) > MAX_FINISHED_IN_MEMORY:
+            old = self._finished.popleft()
+            self._jobs.pop(old, None)
+            self._partials.pop(old, None)
+            self._versions.pop(old, None)
+
+    def _on_progress(self, job_id: str, progress: int, partial: dict | None) -> None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["progress"] = max(0, min(99, int(progress)))
+            if partial is not None:
+                self._partials[job_id] = partial
+            self._bump(job_id)
+            now = time.monotonic()
+            due = now - self._last_persist.get(job_id, 0.0) >= PROGRESS_PERSIST_SECONDS
+            if due:
+                self._last_persist[job_id] = now
+                snapshot = dict(job)
+        if due:
+            self._persist_safely(snapshot)
+
+    def _cache_key(self, job: dict) -> str:
+        return self.result_cache.key(
+            job["repo_url"], job["repo_branch"], job["commit_sha"], job["kind"],
+            f"{self.settings.ollama_model}|prompt-v{PROMPT_VERSION}",
+        )
+
+    def _resolve_commit(self, job: dict, credentials: dict | None) -> str | None:
+        try:
+            return self.analysis.resolve_commit(job["repo_url"], job["repo_branch"], credentials)
+        except Exception as e:
+            # Sin SHA no hay cache: el job se analiza completo.
+            self.logger.warning(f"{job['id']} | No se pudo resolver el commit de {job['repo_branch']}: {e}")
+            return None
+
+    def _cached_result(self, job: dict) -> str | None:
+        if not job.get("commit_sha"):
+            return None
+        path = self.result_cache.get(self._cache_key(job))
+        record_cache("analysis_result", path is not None)
+        return path
+
+    def _base_result(self, job: dict) -> dict | None:
+        """Resultado del último job exitoso del mismo módulo y tipo (base incremental)."""
+        try:
+            return self._load_base_result(job)
+        except Exception as e:
+            self.logger.warning(f"{job['id']} | Sin base incremental, se analiza completo: {e}")
+            return None
+
+    def _load_base_result(self, job: dict) -> dict | None:
+        query = (
+            self.jobs.where("application_id", "==", job["application_id"])
+            .where("module_name", "==", job["module_name"])
+            .where("kind", "==", job["kind"])
+            .where("status", "==", "done")
+        )
+        previous = [d.to_dict() or {} for d in query.stream()]
+        previous = [p for p in previous if p.get("result_path") and p.get("id") != job["id"]]
+        for base in sorted(previous, key=lambda p: p.get("finished_at") or p["created_at"], reverse=True):
+            try:
+                return self.analysis.load_result(base["result_path"])
+            except (OSError, ValueError):
+                continue  # resultado desalojado o ilegible: probar con el anterior
+        return None
+
+    def _bump(self, job_id: str) -> None:
+        self._versions[job_id] += 1
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def _persist(self, job: dict) -> None:
+        # Sin ``_cond`` tomado: la escritura puede tardar hasta el timeout de Firestore
+        data = dict(job)
+        if job.get("status") in ACTIVE_STATUSES:
+            data.update(owner=self.instance_id, lease_until=datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS))
+        else:
+            data["lease_until"] = None
+        self.jobs.document(job["id"]).set(data, merge=True)
+
+    def _persist_safely(self, job: dict, attempts: int = 1) -> bool:
+        """``_persist`` que no propaga errores (workers y threads de análisis).
+
+        Si no se pudo escribir, el documento queda con el último estado persistido; si
+        era ``queued``/``running`` el job se vuelve a correr tras un reinicio (``recover``).
+        """
+        for attempt in range(attempts):
+            try:
+                self._persist(job)
+                return True
+            except Exception as e:
+                if attempt + 1 >= attempts:
+                    self.logger.error(f"{job['id']} | No se pudo persistir el job ({job.get('status')}): {e}")
+                    return False
+                time.sleep(PERSIST_BACKOFF_SECONDS * 2 ** attempt)
+        return False
+
+    def _load_module(self, application_id: str, module_name: str) -> tuple[dict, dict]:
+        doc = self.apps.document(application_id).get()
+        if not doc.exists:
+            raise ValueError(f"Aplicación {application_id} no encontrada")
+        app_data = doc.to_dict() or {}
+        module = next((m for m in app_data.get("modules") or [] if m.get("name") == module_name), None)
+        if module is None:
+            raise ValueError(f"Módulo {module_name} no encontrado en la aplicación {application_id}")
+        if not (module.get("repo") or {}).get("repo_url"):
+            raise ValueError(f"El módulo {module_name} no tiene repo configurado")
+        return app_data, module
+
+    def _append_history(self, job: dict) -> None:
+        item = AnalysisHistoryItem(date=job.get("finished_at") or datetime.now(timezone.utc), job_id=job["id"])
+        # El array de módulos se reescribe entero: el read-modify-write va en una transacción
+        # para no pisar ediciones del módulo ni historiales escritos por otras instancias.
+        # El lock sólo evita reintentos entre threads de esta instancia.
+        with self._app_locks[job["application_id"]]:
+            firestore.transactional(self._write_history)(self.db.transaction(), job, item.model_dump())
+
+    def _write_history(self, transaction, job: dict, item: dict) -> None:
+        ref = self.apps.document(job["application_id"])
+        doc = next(iter(transaction.get(ref)), None)
+        if doc is None or not doc.exists:
+            raise ValueError(f"Aplicación {job['application_id']} no encontrada")
+        modules = (doc.to_dict() or {}).get("modules") or []
+        for module in modules:
+            if module.get("name") == job["module_name"]:
+                module.setdefault(HISTORY_FIELDS[job["kind"]], []).append(item)
+                break
+        else:
+            raise ValueError(f"Módulo {job['module_name']} no encontrado")
+        # Sellado en la misma escritura: el feed de cambios la ve sin otra escritura
+        transaction.update(ref, ChangeFeedService.stamp({"modules": modules}))
+
+
+def _leased(job: dict, now: datetime) -> bool:
+    """El job tiene un lease vigente (de esta u otra instancia)."""
+    lease = job.get("lease_until")
+    return bool(job.get("owner")) and lease is not None and lease > now
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+from app.core.metrics import record_cache
+
+
+class OwnerIndexService:
+    """Índice desnormalizado de proyectos y aplicaciones por usuario dueño.
+
+    ``user_projects/{user_id}`` guarda:
+
+    - ``project_ids`` / ``app_ids``: arrays mantenidos con ``ArrayUnion``/``ArrayRemove``.
+    - ``projects.{project_id}``: snapshot del proyecto (id, name, user_id, applications)
+      para listar los proyectos de un usuario con una sola lectura.
+    - ``user``: email y nombre del dueño, para armar ``ProjectWithUserResponse``.
+    - ``backfilled``: ya se incorporaron los proyectos creados antes del índice. Si falta
+      (documento inexistente o creado por una escritura nueva), la primera lectura consulta
+      ``projects where user_id ==`` y completa el índice (``backfill``).
+
+    Cada cambio de proyecto escribe el índice del dueño nuevo y, si cambió, el del
+    anterior, en un único batch. Los chequeos de pertenencia usan un set en memoria
+    por usuario con TTL (``owner_cache_seconds``) que se invalida en las escrituras locales;
+    si el id no está en el set cacheado se relee el índice antes de negar (puede haberlo
+    escrito otra instancia).
+    """
+
+    def __init__(self, db, settings, logger):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.index = db.collection(settings.owner_index_collection)
+        self.projects = db.collection(settings.projects_collection)
+        self.apps = db.collection(settings.apps_collection)
+        self.users = db.collection(settings.users_collection)
+        self._cache: dict[str, tuple[float, frozenset[str], frozenset[str]]] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+    def project_entry(self, project_id: str) -> dict:
+        """Dueño y aplicaciones actuales del proyecto (leer antes de actualizarlo o borrarlo)."""
+        doc = self.projects.document(project_id).get(field_paths=["user_id", "applications"])
+        return (doc.to_dict() or {}) if doc.exists else {}
+
+    def owner_of(self, project_id: str) -> str | None:
+        return self.project_entry(project_id).get("user_id")
+
+    def on_project_saved(self, project_id: str, previous_owner: str | None = None) -> None:
+        """Refleja en el índice un proyecto creado o actualizado.
+
+        Args:
+            project_id: Proyecto recién escrito.
+            previous_owner: Dueño antes de la actualización (``owner_of`` leído antes de
+                escribir); si difiere del actual el proyecto se quita de su índice.
+
+        Raises:
+            ValueError: Si el proyecto no existe.
+        """
+        doc = self.projects.document(project_id).get()
+        if not doc.exists:
+            raise ValueError(f"Proyecto {project_id} no encontrado")
+        project = doc.to_dict() or {}
+        owner = project.get("user_id")
+        app_ids = list(project.get("applications") or [])
+        now = datetime.now(timezone.utc)
+
+        data = {
+            "user_id": owner,
+            "user": self._user_snapshot(owner),
+            "project_ids": firestore.ArrayUnion([project_id]),
+            "projects": {project_id: {
+                "id": project_id,
+                "name": project.get("name", ""),
+                "user_id": owner,
+                "applications": app_ids,
+            }},
+            "updated_at": now,
+        }
+        if app_ids:
+            data["app_ids"] = firestore.ArrayUnion(app_ids)
+
+        batch = self.db.batch()
+        batch.set(self.index.document(owner), data, merge=True)
+        if previous_owner and previous_owner != owner:
+            self._remove(batch, previous_owner, project_id, app_ids, now)
+        batch.commit()
+        self.invalidate(owner, previous_owner)
+
+    def on_project_deleted(self, project_id: str, owner: str | None, app_ids: list[str] | None = None) -> None:
+        if not owner:
+            return
+        batch = self.db.batch()
+        self._remove(batch, owner, project_id, list(app_ids or []), datetime.now(timezone.utc))
+        batch.commit()
+        self.invalidate(owner)
+
+    def application_project(self, app_id: str) -> str | None:
+        """Proyecto actual de la aplicación (leer antes de actualizarla o borrarla)."""
+        doc = self.apps.document(app_id).get(field_paths=["project_id"])
+        return (doc.to_dict() or {}).get("project_id") if doc.exists else None
+
+    def on_application_saved(self, app_id: str, project_id: str, previous_project_id: str | None = None) -> None:
+        """Agrega la aplicación al índice del dueño del proyecto.
+
+        Args:
+            previous_project_id: Proyecto antes de la actualización (``application_project``
+                leído antes de escribir); si cambió, la aplicación se quita de ese proyecto
+                y, si el dueño es otro, de sus ``app_ids``.
+        """
+        owner = self.owner_of(project_id)
+        now = datetime.now(timezone.utc)
+        writes: dict[str, dict] = {}
+        if owner:
+            writes[owner] = {
+                "app_ids": firestore.ArrayUnion([app_id]),
+                "projects": {project_id: {"applications": firestore.ArrayUnion([app_id])}},
+                "updated_at": now,
+            }
+        if previous_project_id and previous_project_id != project_id:
+            previous_owner = self.owner_of(previous_project_id)
+            if previous_owner:
+                data = writes.setdefault(previous_owner, {"projects": {}, "updated_at": now})
+                data["projects"][previous_project_id] = {"applications": firestore.ArrayRemove([app_id])}
+                if previous_owner != owner:
+                    data["app_ids"] = firestore.ArrayRemove([app_id])
+        self._write(writes)
+
+    def on_application_deleted(self, app_id: str, project_id: str | None) -> None:
+        """Quita la aplicación del índice del dueño de su proyecto."""
+        owner = self.owner_of(project_id) if project_id else None
+        if not owner:
+            return
+        self._write({owner: {
+            "app_ids": firestore.ArrayRemove([app_id]),
+            "projects": {project_id: {"applications": firestore.ArrayRemove([app_id])}},
+            "updated_at": datetime.now(timezone.utc),
+        }})
+
+    def _write(self, writes: dict[str, dict]) -> None:
+        if not writes:
+            return
+        batch = self.db.batch()
+        for owner, data in writes.items():
+            batch.set(self.index.document(owner), data, merge=True)
+        batch.commit()
+        self.invalidate(*writes)
+
+    def _remove(self, batch, owner: str, project_id: str, app_ids: list[str], now: datetime) -> None:
+        data = {
+            "project_ids": firestore.ArrayRemove([project_id]),
+            "projects": {project_id: firestore.DELETE_FIELD},
+            "updated_at": now,
+        }
+        if app_ids:
+            data["app_ids"] = firestore.ArrayRemove(app_ids)
+        batch.set(self.index.document(owner), data, merge=True)
+
+    def _user_snapshot(self, user_id: str) -> dict:
+        doc = self.users.document(user_id).get(field_paths=["email", "full_name"])
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        return {"email": data.get("email", ""), "full_name": data.get("full_name", "")}
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+    def list_projects(self, user_id: str) -> list[dict]:
+        """Proyectos del usuario en formato ``ProjectWithUserResponse`` (una lectura)."""
+        doc = self.index.document(user_id).get()
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        if not data.get("backfilled"):
+            data = self.backfill(user_id, data)
+        user = data.get("user") or {}
+        # Sólo entradas completas (una app movida desde un proyecto aún no indexado deja
+        # ``projects.{id}.applications`` suelto hasta el backfill)
+        projects = sorted(
+            (p for p in (data.get("projects") or {}).values() if p.get("id")), key=lambda p: p.get("name", "")
+        )
+        self._remember(user_id, data)
+        return [
+            {"project": p, "user_email": user.get("email", ""), "user_full_name": user.get("full_name", "")}
+            for p in projects
+        ]
+
+    def owns_project(self, user_id: str, project_id: str) -> bool:
+        return self._owns(user_id, project_id, 0)
+
+    def owns_application(self, user_id: str, app_id: str) -> bool:
+        return self._owns(user_id, app_id, 1)
+
+    def project_ids(self, user_id: str) -> frozenset[str]:
+        """Proyectos del usuario (set cacheado, para filtrar listados y búsquedas)."""
+        return self._owned(user_id)[0][0]
+
+    def _owns(self, user_id: str, item_id: str, position: int) -> bool:
+        owned, cached = self._owned(user_id)
+        if item_id in owned[position]:
+            return True
+        if not cached:
+            return False
+        # El set cacheado puede ser anterior a una escritura de otra instancia
+        owned, _ = self._owned(user_id, refresh=True)
+        return item_id in owned[position]
+
+    def _owned(self, user_id: str, refresh: bool = False) -> tuple[tuple[frozenset[str], frozenset[str]], bool]:
+        """Sets ``(project_ids, app_ids)`` del usuario y si salieron de la caché."""
+        if not refresh:
+            with self._lock:
+                cached = self._cache.get(user_id)
+            hit = bool(cached) and time.monotonic() - cached[0] < self.settings.owner_cache_seconds
+            record_cache("owner_index", hit)
+            if hit:
+                return (cached[1], cached[2]), True
+        doc = self.index.document(user_id).get(field_paths=["project_ids", "app_ids", "backfilled"])
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        if not data.get("backfilled"):
+            data = self.backfill(user_id, data)
+        return self._remember(user_id, data), False
+
+    def backfill(self, user_id: str, current: dict | None = None) -> dict:
+        """Incorpora al índice los proyectos del usuario que no pasaron por las escrituras.
+
+        Se usa ``ArrayUnion`` y merge por proyecto, así que no pisa lo que escriban en
+        paralelo ``on_project_saved``/``on_application_saved``.
+
+        Returns:
+            El índice resultante (lo leído más lo encontrado en ``projects``).
+        """
+        current = dict(current or {})
+        projects = {}
+        for doc in self.projects.where("user_id", "==", user_id).stream():
+            project = doc.to_dict() or {}
+            projects[doc.id] = {
+                "id": doc.id,
+                "name": project.get("name", ""),
+                "user_id": user_id,
+                "applications": list(project.get("applications") or []),
+            }
+        app_ids = sorted({app_id for p in projects.values() for app_id in p["applications"]})
+        data = {"user_id": user_id, "backfilled": True, "updated_at": datetime.now(timezone.utc)}
+        if projects:
+            data.update(
+                user=current.get("user") or self._user_snapshot(user_id),
+                project_ids=firestore.ArrayUnion(list(projects)),
+                projects=projects,
+            )
+        if app_ids:
+            data["app_ids"] = firestore.ArrayUnion(app_ids)
+        self.index.document(user_id).set(data, merge=True)
+        if projects:
+            self.logger.info(f"{user_id} | Índice por dueño completado con {len(projects)} proyecto(s) previos")
+
+        merged = {**current, "backfilled": True, "user": data.get("user") or current.get("user") or {}}
+        merged["project_ids"] = sorted(set(current.get("project_ids") or []) | set(projects))
+        merged["app_ids"] = sorted(set(current.get("app_ids") or []) | set(app_ids))
+        merged["projects"] = {**(current.get("projects") or {}), **projects}
+        return merged
+
+    def _remember(self, user_id: str, data: dict) -> tuple[frozenset[str], frozenset[str]]:
+        project_ids = frozenset(data.get("project_ids") or [])
+        app_ids = frozenset(data.get("app_ids") or [])
+        with self._lock:
+            self._cache[user_id] = (time.monotonic(), project_ids, app_ids)
+        return project_ids, app_ids
+
+    def invalidate(self, *user_ids: str | None) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                if user_id:
+                    self._cache.pop(user_id, None)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.core.metrics import record_cache
+from app.utils.git import auth_env, run_git
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class RepoCache:
+    """Cache de repos compartido bajo ``REPOS_DIR``.
+
+    - Un mirror bare por ``repo_url`` (``mirrors/<hash>.git``) que se actualiza con
+      ``git fetch`` incremental en vez de clonar de cero en cada job.
+    - Cada job trabaja en un ``git worktree`` desacoplado del mirror (sin copiar objetos).
+    - Lock por repo (thread + ``flock`` entre procesos) para que fetch/worktree de jobs
+      concurrentes sobre el mismo repo no choquen.
+    - Desalojo LRU de mirrors sin worktrees activos cuando se supera ``max_bytes``.
+      ``sync_checkout`` sincroniza y crea el worktree bajo un mismo lock, así el mirror
+      queda en uso antes de que otro ``sync`` pueda desalojarlo.
+
+    Las credenciales sólo van en el entorno de cada comando (``auth_env``); nunca en
+    los argumentos ni en el config del mirror.
+    """
+
+    def __init__(self, repos_dir: str | Path, max_bytes: int, logger=None):
+        self.root = Path(repos_dir)
+        self.mirrors_dir = self.root / "mirrors"
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self._locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self._in_use: dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def repo_key(repo_url: str) -> str:
+        return hashlib.sha256(repo_url.strip().rstrip("/").encode("utf-8")).hexdigest()[:24]
+
+    def mirror_path(self, repo_url: str) -> Path:
+        return self.mirrors_dir / f"{self.repo_key(repo_url)}.git"
+
+    @contextmanager
+    def lock(self, repo_url: str):
+        key = self.repo_key(repo_url)
+        self.mirrors_dir.mkdir(parents=True, exist_ok=True)
+        with self._guard:
+            thread_lock = self._locks[key]
+        with thread_lock:
+            with open(self.mirrors_dir / f"{key}.lock", "w") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Mirrors
+    # ------------------------------------------------------------------
+    def sync(self, repo_url: str, credentials: dict | None = None) -> Path:
+        """Crea o actualiza (fetch incremental) el mirror de ``repo_url``."""
+        with self.lock(repo_url):
+            mirror = self._sync(repo_url, credentials)
+        self.evict(keep=self.repo_key(repo_url))
+        return mirror
+
+    def sync_checkout(
+        self, repo_url: str, revs: list[str], dest: str | Path, credentials: dict | None = None
+    ) -> Path:
+        """``sync`` + ``checkout`` del primer ``rev`` que exista, bajo un único lock.
+
+        El worktree (y la cuenta de uso) existen antes de soltar el lock: un ``sync`` de
+        otro repo no puede desalojar el mirror entre la sincronización y el checkout.
+
+        Raises:
+            RuntimeError: Si ningún ``rev`` existe en el mirror o git falla.
+        """
+        with self.lock(repo_url):
+            self._sync(repo_url, credentials)
+            for rev in revs:
+                try:
+                    sha = self.rev_parse(repo_url, rev)
+                    break
+                except RuntimeError:
+                    continue
+            else:
+                raise RuntimeError(f"Ninguna revisión de {revs} existe en {repo_url}")
+            dest = self._checkout(repo_url, sha, dest)
+        self.evict(keep=self.repo_key(repo_url))
+        return dest
+
+    def _sync(self, repo_url: str, credentials: dict | None) -> Path:
+        """Fetch o clone del mirror (con el lock del repo tomado)."""
+        creds = credentials or {}
+        env = auth_env(repo_url, creds.get("user", ""), creds.get("token", ""))
+        mirror = self.mirror_path(repo_url)
+        record_cache("repo_mirror", mirror.exists())
+        if mirror.exists():
+            run_git(
+                "--git-dir", str(mirror), "fetch", "--prune", "--quiet", repo_url,
+                "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*", env=env,
+            )
+        else:
+            tmp = mirror.with_suffix(".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            run_git("clone", "--mirror", "--quiet", repo_url, str(tmp), env=env)
+            tmp.rename(mirror)
+        self._touch(mirror)
+        return mirror
+
+    def rev_parse(self, repo_url: str, rev: str) -> str:
+        mirror = self.mirror_path(repo_url)
+        return run_git("--git-dir", str(mirror), "rev-parse", "--verify", f"{rev}^{{commit}}").strip()
+
+    # ------------------------------------------------------------------
+    # Worktrees por job
+    # ------------------------------------------------------------------
+    def checkout(self, repo_url: str, rev: str, dest: str | Path) -> Path:
+        """Crea un worktree desacoplado en ``dest`` apuntando a ``rev``."""
+        with self.lock(repo_url):
+            return self._checkout(repo_url, rev, dest)
+
+    def _checkout(self, repo_url: str, rev: str, dest: str | Path) -> Path:
+        dest = Path(dest)
+        mirror = self.mirror_path(repo_url)
+        shutil.rmtree(dest, ignore_errors=True)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        run_git("--git-dir", str(mirror), "worktree", "add", "--detach", "--force", str(dest), rev)
+        with self._guard:
+            self._in_use[self.repo_key(repo_url)] += 1
+        self._touch(mirror)
+        return dest
+
+    def release(self, repo_url: str, dest: str | Path) -> None:
+        """Elimina el worktree del job y libera el mirror para desalojo."""
+        mirror = self.mirror_path(repo_url)
+        with self.lock(repo_url):
+            try:
+                run_git("--git-dir", str(mirror), "worktree", "remove", "--force", str(dest))
+            except RuntimeError:
+                shutil.rmtree(dest, ignore_errors=True)
+                run_git("--git-dir", str(mirror), "worktree", "prune")
+            finally:
+                with self._guard:
+                    key = self.repo_key(repo_url)
+                    self._in_use[key] = max(0, self._in_use[key] - 1)
+
+    # ------------------------------------------------------------------
+    # Desalojo
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _touch(mirror: Path) -> None:
+        (mirror / "last_used").touch()
+
+    def evict(self, keep: str | None = None) -> list[str]:
+        """Borra los mirrors menos usados (sin worktrees activos) hasta entrar en el presupuesto.
+
+        Args:
+            keep: Clave de un mirror que no debe desalojarse (el recién sincronizado).
+        """
+        if not self.mirrors_dir.exists():
+            return []
+        mirrors = []
+        for path in self.mirrors_dir.glob("*.git"):
+            marker = path / "last_used"
+            last_used = marker.stat().st_mtime if marker.exists() else 0.0
+            mirrors.append((last_used, _dir_size(path), path))
+        total = sum(size for _, size, _ in mirrors)
+        removed = []
+        for _, size, path in sorted(mirrors, key=lambda m: m[0]):
+            if total <= self.max_bytes:
+                break
+            key = path.stem
+            with self._guard:
+                busy = key == keep or self._in_use.get(key, 0) > 0
+            if busy:
+                continue
+            lock_path = self.mirrors_dir / f"{key}.lock"
+            with open(lock_path, "w") as fh:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # otro proceso lo está usando
+                try:
+                    if any((path / "worktrees").glob("*")):
+                        continue
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+            total -= size
+            removed.append(key)
+            if self.logger:
+                self.logger.info(f"Mirror {key} desalojado del cache de repos ({size} bytes)")
+        return removed
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Peso de cada campo en el ranking.
+FIELD_WEIGHTS = {"name": 3.0, "description": 1.0}
+# Los matches por prefijo puntúan menos que los exactos.
+PREFIX_PENALTY = 0.5
+# Máximo de términos del índice que expande un prefijo.
+MAX_PREFIX_EXPANSIONS = 200
+
+
+def fold(text: str) -> str:
+    """Minúsculas sin acentos (``"Facturación"`` -> ``"facturacion"``)."""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    """Índice invertido en memoria: término -> {clave de documento: peso}.
+
+    Los términos se mantienen además en una lista ordenada para resolver prefijos
+    con ``bisect`` sin recorrer todo el vocabulario.
+    """
+
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, float]] = {}
+        self.terms: list[str] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def upsert(self, key: str, entry: dict, fields: dict[str, str]) -> None:
+        weights: dict[str, float] = {}
+        for field, text in fields.items():
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS.get(field, 1.0)
+        with self._lock:
+            self.remove(key)
+            self.docs[key] = {**entry, "key": key, "_terms": list(weights)}
+            for token, weight in weights.items():
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = self.postings[token] = {}
+                    insort(self.terms, token)
+                posting[key] = weight
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            doc = self.docs.pop(key, None)
+            if doc is None:
+                return
+            for token in doc["_terms"]:
+                posting = self.postings.get(token)
+                if posting is None:
+                    continue
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[token]
+                    pos = bisect_left(self.terms, token)
+                    if pos < len(self.terms) and self.terms[pos] == token:
+                        del self.terms[pos]
+
+    def remove_where(self, **conditions) -> None:
+        with self._lock:
+            keys = [k for k, d in self.docs.items() if all(d.get(f) == v for f, v in conditions.items())]
+            for key in keys:
+                self.remove(key)
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        """Términos que matchean ``token`` (exacto o por prefijo) con su factor."""
+        matches = []
+        pos = bisect_left(self.terms, token)
+        while pos < len(self.terms) and len(matches) < MAX_PREFIX_EXPANSIONS:
+            term = self.terms[pos]
+            if not term.startswith(token):
+                break
+            factor = 1.0 if term == token else PREFIX_PENALTY * len(token) / len(term)
+            matches.append((term, factor))
+            pos += 1
+        return matches
+
+    def search(
+        self,
+        query: str,
+        *,
+        kinds: set[str] | None = None,
+        project_id: str | None = None,
+        project_ids: set[str] | frozenset[str] | None = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> tuple[int, list[dict]]:
+        """Documentos que contienen todos los términos de ``query`` (cada uno exacto o como prefijo).
+
+        El score suma, por término, peso del campo x idf x factor de prefijo. ``project_ids``
+        restringe los resultados a esos proyectos (los visibles para el usuario).
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+        with self._lock:
+            total_docs = max(len(self.docs), 1)
+            scores: dict[str, float] | None = None
+            for token in tokens:
+                token_scores: dict[str, float] = {}
+                for term, factor in self._expand(token):
+                    posting = self.postings[term]
+                    idf = math.log(1 + total_docs / len(posting))
+                    for key, weight in posting.items():
+                        score = weight * idf * factor
+                        if score > token_scores.get(key, 0.0):
+                            token_scores[key] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {k: s + token_scores[k] for k, s in scores.items() if k in token_scores}
+                if not scores:
+                    return 0, []
+
+            hits = []
+            for key, score in scores.items():
+                doc = self.docs[key]
+                if kinds and doc["kind"] not in kinds:
+                    continue
+                if project_id and doc.get("project_id") != project_id:
+                    continue
+                if project_ids is not None and doc.get("project_id") not in project_ids:
+                    continue
+                hits.append((score, doc))
+        hits.sort(key=lambda h: (-h[0], fold(h[1].get("title", "")), h[1]["key"]))
+        page = [
+            {**{k: v for k, v in doc.items() if not k.startswith("_")}, "score": round(score, 4)}
+            for score, doc in hits[offset:offset + limit]
+        ]
+        return len(hits), page
+
+
+class SearchService:
+    """Búsqueda de texto sobre proyectos, aplicaciones y módulos.
+
+    El índice vive en memoria y se alimenta del feed de cambios (``ChangeFeedService``):
+    la primera sincronización trae el snapshot completo y las siguientes sólo lo que
+    cambió desde el último token. Las escrituras locales (``mark_updated`` /
+    ``mark_deleted``) marcan el índice como pendiente, así la próxima búsqueda ya las
+    ve; los cambios de otras instancias se incorporan cada ``search_sync_seconds``.
+    """
+
+    def __init__(self, db, settings, logger, change_feed):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.change_feed = change_feed
+        self.index = SearchIndex()
+        self._tokens: dict[str, str | None] = {settings.projects_collection: None, settings.apps_collection: None}
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._dirty = True
+        self._app_modules: dict[str, set[str]] = {}
+        change_feed.add_listener(self._on_change)
+
+    def _on_change(self, collection: str, doc_id: str) -> None:
+        if collection in self._tokens:
+            self._dirty = True
+
+    def start(self) -> None:
+        try:
+            self.sync(force=True)
+            self.logger.info(f"Índice de búsqueda construido ({len(self.index)} documentos)")
+        except Exception as e:
+            self.logger.error(f"No se pudo construir el índice de búsqueda: {e}")
+
+    def sync(self, force: bool = False) -> None:
+        """Incorpora los cambios del feed desde el último token."""
+        if not force and not self._dirty and time.monotonic() - self._last_sync < self.settings.search_sync_seconds:
+            return
+        with self._sync_lock:
+            self._dirty = False
+            for collection, token in self._tokens.items():
+                while True:
+                    page = self.change_feed.changes(collection, token)
+                    for doc in page["changes"]:
+                        self._apply(collection, doc)
+                    for doc_id in page["deleted"]:
+                        self._remove(collection, doc_id)
+                    token = page["next_token"]
+                    if not page["has_more"]:
+                        break
+                self._tokens[collection] = token
+            self._last_sync = time.monotonic()
+
+    def _apply(self, collection: str, doc: dict) -> None:
+        if collection == self.settings.projects_collection:
+            self.index.upsert(f"project:{doc['id']}", {
+                "kind": "project", "id": doc["id"], "title": doc.get("name", ""), "project_id": doc["id"],
+            }, {"name": doc.get("name", "")})
+            return
+
+        app_id = doc["id"]
+        module_keys = set()
+        self.index.upsert(f"application:{app_id}", {
+            "kind": "application", "id": app_id, "title": doc.get("name", ""), "project_id": doc.get("project_id"),
+        }, {"name": doc.get("name", "")})
+        for module in doc.get("modules") or []:
+            name = module.get("name", "")
+            module_keys.add(f"module:{app_id}/{name}")
+            self.index.upsert(f"module:{app_id}/{name}", {
+                "kind": "module",
+                "id": name,
+                "title": name,
+                "description": module.get("description", ""),
+                "application_id": app_id,
+                "application_name": doc.get("name", ""),
+                "project_id": doc.get("project_id"),
+            }, {"name": name, "description": module.get("description", "")})
+        for key in self._app_modules.get(app_id, set()) - module_keys:
+            self.index.remove(key)
+        self._app_modules[app_id] = module_keys
+
+    def _remove(self, collection: str, doc_id: str) -> None:
+        if collection == self.settings.projects_collection:
+            self.index.remove(f"project:{doc_id}")
+            self.index.remove_where(project_id=doc_id)
+        else:
+            self.index.remove(f"application:{doc_id}")
+            for key in self._app_modules.pop(doc_id, set()):
+                self.index.remove(key)
+
+    def search(
+        self,
+        query: str,
+        *,
+        kinds: list[str] | None = None,
+        project_id: str | None = None,
+        project_ids: set[str] | frozenset[str] | None = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        try:
+            self.sync()
+        except Exception as e:
+            # Se responde con el índice que haya; el próximo query reintenta.
+            self._dirty = True
+            self.logger.error(f"Error al sincronizar el índice de búsqueda: {e}")
+        total, hits = self.index.search(
+            query,
+            kinds=set(kinds) if kinds else None,
+            project_id=project_id,
+            project_ids=project_ids,
+            limit=limit,
+            offset=offset,
+        )
+        return {"query": query, "total": total, "limit": limit, "offset": offset, "hits": hits}
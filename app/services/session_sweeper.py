@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from app.services.auth_service import unindex_sessions
+
+# Pausa entre páginas de una misma corrida (limita la tasa de borrados contra la cuota).
+PAGE_PAUSE_SECONDS = 0.5
+# Corridas recientes que se guardan para las métricas.
+MAX_RUNS_IN_MEMORY = 50
+
+
+class SessionSweeper:
+    """Borra en segundo plano las sesiones vencidas de ``sessions``.
+
+    Cada ``session_sweep_seconds`` consulta ``expires_at < now`` en páginas de
+    ``session_sweep_page_size`` y las borra con batches. Una corrida borra como
+    máximo ``session_sweep_max_deletes`` sesiones (el resto queda para la próxima) y
+    hace una pausa entre páginas, así el barrido no compite por cuota con los requests.
+
+    En el mismo batch quita las sesiones borradas del índice ``user_sessions``.
+    ``stats()`` expone lo borrado por corrida y en total.
+    """
+
+    def __init__(self, db, settings, logger, *, sessions_collection: str = "sessions"):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.sessions = db.collection(sessions_collection)
+        self.user_sessions = db.collection(settings.user_sessions_collection)
+        # cada sesión puede sumar una escritura al índice: 2 escrituras x 250 = límite del batch
+        self.page_size = max(1, min(settings.session_sweep_page_size, 250))
+        self.page_pause = PAGE_PAUSE_SECONDS
+        self._runs: deque[dict] = deque(maxlen=MAX_RUNS_IN_MEMORY)
+        self._run_count = 0
+        self._total_removed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        if self.settings.session_sweep_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="session-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.settings.session_sweep_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error al barrer sesiones vencidas: {e}")
+
+    # ------------------------------------------------------------------
+    # Barrido
+    # ------------------------------------------------------------------
+    def sweep(self, now: datetime | None = None) -> dict:
+        """Ejecuta una corrida y devuelve sus métricas."""
+        now = now or datetime.now(timezone.utc)
+        started = time.monotonic()
+        removed = pages = 0
+        limit = self.settings.session_sweep_max_deletes
+        error = None
+        try:
+            while removed < limit and not self._stop.is_set():
+                size = min(self.page_size, limit - removed)
+                docs = list(
+                    self.sessions.where("expires_at", "<", now).order_by("expires_at").limit(size).stream()
+                )
+                if not docs:
+                    break
+                by_user = defaultdict(list)
+                batch = self.db.batch()
+                for doc in docs:
+                    batch.delete(doc.reference)
+                    user_id = (doc.to_dict() or {}).get("user_id")
+                    if user_id:
+                        by_user[user_id].append(doc.id)
+                for user_id, session_ids in by_user.items():
+                    unindex_sessions(batch, self.user_sessions, user_id, session_ids)
+                batch.commit()
+                removed += len(docs)
+                pages += 1
+                if len(docs) < size:
+                    break
+                self._stop.wait(self.page_pause)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            run = {
+                "started_at": now,
+                "removed": removed,
+                "pages": pages,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                "truncated": removed >= limit,
+                "error": error,
+            }
+            with self._lock:
+                self._runs.append(run)
+                self._run_count += 1
+                self._total_removed += removed
+            if removed:
+                self.logger.info(f"Barrido de sesiones: {removed} vencidas borradas en {pages} páginas")
+        return run
+
+    def stats(self) -> dict:
+        with self._lock:
+            runs = list(self._runs)
+            return {
+                "runs": self._run_count,
+                "total_removed": self._total_removed,
+                "last_run": runs[-1] if runs else None,
+                "recent_runs": runs[::-1],
+            }
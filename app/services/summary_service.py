@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import random
+
+from google.cloud import firestore
+
+from app.services.change_feed_service import ChangeFeedService
+
+COUNTERS = ("modules", "externalsystems", "technologies")
+
+
+def fragment_counts(fragment: dict | None) -> dict[str, int]:
+    """Valores de ``Application.summary`` que se derivan del fragmento de grafo de una app."""
+    if fragment is None:
+        return dict.fromkeys(COUNTERS, 0)
+    return {
+        "modules": int((fragment["app"].get("metadata") or {}).get("modules") or 0),
+        "externalsystems": len(fragment.get("dependencies") or []),
+        "technologies": len(fragment.get("technologies") or []),
+    }
+
+
+class SummaryService:
+    """Mantiene ``Application.summary`` y los totales por proyecto.
+
+    - ``summary`` de cada aplicación se reescribe con los valores derivados de su
+      fragmento de grafo (módulos, sistemas externos y tecnologías de sus últimos
+      análisis), así que deja de depender de lo que manda el cliente.
+    - Los totales del proyecto viven en ``project_counters/{project_id}/shards/{n}``:
+      cada cambio suma su delta con ``Increment`` en un shard al azar, así escritores
+      concurrentes no compiten por un único documento. Leer el total son
+      ``counter_shards`` lecturas puntuales.
+
+    Ambas escrituras se hacen en la transacción que guarda los fragmentos
+    (``write_fragments``, registrado con ``GraphService.add_fragment_writer``): summary,
+    totales y grafo nunca quedan desfasados.
+    """
+
+    def __init__(self, db, settings, logger):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.apps = db.collection(settings.apps_collection)
+        self.counters = db.collection(settings.counters_collection)
+        self.shards = max(1, int(settings.counter_shards))
+
+    def _shard(self, project_id: str, n: int):
+        return self.counters.document(project_id).collection("shards").document(str(n))
+
+    def write_fragments(self, writes, project_id: str, changes: dict[str, dict | None], previous: dict[str, dict]) -> None:
+        """Escritor de ``GraphService``: summary de cada app cambiada y delta de los totales.
+
+        Args:
+            writes: Transacción (o batch) donde se agregan las escrituras.
+            changes: ``app_id -> fragmento`` (``None`` si la aplicación salió del grafo).
+            previous: Fragmentos antes del cambio.
+        """
+        delta = dict.fromkeys(("applications", *COUNTERS), 0)
+        for app_id, fragment in changes.items():
+            old = previous.get(app_id)
+            new = fragment_counts(fragment)
+            for key, value in fragment_counts(old).items():
+                delta[key] += new[key] - value
+            delta["applications"] += int(fragment is not None) - int(old is not None)
+            if fragment is not None:
+                # ``updated_at`` en la misma escritura: el cambio de summary entra al feed
+                writes.update(self.apps.document(app_id), ChangeFeedService.stamp({"summary": new}))
+        increments = {key: firestore.Increment(value) for key, value in delta.items() if value}
+        if increments:
+            shard = self._shard(project_id, random.randrange(self.shards))
+            writes.set(shard, increments, merge=True)
+
+    def get_project_summary(self, project_id: str) -> dict:
+        """Totales del proyecto: suma de los shards (lecturas puntuales, sin recorrer apps)."""
+        totals = dict.fromkeys(("applications", *COUNTERS), 0)
+        refs = [self._shard(project_id, n) for n in range(self.shards)]
+        for doc in self.db.get_all(refs):
+            if not doc.exists:
+                continue
+            data = doc.to_dict() or {}
+            for key in totals:
+                totals[key] += int(data.get(key) or 0)
+        return {"project_id": project_id, **totals}
+
+    def delete_project(self, project_id: str) -> None:
+        batch = self.db.batch()
+        for n in range(self.shards):
+            batch.delete(self._shard(project_id, n))
+        batch.commit()
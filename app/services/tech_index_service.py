@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+# Severidad para derivar la clasificación de la tecnología a partir de la de cada
+# aplicación (gana la más grave; ``unknown`` sólo si ninguna la conoce).
+LIFECYCLE_SEVERITY = {"unknown": 0, "supported": 1, "deprecated": 2, "eol": 3}
+RISK_SEVERITY = {"UNKNOWN": 0, "LOW": 1, "MEDIUM": 2, "HIGH": 3}
+
+
+class TechIndexService:
+    """Índice invertido tecnología/versión -> aplicaciones y módulos de todo el portafolio.
+
+    - ``tech_index/{tech_node_id}``: datos de la tecnología (nombre, versión, lifecycle,
+      risk) y un mapa ``apps.{app_id} = {project_id, name, modules, lifecycle, risk}``.
+    - ``tech_index_by_app/{app_id}``: tecnologías que la aplicación aportó la última vez,
+      para quitarla de las que dejó de usar sin recorrer el índice.
+
+    Se actualiza con los fragmentos del grafo de relaciones (``GraphService``), así que
+    refleja el último análisis de cada módulo. Cada aplicación guarda su propia
+    clasificación; ``lifecycle`` y ``risk`` de primer nivel (para filtrar en Firestore) se
+    derivan de todas las aplicaciones, en una transacción que lee los documentos que toca,
+    así dos aplicaciones que se actualizan a la vez no se pisan.
+    """
+
+    def __init__(self, db, settings, logger):
+        self.db = db
+        self.settings = settings
+        self.logger = logger
+        self.index = db.collection(settings.tech_index_collection)
+        self.by_app = db.collection(f"{settings.tech_index_collection}_by_app")
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+    def on_fragment(self, project_id: str, app_id: str, fragment: dict | None, previous: dict | None = None) -> None:
+        """Listener de ``GraphService``: sincroniza las tecnologías de una aplicación."""
+        if fragment is None:
+            self.update_application(project_id, app_id, "", [])
+        else:
+            self.update_application(
+                project_id, app_id, fragment["app"].get("label", ""), fragment.get("technologies") or []
+            )
+
+    def update_application(self, project_id: str, app_id: str, app_name: str, technologies: list[dict]) -> None:
+        """Reemplaza las entradas de ``app_id`` en el índice por ``technologies``.
+
+        Sólo toca los documentos de las tecnologías agregadas, quitadas o con cambios,
+        en una única transacción.
+        """
+        current = {}
+        for tech in technologies:
+            metadata = tech.get("metadata") or {}
+            current[tech["id"]] = {
+                "project_id": project_id,
+                "name": app_name,
+                "modules": tech.get("modules") or [],
+                "lifecycle": str(metadata.get("lifecycle") or "unknown").lower(),
+                "risk": str(metadata.get("risk") or "UNKNOWN").upper(),
+            }
+        techs = {tech["id"]: tech for tech in technologies}
+        firestore.transactional(self._write_application)(self.db.transaction(), project_id, app_id, current, techs)
+
+    def _write_application(self, transaction, project_id: str, app_id: str, current: dict, techs: dict) -> None:
+        app_ref = self.by_app.document(app_id)
+        previous_doc = next(iter(transaction.get(app_ref)), None)
+        exists = previous_doc is not None and previous_doc.exists
+        previous = ((previous_doc.to_dict() or {}).get("technologies") or {}) if exists else {}
+
+        changed = [tech_id for tech_id in current if previous.get(tech_id) != current[tech_id]]
+        removed = [tech_id for tech_id in previous if tech_id not in current]
+        # Todas las lecturas antes de escribir (requisito de las transacciones)
+        stored = {}
+        for tech_id in changed + removed:
+            doc = next(iter(transaction.get(self.index.document(tech_id))), None)
+            stored[tech_id] = (doc.to_dict() or {}) if doc is not None and doc.exists else {}
+
+        now = datetime.now(timezone.utc)
+        for tech_id in changed:
+            tech = techs[tech_id]
+            metadata = tech.get("metadata") or {}
+            apps = {**(stored[tech_id].get("apps") or {}), app_id: current[tech_id]}
+            transaction.set(self.index.document(tech_id), {
+                "id": tech_id,
+                "name": tech.get("label", ""),
+                "name_key": str(tech.get("label", "")).strip().lower(),
+                "version": metadata.get("version", ""),
+                "category": tech.get("category"),
+                **_classification(apps),
+                "app_count": len(apps),
+                "updated_at": now,
+                "apps": {app_id: current[tech_id]},
+            }, merge=True)
+
+        for tech_id in removed:
+            apps = {k: v for k, v in (stored[tech_id].get("apps") or {}).items() if k != app_id}
+            transaction.set(self.index.document(tech_id), {
+                "apps": {app_id: firestore.DELETE_FIELD},
+                **_classification(apps),
+                "app_count": len(apps),
+                "updated_at": now,
+            }, merge=True)
+
+        if current:
+            transaction.set(app_ref, {"project_id": project_id, "technologies": current, "updated_at": now})
+        elif exists:
+            transaction.delete(app_ref)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def query(
+        self,
+        lifecycle: list[str] | None = None,
+        risk: list[str] | None = None,
+        name: str | None = None,
+        project_id: str | None = None,
+        project_ids: set[str] | frozenset[str] | None = None,
+        limit: int = 200,
+    ) -> list[dict]:
+        """Tecnologías en uso que cumplen los filtros, con sus aplicaciones y módulos.
+
+        Los filtros de tecnología se resuelven con consultas de Firestore sobre el índice;
+        ``project_id``/``project_ids`` sólo recortan las aplicaciones de cada resultado.
+        """
+        query = self.index.where("app_count", ">", 0)
+        if lifecycle:
+            values = [v.lower() for v in lifecycle]
+            query = query.where("lifecycle", "in", values) if len(values) > 1 else query.where("lifecycle", "==", values[0])
+        if risk:
+            values = [v.upper() for v in risk]
+            query = query.where("risk", "in", values) if len(values) > 1 else query.where("risk", "==", values[0])
+        if name:
+            query = query.where("name_key", "==", name.strip().lower())
+
+        results = []
+        for doc in query.limit(limit).stream():
+            data = doc.to_dict() or {}
+            apps = data.get("apps") or {}
+            if project_id:
+                apps = {k: v for k, v in apps.items() if v.get("project_id") == project_id}
+            apps = _visible(apps, project_ids)
+            if not apps:
+                continue
+            results.append(self._public(data, apps))
+        return results
+
+    def get_technology(self, tech_id: str, project_ids: set[str] | frozenset[str] | None = None) -> dict:
+        """Tecnología con sus aplicaciones (sólo las de ``project_ids`` si se indica).
+
+        Raises:
+            ValueError: Si no está en el índice o ninguna de sus aplicaciones es visible.
+        """
+        doc = self.index.document(tech_id).get()
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        apps = _visible(data.get("apps") or {}, project_ids)
+        if not apps:
+            raise ValueError(f"Tecnología {tech_id} no encontrada en el índice")
+        return self._public(data, apps)
+
+    @staticmethod
+    def _public(data: dict, apps: dict) -> dict:
+        return {
+            "id": data.get("id"),
+            "name": data.get("name"),
+            "version": data.get("version"),
+            "category": data.get("category"),
+            "lifecycle": data.get("lifecycle"),
+            "risk": data.get("risk"),
+            "app_count": len(apps),
+            "applications": [
+                {"app_id": app_id, **entry} for app_id, entry in sorted(apps.items(), key=lambda a: a[1].get("name", ""))
+            ],
+        }
+
+
+def _visible(apps: dict, project_ids: set[str] | frozenset[str] | None) -> dict:
+    if project_ids is None:
+        return apps
+    return {k: v for k, v in apps.items() if v.get("project_id") in project_ids}
+
+
+def _classification(apps: dict) -> dict:
+    """``lifecycle``/``risk`` de la tecnología: el más grave entre sus aplicaciones."""
+    lifecycles = [entry.get("lifecycle") or "unknown" for entry in apps.values()]
+    risks = [entry.get("risk") or "UNKNOWN" for entry in apps.values()]
+    return {
+        "lifecycle": max(lifecycles, key=lambda v: LIFECYCLE_SEVERITY.get(v, 0), default="unknown"),
+        "risk": max(risks, key=lambda v: RISK_SEVERITY.get(v, 0), default="UNKNOWN"),
+    }
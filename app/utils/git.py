@@ -0,0 +1,49 @@
+"""Helpers para invocar git desde los servicios de análisis."""
+
+import base64
+import os
+import subprocess
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+def auth_env(repo_url: str, user: str = "", token: str = "") -> dict[str, str]:
+    """Variables de entorno que autentican a git con usuario/PAT contra ``repo_url``.
+
+    El PAT va como header ``Authorization`` en la config de git por entorno
+    (``GIT_CONFIG_COUNT``/``GIT_CONFIG_KEY_n``), acotado al host del repo: a diferencia
+    de la URL en los argumentos, no queda visible en ``ps``. Nunca loguear el resultado.
+    """
+    parsed = urlparse(repo_url)
+    if not token or parsed.scheme not in {"http", "https"}:
+        return {}
+    basic = base64.b64encode(f"{user or 'oauth2'}:{token}".encode("utf-8")).decode("ascii")
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"http.{parsed.scheme}://{parsed.netloc}/.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+    }
+
+
+def run_git(
+    *args: str, cwd: str | Path | None = None, timeout: float = 600.0, env: dict[str, str] | None = None
+) -> str:
+    """Ejecuta git y devuelve stdout.
+
+    Args:
+        env: Variables extra (p. ej. ``auth_env``); nunca credenciales en ``args``.
+
+    Raises:
+        RuntimeError: Si git termina con error (el mensaje no incluye credenciales).
+    """
+    proc = subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0", **(env or {})},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {args[0]} falló: {proc.stderr.strip()[-500:]}")
+    return proc.stdout
@@ -0,0 +1,154 @@
+"""Codificación compacta (tabla de strings + columnas) para los payloads de grafos.
+
+Los nodos y aristas de los grafos repiten las mismas claves y valores (``type``,
+``domain``, owners) miles de veces. El formato columnar los envía una sola vez:
+
+.. code-block:: json
+
+    {
+      "format": "columnar-v1",
+      "strings": ["APP_1", "ApplicationComponent", ...],
+      "meta": {"project_id": "...", "version": 3},
+      "nodes": {"count": 2, "columns": {"id": [0, 2], "metadata.owner": [5, null]},
+                "string_columns": ["id", "metadata.owner"]},
+      "links": {"count": 1, "source": [1], "target": [0],
+                "columns": {...}, "string_columns": [...]}
+    }
+
+- Los dicts anidados se aplanan en columnas con claves punteadas (``metadata.owner``).
+- Las columnas listadas en ``string_columns`` guardan índices a ``strings`` (``null`` si falta).
+- ``source``/``target`` de las aristas son índices de fila de ``nodes`` (``null`` si el
+  extremo no viene en el payload).
+
+Se elige con el header ``Accept``; el formato verboso sigue siendo el default.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:  # está en requirements; sin el paquete el formato MessagePack responde 406
+    msgpack = None
+
+COMPACT_JSON = "application/vnd.startia.graph+json"
+COMPACT_MSGPACK = "application/vnd.startia.graph+msgpack"
+FORMAT_VERSION = "columnar-v1"
+
+_MISSING = object()
+
+
+def _flatten(item: dict, prefix: str = "", out: dict | None = None) -> dict:
+    out = {} if out is None else out
+    for key, value in item.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            _flatten(value, f"{path}.", out)
+        else:
+            out[path] = value
+    return out
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        idx = self._index.get(value)
+        if idx is None:
+            idx = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+
+def _columns(rows: list[dict], table: _StringTable, skip: tuple[str, ...] = ()) -> dict:
+    flat = [_flatten(row) for row in rows]
+    keys: list[str] = []
+    seen = set()
+    for row in flat:
+        for key in row:
+            if key not in seen and key not in skip:
+                seen.add(key)
+                keys.append(key)
+
+    columns, string_columns = {}, []
+    for key in keys:
+        values = [row.get(key, _MISSING) for row in flat]
+        present = [v for v in values if v is not _MISSING and v is not None]
+        if present and all(isinstance(v, str) for v in present):
+            string_columns.append(key)
+            columns[key] = [table.intern(v) if isinstance(v, str) else None for v in values]
+        else:
+            columns[key] = [None if v is _MISSING else v for v in values]
+    return {"count": len(rows), "columns": columns, "string_columns": string_columns}
+
+
+def encode_compact(graph: dict) -> dict:
+    """Convierte un grafo ``{nodes, links, ...}`` (ya serializable a JSON) al formato columnar."""
+    table = _StringTable()
+    nodes = graph.get("nodes") or []
+    links = graph.get("links") or []
+    rows = {node.get("id"): i for i, node in enumerate(nodes)}
+    encoded_links = _columns(links, table, skip=("source", "target"))
+    encoded_links["source"] = [rows.get(l.get("source")) for l in links]
+    encoded_links["target"] = [rows.get(l.get("target")) for l in links]
+    encoded_nodes = _columns(nodes, table)
+    return {
+        "format": FORMAT_VERSION,
+        "strings": table.strings,
+        "meta": {k: v for k, v in graph.items() if k not in ("nodes", "links")},
+        "nodes": encoded_nodes,
+        "links": encoded_links,
+    }
+
+
+def _rows(block: dict, strings: list[str]) -> list[dict]:
+    string_columns = set(block.get("string_columns") or [])
+    rows = [{} for _ in range(block.get("count", 0))]
+    for key, values in (block.get("columns") or {}).items():
+        is_string = key in string_columns
+        for row, value in zip(rows, values):
+            if value is None:
+                continue
+            parts = key.split(".")
+            cur = row
+            for part in parts[:-1]:
+                cur = cur.setdefault(part, {})
+            cur[parts[-1]] = strings[value] if is_string else value
+    return rows
+
+
+def decode_compact(payload: dict) -> dict:
+    """Inversa de ``encode_compact`` (referencia para clientes y tests).
+
+    Las claves con valor ``null`` en el grafo original no se reconstruyen.
+    """
+    strings = payload["strings"]
+    nodes = _rows(payload["nodes"], strings)
+    links = _rows(payload["links"], strings)
+    for link, src, dst in zip(links, payload["links"]["source"], payload["links"]["target"]):
+        link["source"] = nodes[src]["id"] if src is not None else None
+        link["target"] = nodes[dst]["id"] if dst is not None else None
+    return {**payload.get("meta", {}), "nodes": nodes, "links": links}
+
+
+def graph_response(request: Request, data: Any):
+    """Devuelve ``data`` en el formato pedido por ``Accept`` (verboso por defecto)."""
+    accept = request.headers.get("accept", "")
+    if COMPACT_MSGPACK in accept:
+        if msgpack is None:
+            raise HTTPException(
+                status_code=406,
+                detail="El formato MessagePack no está disponible en este servidor (falta el paquete msgpack).",
+            )
+        body = msgpack.packb(encode_compact(jsonable_encoder(data)), use_bin_type=True)
+        return Response(content=body, media_type=COMPACT_MSGPACK, headers={"Vary": "Accept"})
+    if COMPACT_JSON in accept:
+        return JSONResponse(encode_compact(jsonable_encoder(data)), media_type=COMPACT_JSON, headers={"Vary": "Accept"})
+    return JSONResponse(jsonable_encoder(data), headers={"Vary": "Accept"})
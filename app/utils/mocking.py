@@ -1,6 +1,8 @@
 """Utilidades para devolver contenidos de mocks JSON usados en pruebas."""
 
 from pathlib import Path
+from functools import lru_cache
+import copy
 import json
 from typing import Any
 
@@ -17,6 +19,9 @@ MOCK_FILES = {
 def load_mock(mock_type: str) -> Any:
     """Carga un mock JSON desde la carpeta ``app/mocks``.
 
+    El archivo se lee una sola vez por proceso; cada llamada devuelve una copia
+    para que el llamador pueda mutarla sin afectar al resto.
+
     Args:
         mock_type: Clave lógica del mock (debe existir en ``MOCK_FILES``).
 
@@ -33,7 +38,11 @@ def load_mock(mock_type: str) -> Any:
         raise ValueError(
             f"Mock type '{mock_type}' no soportado. Opciones: {', '.join(MOCK_FILES)}"
         )
+    return copy.deepcopy(_read_mock(mock_filename))
+
 
+@lru_cache(maxsize=None)
+def _read_mock(mock_filename: str) -> Any:
     mocks_dir = Path(__file__).resolve().parent.parent / "mocks"
     mock_path = mocks_dir / mock_filename
 
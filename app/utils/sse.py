@@ -0,0 +1,30 @@
+"""Helpers para respuestas Server-Sent Events (``text/event-stream``)."""
+
+import json
+from typing import Any
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # evita que nginx/proxies bufereen el stream
+}
+
+
+def format_sse(data: Any, event: str | None = None, event_id: str | int | None = None) -> str:
+    """Serializa un evento SSE.
+
+    Args:
+        data: Payload del evento; se serializa como JSON en una sola línea.
+        event: Nombre del evento (``event:``), opcional.
+        event_id: Id del evento (``id:``), usado por el cliente en ``Last-Event-ID``.
+
+    Returns:
+        El bloque de texto del evento, terminado en línea en blanco.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
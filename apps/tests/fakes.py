@@ -0,0 +1,347 @@
+"""Cliente Firestore en memoria para los tests de servicios.
+
+Cubre el subconjunto de la API de ``google.cloud.firestore`` que usan los
+servicios: documentos, consultas con filtros simples, ``order_by`` (incluido
+``__name__``)/``start_at``/``start_after``/``limit``, ``SERVER_TIMESTAMP``, batches, transacciones (optimistas: ``Aborted`` si cambió una colección leída) y
+transforms (``Increment``, ``ArrayUnion``, ``ArrayRemove``).
+
+Para probar timeouts y reintentos se puede inyectar latencia (``client.latency``, en
+segundos por llamada) y errores (``client.failures``, excepciones que lanzan las
+próximas llamadas). Las llamadas respetan el kwarg ``timeout`` como el cliente real:
+si la latencia lo supera lanzan ``DeadlineExceeded``.
+"""
+
+import copy
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Aborted, AlreadyExists, DeadlineExceeded, NotFound
+from google.cloud.firestore_v1.transforms import DELETE_FIELD, SERVER_TIMESTAMP, ArrayRemove, ArrayUnion, Increment
+
+
+def _get_path(data, path):
+    cur = data
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _apply(data, path, value, merge=False):
+    parts = path.split(".")
+    cur = data
+    for part in parts[:-1]:
+        cur = cur.setdefault(part, {})
+    key = parts[-1]
+    if value is DELETE_FIELD:
+        cur.pop(key, None)
+    elif value is SERVER_TIMESTAMP:
+        cur[key] = datetime.now(timezone.utc)
+    elif merge and isinstance(value, dict):
+        # ``set(..., merge=True)`` combina los mapas anidados en vez de reemplazarlos
+        if not isinstance(cur.get(key), dict):
+            cur[key] = {}
+        for sub_key, sub_value in value.items():
+            _apply(cur[key], sub_key, sub_value, merge=True)
+    elif isinstance(value, Increment):
+        cur[key] = (cur.get(key) or 0) + value.value
+    elif isinstance(value, ArrayUnion):
+        current = list(cur.get(key) or [])
+        current.extend(v for v in value.values if v not in current)
+        cur[key] = current
+    elif isinstance(value, ArrayRemove):
+        cur[key] = [v for v in (cur.get(key) or []) if v not in value.values]
+    else:
+        cur[key] = copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = copy.deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, client, path, doc_id):
+        self.client = client
+        self.path = path
+        self.id = doc_id
+
+    @property
+    def _store(self):
+        return self.client.collections.setdefault(self.path, {})
+
+    def collection(self, name):
+        return FakeCollection(self.client, f"{self.path}/{self.id}/{name}")
+
+    def get(self, field_paths=None, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            self.client.calls.append(("get", self.path, self.id))
+            data = self._store.get(self.id)
+            if data is not None and field_paths is not None:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            return FakeSnapshot(self, data)
+
+    def set(self, data, merge=False, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            self.client.calls.append(("set", self.path, self.id))
+            current = copy.deepcopy(self._store.get(self.id) or {}) if merge else {}
+            for key, value in data.items():
+                _apply(current, key, value, merge=merge)
+            self._store[self.id] = current
+            self.client.touch(self.path)
+
+    def create(self, data, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            if self.id in self._store:
+                raise AlreadyExists(f"{self.path}/{self.id}")
+            self.set(data)
+
+    def update(self, data, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            if self.id not in self._store:
+                raise NotFound(f"{self.path}/{self.id}")
+            self.client.calls.append(("update", self.path, self.id))
+            current = copy.deepcopy(self._store[self.id])
+            for key, value in data.items():
+                _apply(current, key, value)
+            self._store[self.id] = current
+            self.client.touch(self.path)
+
+    def delete(self, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            self.client.calls.append(("delete", self.path, self.id))
+            self._store.pop(self.id, None)
+            self.client.touch(self.path)
+
+
+class FakeQuery:
+    _OPS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+        "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    }
+
+    def __init__(self, collection, filters=(), orders=(), limit_=None, cursor=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self.orders = list(orders)
+        self.limit_ = limit_
+        # (valores, incluye el cursor)
+        self.cursor = cursor
+
+    def _copy(self, **changes):
+        values = dict(filters=self.filters, orders=self.orders, limit_=self.limit_, cursor=self.cursor)
+        values.update(changes)
+        return FakeQuery(self.collection, **values)
+
+    def where(self, field, op, value):
+        assert op in self._OPS, f"Operador no soportado: {op}"
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self.orders + [(field, direction)])
+
+    def limit(self, n):
+        return self._copy(limit_=n)
+
+    def start_after(self, values):
+        """Cursor como dict ``{campo: valor}`` de los ``order_by`` (``__name__`` acepta id o ref)."""
+        return self._copy(cursor=(values, False))
+
+    def start_at(self, values):
+        return self._copy(cursor=(values, True))
+
+    @staticmethod
+    def _value(doc_id, data, field):
+        return doc_id if field == "__name__" else _get_path(data, field)
+
+    def stream(self, timeout=None, **kwargs):
+        client = self.collection.client
+        with client.rpc(timeout):
+            client.calls.append(("stream", self.collection.path, None))
+            rows = [
+                (doc_id, data)
+                for doc_id, data in list(self.collection._store.items())
+                if all(self._OPS[op](_get_path(data, f), v) for f, op, v in self.filters)
+            ]
+        # Como en Firestore, ``order_by`` excluye los documentos sin ese campo
+        rows = [r for r in rows if all(self._value(r[0], r[1], f) is not None for f, _ in self.orders)]
+        for field, direction in reversed(self.orders):
+            rows.sort(key=lambda r: self._value(r[0], r[1], field), reverse=direction == "DESCENDING")
+        if self.cursor is not None:
+            values, inclusive = self.cursor
+            assert all(direction == "ASCENDING" for _, direction in self.orders)
+            fields = [field for field, _ in self.orders][: len(values)]
+            cursor = tuple(getattr(v, "id", v) for v in (values[f] for f in fields))
+            position = lambda r: tuple(self._value(r[0], r[1], f) for f in fields)  # noqa: E731
+            rows = [r for r in rows if (position(r) >= cursor if inclusive else position(r) > cursor)]
+        if self.limit_ is not None:
+            rows = rows[: self.limit_]
+        for doc_id, data in rows:
+            yield FakeSnapshot(self.collection.document(doc_id), data)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        super().__init__(self)
+
+    @property
+    def _store(self):
+        return self.client.collections.setdefault(self.path, {})
+
+    def document(self, doc_id=None):
+        return FakeDocument(self.client, self.path, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self.ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self.ops.append(lambda: ref.delete())
+
+    def commit(self, timeout=None, **kwargs):
+        with self.client.rpc(timeout):
+            self.client.batch_commits += 1
+            for op in self.ops:
+                op()
+            self.ops = []
+
+
+class FakeTransaction:
+    """Transacción para ``firestore.transactional``.
+
+    Registra la versión de cada colección leída; si al commit alguna cambió lanza
+    ``Aborted`` y el decorador reintenta, como ante contención en Firestore.
+    """
+
+    def __init__(self, client, max_attempts=5):
+        self.client = client
+        self._max_attempts = max_attempts
+        self._read_only = False
+        self._id = None
+        self.ops = []
+        self.reads = {}
+
+    def _clean_up(self):
+        self.ops = []
+        self.reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().hex
+
+    def _rollback(self):
+        self._clean_up()
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, FakeDocument):
+            self.reads.setdefault(ref_or_query.path, self.client.versions.get(ref_or_query.path, 0))
+            return iter([ref_or_query.get()])
+        if isinstance(ref_or_query, FakeCollection) or not isinstance(ref_or_query, FakeQuery):
+            # Como ``Transaction.get`` real: sólo documentos o consultas
+            raise ValueError('Value for argument "ref_or_query" must be a DocumentReference or a Query.')
+        path = ref_or_query.collection.path
+        self.reads.setdefault(path, self.client.versions.get(path, 0))
+        return ref_or_query.stream()
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self.ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self.ops.append(lambda: ref.delete())
+
+    def _commit(self):
+        with self.client.rpc(), self.client._commit_lock:
+            if any(self.client.versions.get(path, 0) != version for path, version in self.reads.items()):
+                raise Aborted("Otra escritura modificó los documentos leídos")
+            self.client.transaction_commits += 1
+            for op in self.ops:
+                op()
+        self._clean_up()
+        return []
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.collections = {}
+        self.calls = []
+        self.batch_commits = 0
+        self.transaction_commits = 0
+        # Escrituras por colección (para detectar conflictos en las transacciones)
+        self.versions = {}
+        self._commit_lock = threading.RLock()
+        self.latency = 0.0
+        self.failures = []
+        self._local = threading.local()
+
+    @contextmanager
+    def rpc(self, timeout=None):
+        """Simula una llamada al backend (latencia y errores inyectados).
+
+        Sólo la llamada más externa cuenta: un ``create`` que escribe vía ``set`` o
+        un batch que aplica sus operaciones es un único RPC.
+        """
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            if depth == 0:
+                if self.failures:
+                    raise self.failures.pop(0)
+                if self.latency:
+                    if timeout is not None and self.latency > timeout:
+                        time.sleep(timeout)
+                        raise DeadlineExceeded(f"Deadline de {timeout}s excedido")
+                    time.sleep(self.latency)
+            yield
+        finally:
+            self._local.depth = depth
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self, **kwargs)
+
+    def touch(self, path):
+        self.versions[path] = self.versions.get(path, 0) + 1
+
+    def get_all(self, refs, timeout=None, **kwargs):
+        with self.rpc(timeout):
+            snapshots = [ref.get() for ref in refs]
+        yield from snapshots
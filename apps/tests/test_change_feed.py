@@ -0,0 +1,150 @@
+import configparser
+import logging
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from google.api_core.exceptions import ServiceUnavailable  # noqa: E402
+
+from app.core.config import Settings  # noqa: E402
+from app.services.change_feed_service import ChangeFeedService, decode_token  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+
+
+def build_settings():
+    return Settings(
+        environment="DEV",
+        config=configparser.ConfigParser(),
+        gcp_project="test-project",
+        firestore_db="test-db",
+        apps_collection="apps",
+        projects_collection="projects",
+        log_level="INFO",
+        frontend_origins="",
+        session_ttl_hours=8,
+        session_cookie_name="session",
+    )
+
+
+class TestChangeFeedService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.feed = ChangeFeedService(self.client, build_settings(), logging.getLogger("test"))
+        self.apps = self.client.collection("apps")
+
+    def write_app(self, app_id, project_id="p1", name="App"):
+        self.apps.document(app_id).set({"id": app_id, "project_id": project_id, "name": name})
+        self.feed.mark_updated("apps", app_id)
+
+    def test_initial_sync_returns_snapshot_and_token(self):
+        self.write_app("a1")
+        self.write_app("a2", project_id="p2")
+        result = self.feed.changes("apps", None, project_id="p1")
+        self.assertEqual([d["id"] for d in result["changes"]], ["a1"])
+        decode_token(result["next_token"])
+
+    def test_only_changes_after_token_are_returned(self):
+        self.write_app("a1")
+        token = self.feed.changes("apps", None)["next_token"]
+        self.write_app("a2")
+        self.write_app("a1", name="Renamed")
+        result = self.feed.changes("apps", token)
+        by_id = {d["id"]: d for d in result["changes"]}
+        self.assertEqual(set(by_id), {"a1", "a2"})
+        self.assertEqual(by_id["a1"]["name"], "Renamed")
+        self.assertNotIn("updated_at", result["changes"][0])
+
+        again = self.feed.changes("apps", result["next_token"])
+        self.assertEqual(again["changes"], [])
+        self.assertEqual(again["deleted"], [])
+
+    def test_deletes_are_reported_as_tombstones(self):
+        self.write_app("a1")
+        token = self.feed.changes("apps", None)["next_token"]
+        self.apps.document("a1").delete()
+        self.feed.mark_deleted("apps", "a1", project_id="p1")
+        result = self.feed.changes("apps", token, project_id="p1")
+        self.assertEqual(result["deleted"], ["a1"])
+        self.assertEqual(self.feed.changes("apps", token, project_id="p2")["deleted"], [])
+
+    def test_pagination_sets_has_more(self):
+        token = self.feed.changes("apps", None)["next_token"]
+        for i in range(3):
+            self.write_app(f"a{i}")
+        page = self.feed.changes("apps", token, limit=2)
+        self.assertTrue(page["has_more"])
+        self.assertEqual(len(page["changes"]), 2)
+        rest = self.feed.changes("apps", page["next_token"], limit=2)
+        self.assertEqual([d["id"] for d in rest["changes"]], ["a2"])
+
+    def test_pages_advance_when_more_than_limit_share_a_timestamp(self):
+        token = self.feed.changes("apps", None)["next_token"]
+        same = datetime.now(timezone.utc)
+        for i in range(5):
+            self.apps.document(f"a{i}").set({"id": f"a{i}", "project_id": "p1", "updated_at": same})
+            self.client.collection("tombstones").document(f"apps:d{i}").set(
+                {"collection": "apps", "doc_id": f"d{i}", "project_id": "p1", "deleted_at": same}
+            )
+
+        seen, pages = [], 0
+        while True:
+            page = self.feed.changes("apps", token, limit=2)
+            seen += [d["id"] for d in page["changes"]] + page["deleted"]
+            pages += 1
+            if not page["has_more"]:
+                break
+            self.assertNotEqual(page["next_token"], token)
+            self.assertLess(pages, 10)
+            token = page["next_token"]
+        self.assertEqual(sorted(seen), [f"a{i}" for i in range(5)] + [f"d{i}" for i in range(5)])
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_project_filter_is_applied_before_the_limit(self):
+        token = self.feed.changes("apps", None)["next_token"]
+        for i in range(5):
+            self.write_app(f"other{i}", project_id="p2")
+        self.write_app("mine", project_id="p1")
+        page = self.feed.changes("apps", token, limit=2, project_id="p1")
+        self.assertEqual([d["id"] for d in page["changes"]], ["mine"])
+        self.assertFalse(page["has_more"])
+
+    def test_owner_filter_covers_updates_and_deletions(self):
+        projects = self.client.collection("projects")
+        for project_id, owner in (("p1", "ana"), ("p2", "beto")):
+            projects.document(project_id).set({"id": project_id, "user_id": owner})
+        self.assertEqual([d["id"] for d in self.feed.changes("projects", None, user_id="ana")["changes"]], ["p1"])
+
+        token = self.feed.changes("projects", None)["next_token"]
+        for project_id in ("p1", "p2"):
+            self.feed.mark_updated("projects", project_id)
+        self.feed.mark_deleted("projects", "p2", user_id="beto")
+        page = self.feed.changes("projects", token, user_id="ana")
+        self.assertEqual(([d["id"] for d in page["changes"]], page["deleted"]), (["p1"], []))
+        self.assertEqual(self.feed.changes("projects", token, user_id="beto")["deleted"], ["p2"])
+
+    def test_stamp_failure_does_not_raise(self):
+        self.apps.document("a1").set({"id": "a1", "project_id": "p1"})
+        self.client.failures = [ServiceUnavailable("caído")]
+        self.assertFalse(self.feed.mark_updated("apps", "a1"))
+        self.client.failures = [ServiceUnavailable("caído")]
+        self.assertFalse(self.feed.mark_deleted("apps", "a1", project_id="p1"))
+        self.assertTrue(self.feed.mark_updated("apps", "a1"))
+
+    def test_stamp_is_written_with_the_entity(self):
+        token = self.feed.changes("apps", None)["next_token"]
+        self.apps.document("a1").set(ChangeFeedService.stamp({"id": "a1", "project_id": "p1"}))
+        self.assertIsInstance(self.apps.document("a1").get().to_dict()["updated_at"], datetime)
+        self.assertEqual([d["id"] for d in self.feed.changes("apps", token)["changes"]], ["a1"])
+
+    def test_invalid_token_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.feed.changes("apps", "not-a-token")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.auth_service import AuthService  # noqa: E402
+from app.services.email_index import EmailIndex  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+
+
+class TestEmailIndex(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.users = self.client.collections.setdefault("users", {})
+        self.index = EmailIndex(self.client)
+        self.auth = AuthService(self.client)
+
+    def add_user(self, user_id, email):
+        self.index.reserve(email)
+        self.users[user_id] = {"email": email, "full_name": user_id.title()}
+        self.index.bind(email, user_id)
+
+    def test_lookup_is_a_point_read(self):
+        self.add_user("ana", "Ana@Example.com")
+        self.client.calls.clear()
+        user = self.auth.get_user_by_email("ana@example.com ")
+        self.assertEqual(user["id"], "ana")
+        self.assertTrue(all(c[0] == "get" for c in self.client.calls))
+        self.assertEqual(len(self.client.calls), 2)
+
+    def test_duplicate_email_is_rejected(self):
+        self.add_user("ana", "ana@example.com")
+        with self.assertRaises(ValueError):
+            self.index.reserve("ANA@example.com")
+        # una reserva pendiente también bloquea, salvo que haya quedado abandonada
+        self.index.reserve("beto@example.com")
+        with self.assertRaises(ValueError):
+            self.index.reserve("beto@example.com")
+        stale = datetime.now(timezone.utc) - timedelta(hours=1)
+        self.client.collections["user_emails"]["beto@example.com"]["reserved_at"] = stale
+        self.index.reserve("beto@example.com")
+
+    def test_email_change_and_release(self):
+        self.add_user("ana", "ana@example.com")
+        self.index.reserve("ana@new.com")
+        self.users["ana"]["email"] = "ana@new.com"
+        self.index.bind("ana@new.com", "ana", previous_email="ana@example.com")
+        self.assertIsNone(self.index.user_id_for("ana@example.com"))
+        self.assertEqual(self.auth.get_user_by_email("ana@new.com")["id"], "ana")
+
+        self.index.release("ana@new.com", user_id="otro")
+        self.assertEqual(self.index.user_id_for("ana@new.com"), "ana")
+        self.index.release("ana@new.com", user_id="ana")
+        self.assertIsNone(self.index.user_id_for("ana@new.com"))
+
+    def test_legacy_users_are_backfilled_on_lookup(self):
+        self.users["old"] = {"email": "old@example.com"}
+        self.users["mixed"] = {"email": "mixed@example.com"}
+        self.assertEqual(self.auth.get_user_by_email("old@example.com")["id"], "old")
+        self.assertEqual(self.index.user_id_for("old@example.com"), "old")
+        self.client.calls.clear()
+        self.auth.get_user_by_email("old@example.com")
+        self.assertNotIn("stream", [c[0] for c in self.client.calls])
+        self.assertIsNone(self.auth.get_user_by_email("nadie@example.com"))
+        # el fallback compara con la misma normalización que el índice
+        self.assertEqual(self.auth.get_user_by_email(" Mixed@Example.com")["id"], "mixed")
+        self.assertEqual(self.index.user_id_for("mixed@example.com"), "mixed")
+
+    def test_backfill_all_indexes_mixed_case_users_and_drops_the_fallback(self):
+        self.users["ana"] = {"email": "Ana@Example.com"}
+        self.users["beto"] = {"email": "beto@example.com"}
+        self.add_user("caro", "caro@example.com")
+        result = self.index.backfill_all()
+        self.assertEqual(result, {"indexed": 3, "conflicts": []})
+        self.assertTrue(self.client.collections["user_emails"]["_backfill"]["backfilled"])
+        self.assertEqual(self.auth.get_user_by_email("ana@example.com")["id"], "ana")
+
+        # con la marca, un email que no está en el índice no consulta ``users``
+        self.client.calls.clear()
+        self.assertIsNone(AuthService(self.client).get_user_by_email("nadie@example.com"))
+        self.assertEqual(self.client.calls, [("get", "user_emails", "nadie@example.com")])
+        # la marca no es un email que se pueda reservar
+        with self.assertRaises(ValueError):
+            self.index.reserve("_backfill")
+
+    def test_backfill_all_reports_conflicts_without_marking(self):
+        self.users["ana"] = {"email": "ana@example.com"}
+        self.users["ana2"] = {"email": "ANA@example.com "}
+        result = self.index.backfill_all()
+        self.assertEqual(result["conflicts"], [{"user_id": "ana2", "email": "ANA@example.com ", "indexed_user_id": "ana"}])
+        self.assertFalse(self.index.is_backfilled())
+        self.assertNotIn("_backfill", self.client.collections["user_emails"])
+
+
+if __name__ == "__main__":
+    unittest.main()
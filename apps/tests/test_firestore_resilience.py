@@ -0,0 +1,153 @@
+import sys
+import time
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from google.api_core.exceptions import NotFound, ServiceUnavailable  # noqa: E402
+from google.cloud import firestore  # noqa: E402
+
+from app.core.firestore_resilience import (  # noqa: E402
+    CircuitBreaker,
+    FirestoreGuard,
+    FirestoreTimeout,
+    FirestoreUnavailable,
+    RequestBudgetMiddleware,
+    ResilientClient,
+    remaining_budget,
+    request_budget,
+)
+from app.services.auth_service import AuthService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient, FakeQuery  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def build_client(fake, **overrides):
+    settings = replace(build_settings(), **overrides)
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        settings.breaker_error_rate, settings.breaker_min_calls,
+        settings.breaker_window_seconds, settings.breaker_open_seconds, clock=clock,
+    )
+    guard = FirestoreGuard(settings, breaker=breaker, sleep=lambda _: None)
+    return ResilientClient(fake, settings, guard=guard), clock
+
+
+class TestResilientClient(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeFirestoreClient()
+        self.fake.collections["users"] = {"ana": {"email": "ana@example.com"}}
+        self.db, self.clock = build_client(self.fake)
+
+    def test_reads_are_retried_on_transient_errors(self):
+        self.fake.failures = [ServiceUnavailable("a"), ServiceUnavailable("b")]
+        doc = self.db.collection("users").document("ana").get()
+        self.assertEqual(doc.to_dict(), {"email": "ana@example.com"})
+        self.fake.failures = [ServiceUnavailable("c")]
+        self.assertEqual([d.id for d in self.db.collection("users").where("email", "==", "ana@example.com").stream()], ["ana"])
+
+    def test_stream_is_not_materialized_and_fails_mid_result_without_retry(self):
+        self.fake.collections["users"]["beto"] = {"email": "beto@example.com"}
+        original = FakeQuery.stream
+
+        def cut_after_first(query, timeout=None, **kwargs):
+            yield next(original(query, timeout=timeout))
+            raise ServiceUnavailable("cortado")
+
+        with mock.patch.object(FakeQuery, "stream", cut_after_first):
+            docs = self.db.collection("users").stream()
+            self.assertEqual(next(docs).id, "ana")
+            with self.assertRaises(FirestoreUnavailable):
+                next(docs)
+        self.assertEqual(len([c for c in self.fake.calls if c[0] == "stream"]), 1)
+        self.assertEqual(list(self.db.collection("missing").stream()), [])
+
+    def test_writes_are_not_retried(self):
+        self.fake.failures = [ServiceUnavailable("a")]
+        with self.assertRaises(FirestoreUnavailable) as ctx:
+            self.db.collection("users").document("beto").set({"email": "beto@example.com"})
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertNotIn("beto", self.fake.collections["users"])
+        # los errores del request se propagan tal cual
+        with self.assertRaises(NotFound):
+            self.db.collection("users").document("nadie").update({"x": 1})
+
+    def test_calls_respect_the_request_budget(self):
+        self.fake.latency = 0.5
+        started = time.monotonic()
+        with request_budget(0.05):
+            with self.assertRaises(FirestoreTimeout) as ctx:
+                self.db.collection("users").document("ana").get()
+        self.assertEqual(ctx.exception.status_code, 504)
+        self.assertLess(time.monotonic() - started, 0.3)
+
+    def test_breaker_opens_on_error_rate_and_recovers(self):
+        db, clock = build_client(self.fake, breaker_min_calls=4, firestore_read_retries=0)
+        ref = db.collection("users").document("ana")
+        ref.get()
+        self.fake.failures = [ServiceUnavailable(str(i)) for i in range(3)]
+        for _ in range(3):
+            with self.assertRaises(FirestoreUnavailable):
+                ref.get()
+
+        calls = len(self.fake.calls)
+        with self.assertRaises(FirestoreUnavailable) as ctx:
+            ref.get()
+        self.assertEqual(len(self.fake.calls), calls)  # falla sin llamar al backend
+        self.assertIn("Retry-After", ctx.exception.headers)
+
+        clock.now += 16
+        self.assertEqual(ref.get().id, "ana")  # llamada de prueba: cierra el circuito
+        self.assertEqual(db.guard.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_services_work_through_the_wrapper(self):
+        auth = AuthService(self.db)
+        session_id = auth.create_session({"id": "ana", "email": "ana@example.com"})
+        self.assertEqual(auth.refresh_user_sessions("ana", {"role": "admin"}), 1)
+        self.assertEqual(self.fake.collections["sessions"][session_id]["role"], "admin")
+        self.assertEqual(auth.refresh_user_sessions("ana", None), 1)
+        self.assertEqual(self.fake.collections["sessions"], {})
+
+    def test_transactions_run_through_the_wrapper(self):
+        @firestore.transactional
+        def rename(transaction, ref):
+            doc = next(transaction.get(ref))
+            transaction.update(ref, {"email": doc.to_dict()["email"].upper()})
+
+        self.fake.failures = [ServiceUnavailable("a")]  # la lectura se reintenta
+        rename(self.db.transaction(), self.db.collection("users").document("ana"))
+        self.assertEqual(self.fake.collections["users"]["ana"]["email"], "ANA@EXAMPLE.COM")
+        self.assertEqual(self.fake.transaction_commits, 1)
+
+
+class TestRequestBudgetMiddleware(unittest.TestCase):
+    def test_each_request_gets_a_budget(self):
+        app = FastAPI()
+        app.add_middleware(RequestBudgetMiddleware, seconds=5)
+
+        @app.get("/budget")
+        def budget():
+            return {"remaining": remaining_budget()}
+
+        resp = TestClient(app).get("/budget")
+        self.assertTrue(0 < resp.json()["remaining"] <= 5)
+        self.assertIsNone(remaining_budget())
+
+
+if __name__ == "__main__":
+    unittest.main()
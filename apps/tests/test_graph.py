@@ -0,0 +1,443 @@
+import configparser
+import json
+import logging
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import Settings  # noqa: E402
+from app.services.graph_index import CompactGraph, diff_graphs, filter_graph, parse_filters  # noqa: E402
+from app.services import graph_service  # noqa: E402
+from app.services.graph_service import GraphService, tech_node, tech_node_id  # noqa: E402
+from app.utils import graph_encoding  # noqa: E402
+from app.utils.graph_encoding import COMPACT_JSON, COMPACT_MSGPACK, decode_compact, encode_compact, graph_response  # noqa: E402
+from app.utils.mocking import load_mock  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+
+
+def build_settings():
+    return Settings(
+        environment="DEV",
+        config=configparser.ConfigParser(),
+        gcp_project="test-project",
+        firestore_db="test-db",
+        apps_collection="apps",
+        projects_collection="projects",
+        log_level="INFO",
+        frontend_origins="",
+        session_ttl_hours=8,
+        session_cookie_name="session",
+        analysis_dir=tempfile.mkdtemp(),
+    )
+
+
+class GraphFixture:
+    """Guarda aplicaciones con módulos analizados en el Firestore fake."""
+
+    def __init__(self, client, tmp: Path):
+        self.client = client
+        self.tmp = tmp
+        self.project_id = str(uuid.uuid4())
+        client.collection("projects").document(self.project_id).set({"id": self.project_id, "name": "Portafolio"})
+
+    def add_result(self, technologies=(), external_systems=()):
+        job_id = str(uuid.uuid4())
+        path = self.tmp / f"{job_id}.json"
+        path.write_text(json.dumps({
+            "job_id": job_id,
+            "technologies": list(technologies),
+            "external_systems": list(external_systems),
+        }))
+        self.client.collection("analysis_jobs").document(job_id).set(
+            {"id": job_id, "status": "done", "result_path": str(path)}
+        )
+        return job_id
+
+    def add_app(self, name, modules=(), app_id=None, **extra):
+        app_id = app_id or str(uuid.uuid4())
+        stored = []
+        for module_name, job_id in modules:
+            history = [{"date": "2026-01-01T00:00:00+00:00", "job_id": job_id}] if job_id else []
+            stored.append({"name": module_name, "description": "", "repo": {}, "code_analysis_history": history})
+        self.client.collection("apps").document(app_id).set(
+            {"id": app_id, "project_id": self.project_id, "name": name, "modules": stored, **extra}
+        )
+        return app_id
+
+
+class TestGraphService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.service = GraphService(self.client, build_settings(), logging.getLogger("test"))
+        self.fx = GraphFixture(self.client, Path(tempfile.mkdtemp()))
+
+        java = {"name": "Java", "version": "17", "category": "language", "risk": "HIGH"}
+        pg = {"name": "PostgreSQL", "version": "15", "category": "database"}
+        self.billing = self.fx.add_app("Billing", [
+            ("api", self.fx.add_result([java, pg])),
+            ("batch", self.fx.add_result([java], [{"name": "SAP", "protocol": "RFC"}])),
+        ], criticality="high", domain="Core")
+        self.portal = self.fx.add_app("Portal Web", [
+            ("web", self.fx.add_result([{"name": "React", "version": "18"}], [{"name": "billing", "protocol": "REST"}])),
+        ])
+
+    def ids(self, items):
+        return sorted(i["id"] for i in items)
+
+    def test_rebuild_materializes_nodes_and_links(self):
+        graph = self.service.rebuild_project(self.fx.project_id)
+        nodes = {n["id"]: n for n in graph["nodes"]}
+        self.assertEqual(nodes[self.billing]["type"], "ApplicationComponent")
+        self.assertEqual(nodes[self.billing]["criticality"], "high")
+        self.assertEqual(nodes[tech_node_id("PostgreSQL", "15")]["type"], "TechnologyService")
+        self.assertEqual(nodes[tech_node_id("Java", "17")]["metadata"]["risk"], "HIGH")
+        self.assertEqual(nodes["EXT_SAP"]["type"], "ExternalSystem")
+
+        links = {(l["source"], l["target"], l["label"]): l for l in graph["links"]}
+        uses_java = links[(self.billing, tech_node_id("Java", "17"), "USES_TECH")]
+        self.assertEqual(uses_java["metadata"]["modules"], ["api", "batch"])
+        # "billing" se resuelve contra el nombre de la aplicación del proyecto
+        self.assertIn((self.portal, self.billing, "SERVICE_DEPENDENCY"), links)
+        self.assertIn((self.billing, "EXT_SAP", "SERVICE_DEPENDENCY"), links)
+
+    def test_reads_use_stored_fragments(self):
+        built = self.service.rebuild_project(self.fx.project_id)
+        self.client.calls.clear()
+        graph = self.service.get_project_graph(self.fx.project_id)
+        self.assertEqual([c[:2] for c in self.client.calls], [
+            ("get", "relation_graphs"), ("stream", f"relation_graphs/{self.fx.project_id}/fragments"),
+        ])
+        self.assertEqual(self.ids(graph["nodes"]), self.ids(built["nodes"]))
+        self.assertEqual(graph["version"], 1)
+        self.assertNotIn("fragments", graph)
+        # ningún documento guarda el grafo entero (límite de 1 MiB)
+        self.assertNotIn("nodes", self.client.collections["relation_graphs"][self.fx.project_id])
+
+    def test_missing_graph_is_materialized_on_first_read(self):
+        seen = []
+        self.service.add_listener(lambda pid, graph: seen.append(pid))
+        graph = self.service.get_project_graph(self.fx.project_id)
+        self.assertEqual(graph["version"], 1)
+        self.assertIn(self.portal, self.ids(graph["nodes"]))
+        self.assertEqual(seen, [self.fx.project_id])
+
+        self.client.calls.clear()
+        self.assertEqual(self.service.get_project_graph(self.fx.project_id)["version"], 1)
+        self.assertFalse([c for c in self.client.calls if c[1] in ("apps", "analysis_jobs")])
+
+    def test_unknown_project_is_not_written(self):
+        with self.assertRaises(ValueError):
+            self.service.get_project_graph("missing")
+        with self.assertRaises(ValueError):
+            self.service.get_project_index("missing")
+        self.assertFalse(self.client.collections.get("relation_graphs"))
+
+    def test_client_errors_in_the_transaction_are_not_value_errors(self):
+        with mock.patch.object(self.service, "_write_graph", side_effect=ValueError("referencia inválida")):
+            with self.assertRaises(RuntimeError):
+                self.service.rebuild_project(self.fx.project_id)
+
+    def test_fragments_are_stored_one_document_per_application(self):
+        graph = self.service.rebuild_project(self.fx.project_id)
+        fragments = self.client.collections[f"relation_graphs/{self.fx.project_id}/fragments"]
+        self.assertEqual(sorted(fragments), sorted([self.billing, self.portal]))
+        self.assertNotIn("fragments", self.client.collections["relation_graphs"][self.fx.project_id])
+        self.assertEqual(graph["version"], 1)
+
+        self.service.on_project_deleted(self.fx.project_id)
+        self.assertEqual(self.client.collections[f"relation_graphs/{self.fx.project_id}/fragments"], {})
+
+    def test_embedded_fragments_are_migrated_on_next_write(self):
+        fragments = {app_id: self.service.build_fragment({"id": app_id, **self.client.collections["apps"][app_id]})
+                     for app_id in (self.billing, self.portal)}
+        self.client.collections["relation_graphs"] = {
+            self.fx.project_id: {"project_id": self.fx.project_id, "version": 4, "fragments": fragments},
+        }
+        self.client.collection("apps").document(self.portal).update({"modules": []})
+        graph = self.service.on_application_changed(self.portal)
+
+        self.assertEqual(graph["version"], 5)
+        self.assertIn(tech_node_id("Java", "17"), self.ids(graph["nodes"]))
+        self.assertNotIn("fragments", self.client.collections["relation_graphs"][self.fx.project_id])
+        stored = self.client.collections[f"relation_graphs/{self.fx.project_id}/fragments"]
+        self.assertEqual(sorted(stored), sorted([self.billing, self.portal]))
+        self.assertEqual(stored[self.portal]["technologies"], [])
+
+    def test_concurrent_updates_from_other_instances_are_not_lost(self):
+        self.service.rebuild_project(self.fx.project_id)
+        other = GraphService(self.client, build_settings(), logging.getLogger("test"))
+        self.client.collection("apps").document(self.billing).update({"modules": []})
+        self.client.collection("apps").document(self.portal).update({"modules": []})
+
+        materialize = graph_service.materialize
+        calls = []
+
+        def interleaved(fragments):
+            # La otra instancia escribe entre la lectura y el commit de esta
+            calls.append(1)
+            if len(calls) == 1:
+                other.on_application_changed(self.portal)
+            return materialize(fragments)
+
+        with mock.patch.object(graph_service, "materialize", side_effect=interleaved):
+            graph = self.service.on_application_changed(self.billing)
+
+        self.assertEqual(len(calls), 3)  # la primera transacción se reintentó
+        self.assertEqual(graph["version"], 3)
+        self.assertEqual(self.ids(graph["nodes"]), sorted([self.billing, self.portal]))
+        stored = self.client.collections["relation_graphs"][self.fx.project_id]
+        self.assertEqual(stored["version"], 3)
+
+    def test_application_change_updates_only_its_fragment(self):
+        self.service.rebuild_project(self.fx.project_id)
+        self.client.collection("apps").document(self.portal).update({"modules": []})
+        self.client.calls.clear()
+        graph = self.service.on_application_changed(self.portal)
+
+        touched_jobs = {c[2] for c in self.client.calls if c[1] == "analysis_jobs"}
+        self.assertEqual(touched_jobs, set())  # no relee análisis de Billing
+        self.assertEqual(graph["version"], 2)
+        self.assertNotIn(tech_node_id("React", "18"), self.ids(graph["nodes"]))
+        self.assertFalse(any(l["source"] == self.portal for l in graph["links"]))
+        self.assertIn(tech_node_id("Java", "17"), self.ids(graph["nodes"]))
+
+    def test_app_views(self):
+        self.service.rebuild_project(self.fx.project_id)
+        relations = self.service.get_app_relations(self.billing)
+        self.assertEqual(self.ids(relations["nodes"]), sorted(["EXT_SAP", self.billing, self.portal]))
+        self.assertTrue(all(l["label"] == "SERVICE_DEPENDENCY" for l in relations["links"]))
+
+        techs = self.service.get_app_tech_dependencies(self.billing)
+        self.assertEqual(
+            self.ids(techs["nodes"]),
+            sorted([self.billing, tech_node_id("Java", "17"), tech_node_id("PostgreSQL", "15")]),
+        )
+
+    def test_listeners_and_project_deletion(self):
+        seen = []
+        self.service.add_listener(lambda pid, graph: seen.append((pid, graph["version"])))
+        self.service.rebuild_project(self.fx.project_id)
+        self.assertEqual(seen, [(self.fx.project_id, 1)])
+        self.service.on_project_deleted(self.fx.project_id)
+        self.assertNotIn(self.fx.project_id, self.client.collections["relation_graphs"])
+
+    def test_app_views_are_filtered_on_the_server(self):
+        self.service.rebuild_project(self.fx.project_id)
+        relations = self.service.get_app_relations(self.billing, filters=parse_filters(type=["ExternalSystem"]))
+        self.assertEqual(self.ids(relations["nodes"]), sorted(["EXT_SAP", self.billing]))
+        self.assertEqual([l["target"] for l in relations["links"]], ["EXT_SAP"])
+
+        techs = self.service.get_app_tech_dependencies(self.billing, filters=parse_filters(risk=["high"]))
+        self.assertEqual(self.ids(techs["nodes"]), sorted([self.billing, tech_node_id("Java", "17")]))
+
+        view = self.service.get_project_view(self.fx.project_id, filters=parse_filters(domain=["core"]))
+        self.assertEqual(self.ids(view["nodes"]), [self.billing])
+        self.assertEqual(view["links"], [])
+
+    def test_diff_between_job_snapshots(self):
+        job_1, job_2 = str(uuid.uuid4()), str(uuid.uuid4())
+        self.service.on_job_completed({"id": job_1, "application_id": self.portal})
+
+        self.client.collection("apps").document(self.portal).update({"modules": []})
+        self.service.on_job_completed({"id": job_2, "application_id": self.portal})
+
+        diff = self.service.diff(self.fx.project_id, job_1, job_2)
+        self.assertEqual([n["id"] for n in diff["nodes"]["removed"]], [tech_node_id("React", "18")])
+        self.assertEqual(diff["summary"]["links_removed"], 2)
+        self.assertEqual([c["after"]["id"] for c in diff["nodes"]["changed"]], [self.portal])
+        self.assertIs(self.service.diff(self.fx.project_id, job_1, job_2), diff)
+
+        current = self.service.diff(self.fx.project_id, job_2)
+        self.assertEqual(current["summary"], dict.fromkeys(current["summary"], 0))
+        with self.assertRaises(ValueError):
+            self.service.diff("other-project", job_1)
+        with self.assertRaises(ValueError):
+            self.service.diff("other-project", job_1, job_2)  # el diff cacheado no se comparte
+        with self.assertRaises(ValueError):
+            self.service.diff(self.fx.project_id, str(uuid.uuid4()))
+
+    def test_snapshot_ids_must_be_job_ids(self):
+        # el id del job arma la ruta del archivo: nada fuera de snapshots_dir
+        outside = Path(self.service.snapshots_dir).parent / "secret.json"
+        outside.parent.mkdir(parents=True, exist_ok=True)
+        outside.write_text(json.dumps({"project_id": self.fx.project_id}), encoding="utf-8")
+        for job_id in ("../secret", "missing", ""):
+            with self.assertRaises(ValueError):
+                self.service.load_snapshot(job_id)
+
+    def test_tech_lifecycle_and_risk_are_normalized(self):
+        node = tech_node({"name": "Java", "version": "8", "lifecycle": " EOL ", "risk": "high"})
+        self.assertEqual((node["metadata"]["lifecycle"], node["metadata"]["risk"]), ("eol", "HIGH"))
+        node = tech_node({"name": "Java", "lifecycle": "maybe", "risk": "critical"})
+        self.assertEqual((node["metadata"]["lifecycle"], node["metadata"]["risk"]), ("unknown", "UNKNOWN"))
+
+    def test_unknown_application_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.service.get_app_relations("missing")
+
+
+def chain_graph():
+    """A -> B -> C, D -> B, E aislado (``source`` depende de ``target``)."""
+    nodes = [
+        {"id": "A", "criticality": "high"},
+        {"id": "B", "criticality": "low"},
+        {"id": "C", "criticality": "medium"},
+        {"id": "D", "criticality": "low"},
+        {"id": "E"},
+    ]
+    links = [
+        {"id": "ab", "source": "A", "target": "B"},
+        {"id": "bc", "source": "B", "target": "C"},
+        {"id": "db", "source": "D", "target": "B"},
+        {"id": "ax", "source": "A", "target": "MISSING"},
+    ]
+    return {"version": 3, "nodes": nodes, "links": links}
+
+
+class TestCompactGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = CompactGraph(chain_graph())
+
+    def test_csr_arrays(self):
+        self.assertEqual(len(self.graph), 5)
+        self.assertEqual(len(self.graph.links), 3)  # se descarta la arista colgante
+        self.assertEqual(self.graph.out_offsets.typecode, "i")
+        self.assertEqual(self.graph.out_offsets.tolist(), [0, 1, 2, 2, 3, 3])
+        self.assertEqual(self.graph.in_offsets.tolist(), [0, 0, 2, 3, 3, 3])
+
+    def test_neighborhood(self):
+        result = self.graph.neighborhood("B", depth=1, direction="in")
+        self.assertEqual([n["id"] for n in result["nodes"]], ["B", "A", "D"])
+        result = self.graph.neighborhood("A", depth=2, direction="out")
+        self.assertEqual({n["id"]: n["distance"] for n in result["nodes"]}, {"A": 0, "B": 1, "C": 2})
+        self.assertEqual([l["id"] for l in result["links"]], ["ab", "bc"])
+
+    def test_shortest_path(self):
+        result = self.graph.shortest_path("D", "A")
+        self.assertEqual([n["id"] for n in result["nodes"]], ["D", "B", "A"])
+        self.assertEqual(result["length"], 2)
+        self.assertFalse(self.graph.shortest_path("D", "A", directed=True)["found"])
+        self.assertFalse(self.graph.shortest_path("A", "E")["found"])
+        with self.assertRaises(ValueError):
+            self.graph.shortest_path("A", "Z")
+
+    def test_impact_weighted_by_criticality(self):
+        result = self.graph.impact("C")
+        self.assertEqual([(n["id"], n["distance"]) for n in result["affected"]], [("A", 2), ("B", 1), ("D", 2)])
+        self.assertEqual(result["impact_score"], 3 / 2 + 1 + 1 / 2)
+        self.assertEqual(self.graph.impact("C", max_depth=1)["affected_count"], 1)
+
+    def test_filters_keep_only_edges_between_surviving_nodes(self):
+        view = self.graph.view(filters=parse_filters(criticality=["HIGH,low"]))
+        self.assertEqual([n["id"] for n in view["nodes"]], ["A", "B", "D"])
+        self.assertEqual([l["id"] for l in view["links"]], ["ab", "db"])
+
+        view = self.graph.view(filters=parse_filters(criticality=["medium"]), keep=[self.graph.index["B"]])
+        self.assertEqual([l["id"] for l in view["links"]], ["bc"])
+
+    def test_diff_graphs(self):
+        before = chain_graph()
+        after = chain_graph()
+        after["nodes"] = [n for n in after["nodes"] if n["id"] != "E"] + [{"id": "F"}]
+        after["nodes"][0] = {"id": "A", "criticality": "low"}
+        after["links"] = after["links"][1:] + [{"id": "ab", "source": "A", "target": "B", "label": "X"}]
+        diff = diff_graphs(before, after)
+        self.assertEqual([n["id"] for n in diff["nodes"]["added"]], ["F"])
+        self.assertEqual([n["id"] for n in diff["nodes"]["removed"]], ["E"])
+        self.assertEqual([c["after"]["criticality"] for c in diff["nodes"]["changed"]], ["low"])
+        # la etiqueta forma parte de la clave de la arista
+        self.assertEqual(diff["summary"]["links_added"], 1)
+        self.assertEqual(diff["summary"]["links_removed"], 1)
+        self.assertEqual(diff["summary"]["links_changed"], 0)
+
+    def test_filter_graph_strips_metadata(self):
+        graph = {"app_id": "A", "nodes": [{"id": "A", "metadata": {"risk": "HIGH"}}, {"id": "B", "metadata": {}}], "links": []}
+        result = filter_graph(graph, parse_filters(risk=["high"]), include_metadata=False)
+        self.assertEqual(result, {"app_id": "A", "nodes": [{"id": "A"}], "links": []})
+        with self.assertRaises(ValueError):
+            parse_filters(owner=["x"])
+
+
+class TestGraphIndexCache(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.service = GraphService(self.client, build_settings(), logging.getLogger("test"))
+        self.fx = GraphFixture(self.client, Path(tempfile.mkdtemp()))
+        self.app_id = self.fx.add_app("Billing", [("api", self.fx.add_result([{"name": "Java"}]))])
+
+    def test_index_is_cached_until_graph_version_changes(self):
+        first = self.service.get_project_index(self.fx.project_id)
+        self.assertIs(self.service.get_project_index(self.fx.project_id), first)
+
+        self.fx.add_app("Portal", [])
+        self.service.rebuild_project(self.fx.project_id)
+        second = self.service.get_project_index(self.fx.project_id)
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second), 3)
+
+    def test_index_follows_updates_from_other_instances(self):
+        first = self.service.get_project_index(self.fx.project_id)
+        other = GraphService(self.client, build_settings(), logging.getLogger("test"))
+        other.on_application_changed(self.app_id)
+        self.assertIsNot(self.service.get_project_index(self.fx.project_id), first)
+
+
+class TestCompactEncoding(unittest.TestCase):
+    def setUp(self):
+        self.graph = load_mock("project_relations")
+        app = FastAPI()
+
+        @app.get("/graph")
+        def graph(request: Request):
+            return graph_response(request, self.graph)
+
+        self.client = TestClient(app)
+
+    def test_round_trip_and_string_table(self):
+        encoded = encode_compact(self.graph)
+        self.assertEqual(len(encoded["strings"]), len(set(encoded["strings"])))
+        self.assertIn("type", encoded["nodes"]["string_columns"])
+        self.assertTrue(all(isinstance(i, int) for i in encoded["links"]["source"]))
+
+        decoded = decode_compact(json.loads(json.dumps(encoded)))
+        self.assertEqual(decoded["project_id"], self.graph["project_id"])
+        self.assertEqual(decoded["nodes"], self.graph["nodes"])
+        self.assertEqual(decoded["links"], self.graph["links"])
+
+    def test_accept_header_selects_format(self):
+        verbose = self.client.get("/graph")
+        self.assertEqual(verbose.json(), self.graph)
+        self.assertEqual(verbose.headers["vary"], "Accept")
+
+        compact = self.client.get("/graph", headers={"Accept": COMPACT_JSON})
+        self.assertEqual(compact.headers["content-type"], COMPACT_JSON)
+        self.assertEqual(compact.json()["format"], "columnar-v1")
+        self.assertLess(len(compact.content), len(verbose.content))
+
+    def test_msgpack_without_dependency_is_not_acceptable(self):
+        original, graph_encoding.msgpack = graph_encoding.msgpack, None
+        try:
+            response = self.client.get("/graph", headers={"Accept": COMPACT_MSGPACK})
+        finally:
+            graph_encoding.msgpack = original
+        self.assertEqual(response.status_code, 406)
+
+    @unittest.skipIf(graph_encoding.msgpack is None, "msgpack no instalado")
+    def test_msgpack_round_trip(self):
+        response = self.client.get("/graph", headers={"Accept": COMPACT_MSGPACK})
+        payload = graph_encoding.msgpack.unpackb(response.content, raw=False, strict_map_key=False)
+        self.assertEqual(decode_compact(payload)["nodes"], self.graph["nodes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.auth_service import AuthService  # noqa: E402
+from app.services.email_index import EmailIndex  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from scripts.import_users import Checkpoint, UserImporter, read_rows, run_import  # noqa: E402
+
+CSV = """email,full_name,password,role,is_active
+ana@example.com,Ana,secreto1,admin,true
+beto@example.com,Beto,secreto2,,
+mal-email,Nadie,secreto3,user,true
+Ana@Example.com,Ana otra vez,secreto4,user,true
+caro@example.com,Caro,corta,user,true
+dani@example.com,Dani,secreto5,user,no
+"""
+
+
+class TestImportUsers(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        # usuario previo al índice de emails
+        self.client.collections["users"] = {"legacy": {"email": "dani@example.com", "full_name": "D"}}
+        self.hashed = []
+        self.importer = UserImporter(self.client, hasher=self.hash)
+        self.dir = Path(tempfile.mkdtemp())
+        self.source = self.dir / "users.csv"
+        self.source.write_text(CSV, encoding="utf-8")
+        self.errors = self.dir / "errors.ndjson"
+
+    def hash(self, passwords):
+        self.hashed.extend(passwords)
+        return [f"hash:{p}" for p in passwords]
+
+    def run_import(self, rows=None):
+        checkpoint = Checkpoint(self.dir / "checkpoint.json", self.source)
+        checkpoint.load()
+        return run_import(
+            self.importer, rows or read_rows(self.source), checkpoint, self.errors, batch_size=2, log=lambda _: None
+        )
+
+    def test_imports_in_batches_and_reports_row_errors(self):
+        state = self.run_import()
+        self.assertEqual((state["rows_done"], state["created"], state["updated"], state["errors"]), (6, 2, 2, 2))
+        self.assertEqual(self.client.batch_commits, 3)
+
+        users = self.client.collections["users"]
+        self.assertEqual(users["legacy"]["full_name"], "Dani")
+        self.assertFalse(users["legacy"]["is_active"])
+        emails = self.client.collections["user_emails"]
+        ana = users[emails["ana@example.com"]["user_id"]]
+        # la fila repetida (en otro lote) actualiza al mismo usuario
+        self.assertEqual((ana["full_name"], ana["role"], ana["password_hash"]), ("Ana otra vez", "user", "hash:secreto4"))
+        self.assertEqual(emails["dani@example.com"]["user_id"], "legacy")
+
+        errors = [json.loads(line) for line in self.errors.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([e["row"] for e in errors], [3, 5])
+
+    def test_resumes_from_the_checkpoint(self):
+        def interrupted():
+            for number, row in read_rows(self.source):
+                if number == 5:
+                    raise KeyboardInterrupt
+                yield number, row
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_import(interrupted())
+        self.assertEqual(json.loads((self.dir / "checkpoint.json").read_text())["rows_done"], 4)
+
+        self.hashed.clear()
+        state = self.run_import()
+        self.assertEqual(state["rows_done"], 6)
+        self.assertEqual(self.hashed, ["secreto5"])
+
+    def test_backfilled_index_resolves_mixed_case_legacy_users(self):
+        self.client.collections["users"]["old"] = {"email": "Eva@Example.com", "full_name": "E"}
+        EmailIndex(self.client).backfill_all()
+        self.client.calls.clear()
+
+        row = {"email": "eva@example.com", "full_name": "Eva", "password": "secreto6"}
+        result = self.importer.import_chunk([(1, row)])
+        self.assertEqual((result["created"], result["updated"]), (0, 1))
+        self.assertEqual(self.client.collections["users"]["old"]["full_name"], "Eva")
+        self.assertNotIn("stream", [c[0] for c in self.client.calls])
+
+    def test_sessions_of_updated_users_are_refreshed_or_revoked(self):
+        auth = AuthService(self.client)
+        self.importer = UserImporter(self.client, hasher=self.hash, auth=auth)
+        session_id = auth.create_session({"id": "legacy", "email": "dani@example.com", "full_name": "D", "role": "user"})
+
+        row = {"email": "dani@example.com", "full_name": "Dani", "password": "secreto5", "role": "admin"}
+        self.importer.import_chunk([(1, row)])
+        session = auth.get_session(session_id)
+        self.assertEqual((session["full_name"], session["role"]), ("Dani", "admin"))
+
+        self.importer.import_chunk([(1, {**row, "is_active": "false"})])
+        self.assertIsNone(auth.get_session(session_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,459 @@
+import configparser
+import copy
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.core.config import Settings  # noqa: E402
+from app.core.firestore_resilience import FirestoreUnavailable  # noqa: E402
+from app.models.analysis_models import AnalysisJobRequest  # noqa: E402
+from app.services.analysis_cache import AnalysisResultCache  # noqa: E402
+from app.services.analysis_service import AnalysisService, OllamaClient, aggregate  # noqa: E402
+from app.services.jobs_service import JobsService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient, FakeTransaction  # noqa: E402
+
+
+MODEL_REPLY = {
+    "summary": "Módulo de ejemplo",
+    "technologies": [
+        {"name": "Python", "version": "3.11", "category": "language", "lifecycle": "supported", "risk": "LOW"},
+    ],
+    "external_systems": [{"name": "Billing", "protocol": "REST"}],
+}
+
+
+class StandInModelHandler(BaseHTTPRequestHandler):
+    """Imita ``POST /api/generate`` de Ollama."""
+
+    delay = 0.0
+    prompts: list = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).prompts.append(body["prompt"])
+        time.sleep(type(self).delay)
+        payload = json.dumps({"model": body["model"], "response": json.dumps(MODEL_REPLY), "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def build_settings(tmp: Path, **overrides):
+    values = dict(
+        environment="DEV",
+        config=configparser.ConfigParser(),
+        gcp_project="test-project",
+        firestore_db="test-db",
+        apps_collection="apps",
+        projects_collection="projects",
+        log_level="INFO",
+        frontend_origins="",
+        session_ttl_hours=8,
+        session_cookie_name="session",
+        repos_dir=str(tmp / "repos"),
+        analysis_dir=str(tmp / "analysis"),
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def git(*args, cwd):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_git_repo(path: Path, files: dict[str, str]) -> str:
+    path.mkdir(parents=True)
+    git("init", "-q", "-b", "main", cwd=path)
+    commit_files(path, files)
+    return path.as_uri()
+
+
+def commit_files(path: Path, files: dict[str, str], message="update"):
+    for name, content in files.items():
+        target = path / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content)
+    git("add", "-A", cwd=path)
+    git("-c", "user.email=t@t", "-c", "user.name=t", "commit", "-q", "-m", message, cwd=path)
+
+
+def store_app(client, repo_url, project_id=None, app_id=None, module_name="core"):
+    app_id = app_id or str(uuid.uuid4())
+    client.collection("apps").document(app_id).set({
+        "id": app_id,
+        "project_id": project_id or str(uuid.uuid4()),
+        "name": "App",
+        "modules": [{
+            "name": module_name,
+            "description": "",
+            "repo": {"repo_url": repo_url, "repo_branch": "main"},
+            "code_analysis_history": [],
+            "functional_analysis_history": [],
+        }],
+    })
+    return app_id
+
+
+def wait_for(service, job_id, statuses=("done", "failed", "cancelled"), timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = service.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} no llegó a {statuses}: {service.get_job(job_id)}")
+
+
+class BlockingAnalysis:
+    """AnalysisService de prueba: registra el orden y espera a que el test lo libere."""
+
+    def __init__(self):
+        self.started = []
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def resolve_commit(self, repo_url, branch, credentials=None):
+        return None
+
+    def load_result(self, result_path):
+        raise FileNotFoundError(result_path)
+
+    def run(self, job, ctx):
+        tenant = job["tenant_id"]
+        with self.lock:
+            self.started.append(job["id"])
+            self.running[tenant] = self.running.get(tenant, 0) + 1
+            self.max_running[tenant] = max(self.max_running.get(tenant, 0), self.running[tenant])
+        try:
+            while not self.release.wait(0.01):
+                ctx.check_cancelled()
+            return "/dev/null"
+        finally:
+            with self.lock:
+                self.running[tenant] -= 1
+
+
+class TestJobsEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.client = FakeFirestoreClient()
+        self.settings = build_settings(self.tmp)
+        self.logger = logging.getLogger("test")
+
+    def make_service(self, analysis, **kwargs):
+        service = JobsService(self.client, self.settings, self.logger, analysis, **kwargs)
+        self.addCleanup(service.stop, 5)
+        return service
+
+    def test_priority_order_with_single_worker(self):
+        analysis = BlockingAnalysis()
+        service = self.make_service(analysis, workers=1)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        low = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core", priority=1))
+        high = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core", priority=9))
+        analysis.release.set()
+        service.start()
+        wait_for(service, low["id"])
+        self.assertEqual(analysis.started, [high["id"], low["id"]])
+
+    def test_tenant_concurrency_limit(self):
+        analysis = BlockingAnalysis()
+        service = self.make_service(analysis, workers=3, tenant_concurrency=1)
+        tenant = str(uuid.uuid4())
+        busy_app = store_app(self.client, "https://example.com/a.git", project_id=tenant)
+        other_app = store_app(self.client, "https://example.com/b.git")
+        service.start()
+        jobs = [service.submit(AnalysisJobRequest(application_id=busy_app, module_name="core")) for _ in range(2)]
+        other = service.submit(AnalysisJobRequest(application_id=other_app, module_name="core"))
+        wait_for(service, other["id"], statuses=("running",))
+        self.assertEqual(service.get_job(jobs[1]["id"])["status"], "queued")
+        analysis.release.set()
+        for job in jobs:
+            wait_for(service, job["id"])
+        self.assertEqual(analysis.max_running[tenant], 1)
+
+    def test_cancel_queued_and_running_jobs(self):
+        analysis = BlockingAnalysis()
+        service = self.make_service(analysis, workers=1)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        service.start()
+        running = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        queued = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        wait_for(service, running["id"], statuses=("running",))
+        self.assertEqual(service.cancel(queued["id"])["status"], "cancelled")
+        service.cancel(running["id"])
+        self.assertEqual(wait_for(service, running["id"])["status"], "cancelled")
+        self.assertEqual(self.client.collections["analysis_jobs"][queued["id"]]["status"], "cancelled")
+
+    def test_unknown_module_raises_value_error(self):
+        service = self.make_service(BlockingAnalysis())
+        app_id = store_app(self.client, "https://example.com/r.git")
+        with self.assertRaises(ValueError):
+            service.submit(AnalysisJobRequest(application_id=app_id, module_name="missing"))
+
+    def test_recover_requeues_persisted_active_jobs(self):
+        analysis = BlockingAnalysis()
+        analysis.release.set()
+        first = self.make_service(analysis)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        job = first.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        first.stop(5)
+
+        second = self.make_service(analysis)
+        second.start()
+        self.assertEqual(wait_for(second, job["id"])["status"], "done")
+
+    def test_leased_jobs_are_claimed_by_a_single_instance(self):
+        analysis = BlockingAnalysis()
+        owner = self.make_service(analysis)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        job = owner.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        stored = self.client.collections["analysis_jobs"][job["id"]]
+        self.assertEqual(stored["owner"], owner.instance_id)
+
+        # con el lease vigente nadie más lo toma
+        other = self.make_service(analysis)
+        self.assertEqual(other.recover(), 0)
+
+        # vencido (instancia caída), lo reclama una sola de las instancias que lo intentan
+        stored["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        third = self.make_service(analysis)
+        self.assertEqual(other.recover() + third.recover(), 1)
+        self.assertIn(self.client.collections["analysis_jobs"][job["id"]]["owner"], (other.instance_id, third.instance_id))
+
+    def test_history_write_keeps_concurrent_module_edits(self):
+        service = self.make_service(BlockingAnalysis())
+        app_id = store_app(self.client, "https://example.com/r.git")
+        original = FakeTransaction.get
+        edited = []
+
+        def get_then_edit(transaction, ref, **kwargs):
+            result = list(original(transaction, ref, **kwargs))
+            if not edited:
+                # otra instancia edita el módulo entre la lectura y el commit
+                edited.append(True)
+                modules = copy.deepcopy(self.client.collections["apps"][app_id]["modules"])
+                modules[0]["description"] = "editado"
+                self.client.collection("apps").document(app_id).update({"modules": modules})
+            return iter(result)
+
+        job_id = str(uuid.uuid4())
+        with mock.patch.object(FakeTransaction, "get", get_then_edit):
+            service._append_history({"id": job_id, "kind": "code", "application_id": app_id, "module_name": "core"})
+        module = self.client.collections["apps"][app_id]["modules"][0]
+        self.assertEqual(module["description"], "editado")
+        self.assertEqual([h["job_id"] for h in module["code_analysis_history"]], [job_id])
+
+    def test_shutdown_interrupts_running_jobs_without_cancelling_them(self):
+        analysis = BlockingAnalysis()
+        first = self.make_service(analysis, workers=1)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        first.start()
+        job = first.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        wait_for(first, job["id"], statuses=("running",))
+        first.stop(5)
+        self.assertEqual(self.client.collections["analysis_jobs"][job["id"]]["status"], "running")
+
+        analysis.release.set()
+        second = self.make_service(analysis)
+        second.start()
+        self.assertEqual(wait_for(second, job["id"])["status"], "done")
+
+    def test_firestore_writes_do_not_hold_the_scheduler_lock(self):
+        service = self.make_service(BlockingAnalysis(), workers=1)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        job = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+
+        self.client.latency = 0.5
+        cancelling = threading.Thread(target=service.cancel, args=(job["id"],))
+        cancelling.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        self.assertEqual(service.queue_depth(), 0)
+        self.assertLess(time.monotonic() - started, 0.2)
+        cancelling.join()
+        self.assertEqual(self.client.collections["analysis_jobs"][job["id"]]["status"], "cancelled")
+
+    @mock.patch("app.services.jobs_service.PERSIST_BACKOFF_SECONDS", 0)
+    def test_workers_survive_firestore_outages(self):
+        analysis = BlockingAnalysis()
+        analysis.release.set()
+        service = self.make_service(analysis, workers=1)
+        app_id = store_app(self.client, "https://example.com/r.git")
+        first = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+
+        persist = service._persist
+        outage = threading.Event()
+        outage.set()
+
+        def flaky_persist(job):
+            if outage.is_set():
+                raise FirestoreUnavailable()
+            persist(job)
+
+        service._persist = flaky_persist
+        service.start()
+        # el job termina en memoria aunque no se pueda persistir
+        self.assertEqual(wait_for(service, first["id"])["status"], "done")
+
+        outage.clear()
+        second = service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        self.assertEqual(wait_for(service, second["id"])["status"], "done")
+        self.assertEqual(self.client.collections["analysis_jobs"][second["id"]]["status"], "done")
+
+
+class TestAnalysisWithStandInModel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        StandInModelHandler.prompts = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInModelHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        host = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        self.client = FakeFirestoreClient()
+        self.settings = build_settings(self.tmp, ollama_host=host)
+        self.logger = logging.getLogger("test")
+        self.analysis = AnalysisService(self.settings, self.logger, OllamaClient(host, "stand-in", timeout=5))
+        self.service = JobsService(self.client, self.settings, self.logger, self.analysis, workers=1)
+        self.addCleanup(self.service.stop, 5)
+        self.service.start()
+
+        self.repo_url = make_git_repo(self.tmp / "origin", {
+            "app/main.py": "print('hola')\n",
+            "app/billing.py": "import requests\n",
+            "README.md": "no se analiza\n",
+        })
+
+    def test_job_analyzes_repo_and_records_history(self):
+        app_id = store_app(self.client, self.repo_url)
+        completed = []
+        self.service.add_completion_hook(completed.append)
+
+        job = self.service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        done = wait_for(self.service, job["id"])
+        self.assertEqual(done["status"], "done", done.get("error"))
+
+        result = self.analysis.load_result(done["result_path"])
+        self.assertEqual(sorted(result["files"]), ["app/billing.py", "app/main.py"])
+        self.assertEqual(result["technologies"][0]["name"], "Python")
+        self.assertEqual(result["technologies"][0]["lifecycle"], "supported")
+        self.assertEqual(len(result["commit_sha"]), 40)
+        self.assertEqual(len(StandInModelHandler.prompts), 2)
+        self.assertTrue(all("lifecycle" in p and "risk" in p for p in StandInModelHandler.prompts))
+
+        module = self.client.collections["apps"][app_id]["modules"][0]
+        self.assertEqual([h["job_id"] for h in module["code_analysis_history"]], [job["id"]])
+        self.assertEqual([j["id"] for j in completed], [job["id"]])
+        self.assertFalse((self.tmp / "repos" / "jobs" / job["id"]).exists())
+
+    def test_resubmitting_same_commit_hits_result_cache(self):
+        app_id = store_app(self.client, self.repo_url)
+        first = wait_for(self.service, self.service.submit(
+            AnalysisJobRequest(application_id=app_id, module_name="core"))["id"])
+        prompts = len(StandInModelHandler.prompts)
+
+        second = self.service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        self.assertEqual(second["status"], "done")
+        self.assertTrue(second["cache_hit"])
+        self.assertEqual(second["commit_sha"], first["commit_sha"])
+        self.assertEqual(len(StandInModelHandler.prompts), prompts)
+        self.assertEqual(self.analysis.load_result(second["result_path"])["files"].keys(), {"app/billing.py", "app/main.py"})
+        history = self.client.collections["apps"][app_id]["modules"][0]["code_analysis_history"]
+        self.assertEqual([h["job_id"] for h in history], [first["id"], second["id"]])
+
+        commit_files(self.tmp / "origin", {"app/main.py": "print('chau')\n"})
+        third = self.service.submit(AnalysisJobRequest(application_id=app_id, module_name="core"))
+        self.assertFalse(third["cache_hit"])
+        self.assertEqual(wait_for(self.service, third["id"])["status"], "done")
+
+    def test_follow_up_job_only_reanalyzes_changed_files(self):
+        app_id = store_app(self.client, self.repo_url)
+        first = wait_for(self.service, self.service.submit(
+            AnalysisJobRequest(application_id=app_id, module_name="core"))["id"])
+        first_result = self.analysis.load_result(first["result_path"])
+        self.assertEqual(first_result["files_analyzed"], 2)
+        self.assertEqual(set(first_result["file_hashes"]), {"app/billing.py", "app/main.py"})
+
+        origin = self.tmp / "origin"
+        (origin / "app" / "billing.py").unlink()
+        commit_files(origin, {"app/main.py": "print('cambio')\n", "app/new.py": "x = 1\n"})
+        StandInModelHandler.prompts = []
+
+        second = wait_for(self.service, self.service.submit(
+            AnalysisJobRequest(application_id=app_id, module_name="core"))["id"])
+        result = self.analysis.load_result(second["result_path"])
+        self.assertEqual(result["base_job_id"], first["id"])
+        self.assertEqual(result["files_analyzed"], 2)
+        self.assertEqual(result["files_reused"], 0)
+        self.assertEqual(sorted(result["files"]), ["app/main.py", "app/new.py"])
+        self.assertEqual(len(StandInModelHandler.prompts), 2)
+
+        commit_files(origin, {"app/other.py": "y = 2\n"})
+        StandInModelHandler.prompts = []
+        third = wait_for(self.service, self.service.submit(
+            AnalysisJobRequest(application_id=app_id, module_name="core"))["id"])
+        result = self.analysis.load_result(third["result_path"])
+        self.assertEqual(result["base_job_id"], second["id"])
+        self.assertEqual((result["files_reused"], result["files_analyzed"]), (2, 1))
+        self.assertEqual([p.split("(")[1].split(")")[0] for p in StandInModelHandler.prompts], ["app/other.py"])
+
+
+class TestAnalysisResultCache(unittest.TestCase):
+    def test_lru_eviction_by_size(self):
+        tmp = Path(tempfile.mkdtemp())
+        cache = AnalysisResultCache(tmp / "cache", max_bytes=250)
+        src = tmp / "result.json"
+        src.write_text("x" * 100)
+        for key in ("a", "b"):
+            cache.put(key, str(src))
+        old = time.time() - 100
+        os.utime(tmp / "cache" / "a.json", (old, old))
+        os.utime(tmp / "cache" / "b.json", (old + 1, old + 1))
+        self.assertIsNotNone(cache.get("a"))  # "a" pasa a ser el más reciente
+        cache.put("c", str(src))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_key_depends_on_commit_and_kind(self):
+        base = AnalysisResultCache.key("https://x/r.git", "main", "abc", "code")
+        self.assertEqual(base, AnalysisResultCache.key("https://x/r.git/", "main", "abc", "code"))
+        self.assertNotEqual(base, AnalysisResultCache.key("https://x/r.git", "main", "abd", "code"))
+        self.assertNotEqual(base, AnalysisResultCache.key("https://x/r.git", "main", "abc", "functional"))
+
+
+
+class TestAggregate(unittest.TestCase):
+    def test_lifecycle_and_risk_are_filled_from_any_file(self):
+        result = aggregate({
+            "a.py": {"technologies": [{"name": "Java", "version": "8"}]},
+            "b.py": {"technologies": [{"name": "java", "version": "8", "lifecycle": "eol", "risk": "HIGH"}]},
+            "c.py": {"technologies": [{"name": "Java", "version": "8", "lifecycle": "supported"}]},
+        })
+        self.assertEqual(result["technologies"], [{"name": "Java", "version": "8", "lifecycle": "eol", "risk": "HIGH"}])
+
+if __name__ == "__main__":
+    unittest.main()
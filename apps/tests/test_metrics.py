@@ -0,0 +1,135 @@
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from google.api_core.exceptions import ServiceUnavailable  # noqa: E402
+
+from app.api.routes import metrics  # noqa: E402
+from app.core.firestore_resilience import FirestoreGuard, ResilientClient  # noqa: E402
+from app.core.metrics import (  # noqa: E402
+    ADMISSION_SHED,
+    CACHE_REQUESTS,
+    FIRESTORE_CALLS,
+    FIRESTORE_DURATION,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_DURATION,
+    Histogram,
+    MetricsMiddleware,
+    record_cache,
+)
+from app.core.rate_limit import ConcurrencyLimiter  # noqa: E402
+from app.services.owner_index_service import OwnerIndexService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+METRICS_TOKEN = "scrape-secret"
+AUTH = {"Authorization": f"Bearer {METRICS_TOKEN}"}
+
+
+def build_app(metrics_token=METRICS_TOKEN):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+    app.state.admission = {}
+    app.state.settings = build_settings()
+    app.state.settings.metrics_token = metrics_token
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: str):
+        return {"id": item_id}
+
+    return app
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        for metric in (HTTP_REQUEST_DURATION, FIRESTORE_CALLS, FIRESTORE_DURATION, CACHE_REQUESTS):
+            metric.clear()
+
+    def test_metrics_require_the_bearer_token(self):
+        client = TestClient(build_app())
+        self.assertEqual(client.get("/metrics").status_code, 401)
+        self.assertEqual(client.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code, 401)
+        self.assertEqual(client.get("/metrics", headers={"Authorization": METRICS_TOKEN}).status_code, 401)
+        self.assertEqual(client.get("/metrics", headers=AUTH).status_code, 200)
+        # sin token configurado el endpoint no se expone
+        disabled = TestClient(build_app(metrics_token=""))
+        self.assertEqual(disabled.get("/metrics", headers=AUTH).status_code, 404)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, op="get")
+        lines = histogram.render()
+        self.assertIn('t_seconds_bucket{op="get",le="0.1"} 1', lines)
+        self.assertIn('t_seconds_bucket{op="get",le="1"} 2', lines)
+        self.assertIn('t_seconds_bucket{op="get",le="+Inf"} 3', lines)
+        self.assertIn('t_seconds_count{op="get"} 3', lines)
+
+    def test_requests_are_labelled_by_route_template(self):
+        client = TestClient(build_app())
+        client.get("/items/a")
+        client.get("/items/b")
+        client.get("/nada")
+        self.assertEqual(HTTP_REQUEST_DURATION.count(method="GET", route="/items/{item_id}", status="200"), 2)
+        self.assertEqual(HTTP_REQUEST_DURATION.count(method="GET", route="unmatched", status="404"), 1)
+        self.assertEqual(HTTP_IN_FLIGHT.value(), 0)
+
+        resp = client.get("/metrics", headers=AUTH)
+        self.assertTrue(resp.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 2', resp.text
+        )
+        self.assertIn("threadpool_max_threads", resp.text)
+
+    def test_firestore_calls_are_labelled_by_caller_and_collection(self):
+        fake = FakeFirestoreClient()
+        fake.collections["user_projects"] = {"ana": {"project_ids": ["p1"], "app_ids": []}}
+        settings = build_settings()
+        db = ResilientClient(fake, settings, guard=FirestoreGuard(settings, sleep=lambda _: None))
+        owners = OwnerIndexService(db, settings, None)
+
+        self.assertTrue(owners.owns_project("ana", "p1"))
+        self.assertTrue(owners.owns_project("ana", "p1"))
+        labels = dict(service="owner_index_service", method="OwnerIndexService._owned", collection="user_projects")
+        self.assertEqual(FIRESTORE_CALLS.value(op="get", outcome="ok", **labels), 1)
+        self.assertEqual(FIRESTORE_DURATION.count(op="get", **labels), 1)
+        self.assertEqual(CACHE_REQUESTS.value(cache="owner_index", result="miss"), 1)
+        self.assertEqual(CACHE_REQUESTS.value(cache="owner_index", result="hit"), 1)
+
+        fake.failures = [ServiceUnavailable("x")]
+        with self.assertRaises(Exception):
+            db.collection("users").document("ana").set({"x": 1})
+        self.assertEqual(
+            FIRESTORE_CALLS.value(service="other", method="", collection="users", op="set", outcome="unavailable"), 1
+        )
+
+    def test_cache_hit_ratio_is_computed_on_scrape(self):
+        for hit in (True, True, True, False):
+            record_cache("graph_index", hit)
+        resp = TestClient(build_app()).get("/metrics", headers=AUTH)
+        self.assertIn('cache_hit_ratio{cache="graph_index"} 0.75', resp.text)
+
+
+    def test_rejections_are_exposed_as_counters(self):
+        app = build_app()
+        limiter = ConcurrencyLimiter(1, 0, 0.1)
+        limiter.shed = 3
+        app.state.admission = {"concurrency": limiter}
+        resp = TestClient(app).get("/metrics", headers=AUTH)
+        self.assertIn("# TYPE admission_shed_requests_total counter", resp.text)
+        self.assertIn("admission_shed_requests_total 3", resp.text)
+        self.assertIn("# TYPE rate_limited_requests_total counter", resp.text)
+        self.assertIn("# TYPE firestore_breaker_rejected_calls_total counter", resp.text)
+        self.assertEqual(ADMISSION_SHED.value(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import logging
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api.routes import mocks  # noqa: E402
+from app.utils.mocking import load_mock  # noqa: E402
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("id"), fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+class TestMockJobStream(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.state.logger = logging.getLogger("test")
+        app.include_router(mocks.router)
+        self.client = TestClient(app)
+
+    def test_stream_emits_progress_then_done(self):
+        resp = self.client.get(
+            "/mocks/functional_analysis_request_stream/job-1",
+            params={"steps": 3, "interval": 0},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/event-stream"))
+        events = parse_events(resp.text)
+        self.assertEqual([e[1] for e in events], ["progress", "progress", "progress", "done"])
+        progress = [e[2]["progress"] for e in events]
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(events[-1][2]["status"], "done")
+
+    def test_stream_resumes_from_last_event_id(self):
+        resp = self.client.get(
+            "/mocks/functional_analysis_request_stream/job-1",
+            params={"steps": 3, "interval": 0},
+            headers={"Last-Event-ID": "2"},
+        )
+        events = parse_events(resp.text)
+        self.assertEqual([e[0] for e in events], ["3", "4"])
+
+
+class TestLoadMock(unittest.TestCase):
+    def test_returns_independent_copies(self):
+        first = load_mock("app_relations")
+        first["app_id"] = "changed"
+        self.assertNotEqual(load_mock("app_relations")["app_id"], "changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
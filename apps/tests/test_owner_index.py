@@ -0,0 +1,297 @@
+import logging
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api.routes import analysis, search, technologies  # noqa: E402
+from app.core.auth_deps import (  # noqa: E402
+    check_user_access,
+    get_current_user,
+    require_application_access,
+    require_project_access,
+)
+from app.services.owner_index_service import OwnerIndexService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+class TestOwnerIndexService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.service = OwnerIndexService(self.client, build_settings(), logging.getLogger("test"))
+        users = self.client.collections.setdefault("users", {})
+        users["ana"] = {"email": "ana@example.com", "full_name": "Ana"}
+        users["beto"] = {"email": "beto@example.com", "full_name": "Beto"}
+        self.save_project("P1", "Zeta", "ana", ["A1"])
+        self.save_project("P2", "Alfa", "ana", [])
+
+    def save_project(self, project_id, name, user_id, applications, previous_owner=None):
+        self.client.collections.setdefault("projects", {})[project_id] = {
+            "id": project_id, "name": name, "user_id": user_id, "applications": applications,
+        }
+        self.service.on_project_saved(project_id, previous_owner=previous_owner)
+
+    def test_lists_user_projects_with_a_single_read(self):
+        self.service.list_projects("ana")  # primera lectura: completa el índice
+        self.client.calls.clear()
+        projects = self.service.list_projects("ana")
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual([p["project"]["name"] for p in projects], ["Alfa", "Zeta"])
+        self.assertEqual(projects[1], {
+            "project": {"id": "P1", "name": "Zeta", "user_id": "ana", "applications": ["A1"]},
+            "user_email": "ana@example.com",
+            "user_full_name": "Ana",
+        })
+        self.assertEqual(self.service.list_projects("nadie"), [])
+
+    def test_projects_created_before_the_index_are_backfilled(self):
+        # proyectos que nunca pasaron por on_project_saved
+        projects = self.client.collections["projects"]
+        projects["OLD"] = {"id": "OLD", "name": "Viejo", "user_id": "beto", "applications": ["A9"]}
+        projects["OLD2"] = {"id": "OLD2", "name": "Previo", "user_id": "ana", "applications": ["A8"]}
+
+        self.assertEqual([p["project"]["id"] for p in self.service.list_projects("beto")], ["OLD"])
+        self.assertTrue(self.service.owns_application("beto", "A9"))
+        # ana ya tenía índice (proyectos nuevos): se completa con los previos
+        self.assertEqual([p["project"]["id"] for p in self.service.list_projects("ana")], ["P2", "OLD2", "P1"])
+        self.assertTrue(self.service.owns_application("ana", "A8"))
+        self.assertTrue(self.client.collections["user_projects"]["beto"]["backfilled"])
+        self.assertEqual(self.client.collections["user_projects"]["beto"]["user"]["email"], "beto@example.com")
+
+        self.client.calls.clear()
+        self.service.list_projects("beto")
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_ownership_change_moves_project_between_indexes(self):
+        previous = self.service.owner_of("P1")
+        self.save_project("P1", "Zeta", "beto", ["A1"], previous_owner=previous)
+
+        self.assertEqual([p["project"]["id"] for p in self.service.list_projects("ana")], ["P2"])
+        self.assertEqual([p["project"]["id"] for p in self.service.list_projects("beto")], ["P1"])
+        self.assertFalse(self.service.owns_application("ana", "A1"))
+        self.assertTrue(self.service.owns_application("beto", "A1"))
+
+    def test_applications_and_deletions_are_reflected(self):
+        self.client.collections["projects"]["P2"]["applications"] = ["A2"]
+        self.service.on_application_saved("A2", "P2")
+        self.assertTrue(self.service.owns_application("ana", "A2"))
+        self.assertEqual(self.service.list_projects("ana")[0]["project"]["applications"], ["A2"])
+
+        entry = self.service.project_entry("P1")
+        self.service.on_project_deleted("P1", entry["user_id"], entry["applications"])
+        self.assertFalse(self.service.owns_project("ana", "P1"))
+        self.assertFalse(self.service.owns_application("ana", "A1"))
+        self.assertEqual([p["project"]["id"] for p in self.service.list_projects("ana")], ["P2"])
+
+    def test_moved_and_deleted_applications_leave_the_index(self):
+        self.save_project("P3", "Beta", "beto", [])
+        self.client.collections.setdefault("apps", {})["A1"] = {"id": "A1", "project_id": "P1"}
+        self.service.list_projects("ana")  # índices ya completos
+        self.service.list_projects("beto")
+
+        # misma dueña: pasa de P1 a P2 en una sola escritura
+        previous = self.service.application_project("A1")
+        self.client.collections["apps"]["A1"]["project_id"] = "P2"
+        self.service.on_application_saved("A1", "P2", previous_project_id=previous)
+        by_id = {p["project"]["id"]: p["project"] for p in self.service.list_projects("ana")}
+        self.assertEqual(by_id["P1"]["applications"], [])
+        self.assertEqual(by_id["P2"]["applications"], ["A1"])
+        self.assertTrue(self.service.owns_application("ana", "A1"))
+
+        # a un proyecto de otro usuario
+        self.service.on_application_saved("A1", "P3", previous_project_id="P2")
+        self.assertFalse(self.service.owns_application("ana", "A1"))
+        self.assertTrue(self.service.owns_application("beto", "A1"))
+        self.assertEqual(self.service.list_projects("beto")[0]["project"]["applications"], ["A1"])
+
+        self.service.on_application_deleted("A1", "P3")
+        self.assertFalse(self.service.owns_application("beto", "A1"))
+        self.assertEqual(self.service.list_projects("beto")[0]["project"]["applications"], [])
+
+    def test_ownership_checks_are_cached(self):
+        self.assertTrue(self.service.owns_project("ana", "P1"))
+        self.client.calls.clear()
+        self.assertTrue(self.service.owns_project("ana", "P2"))
+        self.assertTrue(self.service.owns_application("ana", "A1"))
+        self.assertEqual(self.client.calls, [])
+
+        self.service.invalidate("ana")
+        self.service.owns_project("ana", "P1")
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_cache_misses_reread_the_index_before_denying(self):
+        self.assertTrue(self.service.owns_project("ana", "P1"))
+        # otra instancia crea un proyecto de ana: el set cacheado acá no lo tiene
+        other = OwnerIndexService(self.client, build_settings(), logging.getLogger("test"))
+        self.client.collections["projects"]["P4"] = {"id": "P4", "name": "Nuevo", "user_id": "ana", "applications": ["A4"]}
+        other.on_project_saved("P4")
+
+        self.client.calls.clear()
+        self.assertTrue(self.service.owns_project("ana", "P4"))
+        self.assertTrue(self.service.owns_application("ana", "A4"))
+        self.assertEqual(len(self.client.calls), 1)
+        # negar cuesta una relectura (no dos) aunque la caché estuviera vencida
+        self.client.calls.clear()
+        self.service.invalidate("ana")
+        self.assertFalse(self.service.owns_project("ana", "P9"))
+        self.assertEqual(len(self.client.calls), 1)
+
+
+class TestOwnershipChecks(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        owner_index = OwnerIndexService(self.client, build_settings(), logging.getLogger("test"))
+        self.client.collections["projects"] = {
+            "P1": {"id": "P1", "name": "Uno", "user_id": "ana", "applications": ["A1"]},
+        }
+        self.user = {"user_id": "beto", "role": "user"}
+
+        app = FastAPI()
+        app.state.owner_index = owner_index
+        app.dependency_overrides[get_current_user] = lambda: self.user
+
+        @app.get("/projects/{project_id}", dependencies=[Depends(require_project_access)])
+        def project(project_id: str):
+            return {"id": project_id}
+
+        @app.get("/applications/{application_id}", dependencies=[Depends(require_application_access)])
+        def application(application_id: str):
+            return {"id": application_id}
+
+        @app.get("/projects/by-user/{user_id}")
+        def by_user(user_id: str, user: dict = Depends(get_current_user)):
+            check_user_access(user, user_id)
+            return []
+
+        self.http = TestClient(app)
+
+    def statuses(self):
+        return [
+            self.http.get(path).status_code
+            for path in ("/projects/P1", "/applications/A1", "/projects/by-user/ana")
+        ]
+
+    def test_only_owners_and_admins_get_through(self):
+        self.assertEqual(self.statuses(), [403, 403, 403])
+        self.user = {"user_id": "ana", "role": "user"}
+        self.assertEqual(self.statuses(), [200, 200, 200])
+        self.assertEqual(self.http.get("/projects/P9").status_code, 403)
+        self.user = {"user_id": "admin", "role": "admin"}
+        self.assertEqual(self.statuses(), [200, 200, 200])
+
+
+class FakeJobs:
+    def __init__(self, job):
+        self.job = job
+        self.submitted = []
+
+    def submit(self, body, credentials=None):
+        self.submitted.append(body.application_id)
+        return self.job
+
+    def get_job(self, job_id):
+        if job_id != self.job["id"]:
+            raise ValueError(f"Job {job_id} no encontrado")
+        return self.job
+
+    def cancel(self, job_id):
+        return self.get_job(job_id)
+
+    def snapshot(self, job_id):
+        return 1, (self.job if job_id == self.job["id"] else None), None
+
+
+class FakeScoped:
+    """Devuelve los argumentos con los que se la llamó (search/tech index)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def search(self, q, **kwargs):
+        self.calls.append(kwargs)
+        return {"hits": []}
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return []
+
+    def get_technology(self, tech_id, project_ids=None):
+        self.calls.append({"project_ids": project_ids})
+        return {"id": tech_id}
+
+
+class TestScopedRoutes(unittest.TestCase):
+    """Jobs, búsqueda y tecnologías sólo muestran lo de proyectos propios."""
+
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        owner_index = OwnerIndexService(self.client, build_settings(), logging.getLogger("test"))
+        self.client.collections["projects"] = {
+            "P1": {"id": "P1", "name": "Uno", "user_id": "ana", "applications": ["A1"]},
+        }
+        self.job = {
+            "id": "J1", "kind": "code", "tenant_id": "P1", "application_id": "A1", "module_name": "api",
+            "repo_url": "https://git.example.com/r.git", "repo_branch": "main", "status": "queued",
+            "created_at": datetime.now(timezone.utc),
+        }
+        self.jobs = FakeJobs(self.job)
+        self.scoped = FakeScoped()
+        self.user = {"user_id": "beto", "role": "user"}
+
+        app = FastAPI()
+        app.state.owner_index = owner_index
+        app.state.jobs_service = self.jobs
+        app.state.search_service = self.scoped
+        app.state.tech_index = self.scoped
+        app.state.logger = logging.getLogger("test")
+        for module in (analysis, search, technologies):
+            app.include_router(module.router)
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.http = TestClient(app)
+
+    def job_statuses(self):
+        return [
+            self.http.post("/analysis/jobs", json={"application_id": "A1", "module_name": "api"}).status_code,
+            self.http.get("/analysis/jobs/J1").status_code,
+            self.http.delete("/analysis/jobs/J1").status_code,
+            self.http.get("/analysis/jobs/J1/result").status_code,
+        ]
+
+    def test_jobs_of_other_users_are_forbidden(self):
+        self.assertEqual(self.job_statuses(), [403] * 4)
+        self.assertEqual(self.http.get("/analysis/jobs/J1/events").status_code, 403)
+        self.assertEqual(self.jobs.submitted, [])
+        self.assertEqual(self.http.get("/analysis/jobs/J9").status_code, 404)
+
+        self.user = {"user_id": "ana", "role": "user"}
+        self.assertEqual(self.job_statuses(), [202, 200, 200, 409])
+        self.assertEqual(self.jobs.submitted, ["A1"])
+        self.job["status"] = "done"  # el stream emite el estado terminal y cierra
+        self.assertEqual(self.http.get("/analysis/jobs/J1/events").status_code, 200)
+
+    def test_search_and_technologies_are_limited_to_owned_projects(self):
+        self.http.get("/search", params={"q": "api"})
+        self.http.get("/technologies")
+        self.http.get("/technologies/TECH_java_8")
+        self.assertEqual([c["project_ids"] for c in self.scoped.calls], [frozenset()] * 3)
+        self.assertEqual(self.http.get("/search", params={"q": "api", "project_id": "P1"}).status_code, 403)
+        self.assertEqual(self.http.get("/technologies", params={"project_id": "P1"}).status_code, 403)
+
+        self.scoped.calls.clear()
+        self.user = {"user_id": "ana", "role": "user"}
+        self.http.get("/search", params={"q": "api", "project_id": "P1"})
+        self.user = {"user_id": "admin", "role": "admin"}
+        self.http.get("/technologies")
+        self.assertEqual([c["project_ids"] for c in self.scoped.calls], [frozenset({"P1"}), None])
+
+
+if __name__ == "__main__":
+    unittest.main()
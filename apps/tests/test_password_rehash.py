@@ -0,0 +1,71 @@
+import configparser
+import logging
+import sys
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import HTTPException, Response  # noqa: E402
+
+from app.api.routes.auth import login  # noqa: E402
+from app.models.auth_models import LoginRequest  # noqa: E402
+from app.services.auth_service import get_pwd_context  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+from scripts.calibrate_password_hash import write_rounds  # noqa: E402
+
+
+class TestPasswordRehash(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.client.collections["users"] = {"ana": {
+            "email": "ana@example.com",
+            "full_name": "Ana",
+            "role": "user",
+            "password_hash": get_pwd_context(1000).hash("secreto1"),
+        }}
+
+    def login(self, password, rounds):
+        settings = replace(build_settings(), password_hash_rounds=rounds)
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(
+            settings=settings, firestore=self.client, logger=logging.getLogger("test"),
+        )))
+        return login(LoginRequest(email="ana@example.com", password=password), request, Response())
+
+    def stored_hash(self):
+        return self.client.collections["users"]["ana"]["password_hash"]
+
+    def test_login_rehashes_when_rounds_change(self):
+        self.login("secreto1", 1000)
+        self.assertIn("$1000$", self.stored_hash())
+
+        self.login("secreto1", 2000)
+        self.assertIn("$2000$", self.stored_hash())
+        # con el costo vigente no se vuelve a escribir
+        current = self.stored_hash()
+        self.login("secreto1", 2000)
+        self.assertEqual(self.stored_hash(), current)
+
+    def test_wrong_password_does_not_rehash(self):
+        with self.assertRaises(HTTPException):
+            self.login("otra-cosa", 2000)
+        self.assertIn("$1000$", self.stored_hash())
+
+    def test_calibration_writes_rounds_to_the_ini(self):
+        path = Path(tempfile.mkdtemp()) / "config.ini"
+        path.write_text("[General]\nlog_level = INFO\n", encoding="utf-8")
+        write_rounds(path, 120000)
+        cfg = configparser.ConfigParser()
+        cfg.read(path)
+        self.assertEqual(cfg.get("General", "password_hash_rounds"), "120000")
+        self.assertEqual(cfg.get("General", "log_level"), "INFO")
+
+
+if __name__ == "__main__":
+    unittest.main()
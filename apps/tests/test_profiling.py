@@ -0,0 +1,121 @@
+import json
+import logging
+import sys
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import APIRouter, Depends, FastAPI, Request  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+
+from app.core.auth_deps import get_current_user  # noqa: E402
+from app.core.firestore_resilience import FirestoreGuard, ResilientClient  # noqa: E402
+from app.core.profiling import (  # noqa: E402
+    ProfiledJSONResponse,
+    ProfiledRoute,
+    ProfilerMiddleware,
+    RequestProfile,
+    profile_phase,
+)
+from app.services.auth_service import AuthService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+class Item(BaseModel):
+    id: str
+    name: str
+
+
+def build_client(slow_ms):
+    fake = FakeFirestoreClient()
+    fake.collections["users"] = {"ana": {"email": "ana@example.com", "full_name": "Ana", "role": "user"}}
+    fake.collections["items"] = {"i1": {"name": "Uno"}}
+    settings = replace(build_settings(), session_cookie_name="session")
+    db = ResilientClient(fake, settings, guard=FirestoreGuard(settings, sleep=lambda _: None))
+    session_id = AuthService(db).create_session({"id": "ana", "email": "ana@example.com", "full_name": "Ana"})
+
+    logger = logging.getLogger("test.profiling")
+    app = FastAPI(default_response_class=ProfiledJSONResponse)
+    app.add_middleware(ProfilerMiddleware, logger=logger, slow_ms=slow_ms)
+    app.state.settings = settings
+    app.state.firestore = db
+    router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ProfiledRoute)
+
+    @router.get("/items/{item_id}", response_model=Item)
+    def get_item(item_id: str, request: Request):
+        doc = request.app.state.firestore.collection("items").document(item_id).get()
+        return {"id": doc.id, **doc.to_dict()}
+
+    app.include_router(router)
+    client = TestClient(app)
+    client.cookies.set("session", session_id)
+    return client, logger
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in header.split(","):
+        name, *params = part.strip().split(";")
+        timings[name] = dict(param.split("=", 1) for param in params)
+    return timings
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def test_server_timing_has_every_phase(self):
+        client, logger = build_client(slow_ms=60_000)
+        with self.assertLogs(logger, level="INFO") as logs:
+            resp = client.get("/items/i1")
+
+        self.assertEqual(resp.json(), {"id": "i1", "name": "Uno"})
+        timings = parse_server_timing(resp.headers["server-timing"])
+        self.assertEqual(set(timings), {"auth", "service", "firestore", "validation", "encoding", "total"})
+        # la sesión en auth, el documento en el endpoint
+        self.assertEqual(timings["firestore"]["desc"], '"2 llamada(s)"')
+        self.assertEqual(timings["service"]["desc"], '"1 llamada(s)"')
+
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry["route"], entry["status"], entry["slow"]), ("/items/{item_id}", 200, False))
+        self.assertEqual(entry["phases"]["firestore"]["calls"], 2)
+        self.assertNotIn("events", entry)
+
+    def test_slow_requests_are_sampled_in_full(self):
+        client, logger = build_client(slow_ms=0.001)
+        with self.assertLogs(logger, level="INFO") as logs:
+            client.get("/items/i1")
+
+        record = logs.records[0]
+        self.assertEqual(record.levelno, logging.WARNING)
+        entry = json.loads(record.getMessage())
+        self.assertTrue(entry["slow"])
+        details = [event["detail"] for event in entry["events"] if event["phase"] == "firestore"]
+        # método del servicio que hizo cada llamada (el endpoint de prueba no es de la app)
+        self.assertEqual(details, ["AuthService.get_session get sessions", "get items"])
+        self.assertEqual(entry["dropped_events"], 0)
+
+    def test_rejected_auth_still_reports_timing(self):
+        client, logger = build_client(slow_ms=60_000)
+        client.cookies.set("session", "no-existe")
+        with self.assertLogs(logger, level="INFO"):
+            resp = client.get("/items/i1")
+        self.assertEqual(resp.status_code, 401)
+        self.assertIn("auth;dur=", resp.headers["server-timing"])
+
+    def test_phases_are_noops_outside_a_request(self):
+        with profile_phase("service"):
+            pass
+        profile = RequestProfile()
+        profile.add("firestore", 0.01, "get")
+        profile.add("firestore", 0.02, "set")
+        self.assertAlmostEqual(profile.seconds("firestore"), 0.03)
+        self.assertIn('firestore;dur=30.0;desc="2 llamada(s)"', profile.server_timing())
+
+
+if __name__ == "__main__":
+    unittest.main()
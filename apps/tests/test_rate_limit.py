@@ -0,0 +1,174 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.rate_limit import (  # noqa: E402
+    AdmissionControlMiddleware,
+    ConcurrencyLimiter,
+    InMemoryBucketBackend,
+    RateLimiter,
+    SessionUserCache,
+    client_ip,
+    is_event_stream,
+    load_backend,
+    request_cost,
+)
+
+# Sesiones válidas del lookup de prueba (session_id -> user_id)
+SESSIONS = {"abc": "ana", "abd": "ana", "xyz": "beto"}
+
+
+def build_client(burst=6.0, trusted_proxy_hops=0, lookups=None):
+    app = FastAPI()
+    limiter = RateLimiter(InMemoryBucketBackend(), rate=0.001, burst=burst)
+
+    def lookup(session_id):
+        if lookups is not None:
+            lookups.append(session_id)
+        return SESSIONS.get(session_id)
+
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        rate_limiter=limiter,
+        cookie_name="session",
+        trusted_proxy_hops=trusted_proxy_hops,
+        session_users=SessionUserCache(lookup),
+    )
+
+    @app.get("/projects")
+    def list_projects():
+        return []
+
+    @app.post("/auth/login")
+    def login():
+        return {"ok": True}
+
+    @app.get("/healthz")
+    def health():
+        return {"status": "ok"}
+
+    return TestClient(app), limiter
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_costs(self):
+        self.assertEqual(request_cost("POST", "/auth/login/"), 5.0)
+        self.assertEqual(request_cost("PUT", "/applications"), 3.0)
+        self.assertEqual(request_cost("GET", "/applications"), 1.0)
+
+    def test_bucket_rejects_with_retry_after_once_exhausted(self):
+        client, limiter = build_client()
+        self.assertEqual(client.post("/auth/login").status_code, 200)
+        self.assertEqual(client.get("/projects").status_code, 200)
+        resp = client.post("/auth/login")
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp.headers["retry-after"]), 1)
+        self.assertEqual(limiter.rejected, 1)
+        # los health checks no consumen ni se limitan
+        self.assertEqual(client.get("/healthz").status_code, 200)
+
+    def test_users_and_ips_have_separate_buckets(self):
+        client, _ = build_client(burst=2.0, trusted_proxy_hops=1)
+        client.cookies.set("session", "abc")
+        ip = {"x-forwarded-for": "10.0.0.1"}
+        self.assertEqual(client.get("/projects", headers=ip).status_code, 200)
+        self.assertEqual(client.get("/projects", headers=ip).status_code, 200)
+        self.assertEqual(client.get("/projects", headers=ip).status_code, 429)
+        # otra IP con otra sesión del mismo usuario comparte el bucket del usuario
+        client.cookies.set("session", "abd")
+        self.assertEqual(client.get("/projects", headers={"x-forwarded-for": "10.0.0.2"}).status_code, 429)
+        # otro usuario desde otra IP tiene su propio bucket
+        client.cookies.set("session", "xyz")
+        self.assertEqual(client.get("/projects", headers={"x-forwarded-for": "10.0.0.3"}).status_code, 200)
+
+    def test_invented_session_cookies_do_not_get_fresh_buckets(self):
+        lookups = []
+        client, _ = build_client(burst=2.0, lookups=lookups)
+        statuses = []
+        for i in range(3):
+            client.cookies.set("session", f"random-{i % 2}")
+            statuses.append(client.get("/projects").status_code)
+        # la sesión inválida cae al bucket de la IP y el lookup queda cacheado
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(lookups, ["random-0", "random-1"])
+
+    def test_event_streams_are_matched_by_route_not_by_headers(self):
+        def scope(path, method="GET", accept=b"application/json"):
+            return {"type": "http", "method": method, "path": path, "headers": [(b"accept", accept)]}
+
+        self.assertTrue(is_event_stream(scope("/analysis/jobs/J1/events")))
+        self.assertTrue(is_event_stream(scope("/mocks/functional_analysis_request_stream/J1")))
+        self.assertFalse(is_event_stream(scope("/analysis/jobs/J1/events", method="DELETE")))
+        self.assertFalse(is_event_stream(scope("/projects", accept=b"text/event-stream")))
+        self.assertFalse(is_event_stream(scope("/projects/P1/events")))
+        self.assertFalse(is_event_stream(scope("/analysis/jobs/J1/events/x")))
+
+    def test_forwarded_for_cannot_be_spoofed(self):
+        # sin proxies confiables el header se ignora
+        client, _ = build_client()
+        statuses = [
+            client.post("/auth/login", headers={"x-forwarded-for": f"10.0.0.{i}"}).status_code for i in range(3)
+        ]
+        self.assertEqual(statuses, [200, 429, 429])
+
+        # detrás de un proxy sólo cuenta la entrada que agregó el proxy
+        client, _ = build_client(trusted_proxy_hops=1)
+        statuses = [
+            client.post("/auth/login", headers={"x-forwarded-for": f"10.0.0.{i}, 203.0.113.7"}).status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [200, 429, 429])
+        # un cliente que pone la IP de otro a la izquierda no le consume el bucket
+        resp = client.post("/auth/login", headers={"x-forwarded-for": "203.0.113.7, 198.51.100.2"})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_client_ip_takes_the_entry_added_by_the_outermost_trusted_proxy(self):
+        scope = {"client": ("10.1.1.1", 1234), "headers": [(b"x-forwarded-for", b"1.1.1.1, 2.2.2.2, 3.3.3.3")]}
+        self.assertEqual(client_ip(scope), "10.1.1.1")
+        self.assertEqual(client_ip(scope, 1), "3.3.3.3")
+        self.assertEqual(client_ip(scope, 2), "2.2.2.2")
+        self.assertEqual(client_ip(scope, 5), "1.1.1.1")
+        self.assertEqual(client_ip({"client": ("10.1.1.1", 1), "headers": []}, 1), "10.1.1.1")
+
+    def test_bucket_refills_over_time(self):
+        backend = InMemoryBucketBackend()
+        self.assertEqual(backend.take("k", 2, rate=1000, burst=2), 0)
+        self.assertGreater(backend.take("k", 2, rate=0.5, burst=2), 0)
+
+    def test_custom_backend_is_loaded_by_path(self):
+        self.assertIsInstance(load_backend("memory"), InMemoryBucketBackend)
+        self.assertIsInstance(load_backend("app.core.rate_limit:InMemoryBucketBackend"), InMemoryBucketBackend)
+        with self.assertRaises(ValueError):
+            load_backend("app.core.rate_limit")
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+    def test_sheds_load_when_queue_is_full_or_wait_times_out(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1, queue_timeout=0.05)
+            self.assertTrue(await limiter.acquire())
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.waiting, 1)
+            # cola llena: se rechaza sin esperar
+            self.assertFalse(await limiter.acquire())
+            # la espera vence sin que se libere el lugar
+            self.assertFalse(await waiter)
+            limiter.release()
+            self.assertTrue(await limiter.acquire())
+            return limiter
+
+        limiter = asyncio.run(scenario())
+        self.assertEqual((limiter.shed, limiter.in_flight, limiter.retry_after), (2, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.repo_cache import RepoCache  # noqa: E402
+from app.utils.git import auth_env, run_git  # noqa: E402
+from apps.tests.test_jobs import commit_files, make_git_repo  # noqa: E402
+
+
+class TestRepoCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.origin = self.tmp / "origin"
+        self.url = make_git_repo(self.origin, {"src/a.py": "a = 1\n"})
+        self.cache = RepoCache(self.tmp / "repos", max_bytes=10 * 1024 * 1024)
+
+    def test_sync_creates_mirror_and_fetches_incrementally(self):
+        mirror = self.cache.sync(self.url)
+        first = self.cache.rev_parse(self.url, "refs/heads/main")
+        commit_files(self.origin, {"src/b.py": "b = 2\n"})
+        self.assertEqual(self.cache.sync(self.url), mirror)
+        second = self.cache.rev_parse(self.url, "refs/heads/main")
+        self.assertNotEqual(first, second)
+        # el commit anterior sigue disponible para jobs encolados antes del push
+        self.assertEqual(self.cache.rev_parse(self.url, first), first)
+
+    def test_checkout_creates_worktree_and_release_removes_it(self):
+        self.cache.sync(self.url)
+        sha = self.cache.rev_parse(self.url, "refs/heads/main")
+        dest = self.cache.checkout(self.url, sha, self.tmp / "jobs" / "j1")
+        self.assertEqual((dest / "src" / "a.py").read_text(), "a = 1\n")
+        self.assertEqual(run_git("rev-parse", "HEAD", cwd=dest).strip(), sha)
+        self.cache.release(self.url, dest)
+        self.assertFalse(dest.exists())
+        self.assertEqual(list((self.cache.mirror_path(self.url) / "worktrees").glob("*")), [])
+
+    def test_concurrent_checkouts_on_same_repo(self):
+        self.cache.sync(self.url)
+        sha = self.cache.rev_parse(self.url, "refs/heads/main")
+        errors = []
+
+        def job(i):
+            try:
+                self.cache.sync(self.url)
+                dest = self.cache.checkout(self.url, sha, self.tmp / "jobs" / f"j{i}")
+                self.assertTrue((dest / "src" / "a.py").exists())
+                self.cache.release(self.url, dest)
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errors.append(e)
+
+        threads = [threading.Thread(target=job, args=(i,)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_evicts_least_recently_used_mirror_not_in_use(self):
+        other_url = make_git_repo(self.tmp / "other", {"x.py": "x = 1\n"})
+        self.cache.sync(self.url)
+        self.cache.sync(other_url)
+        old = time.time() - 100
+        os.utime(self.cache.mirror_path(self.url) / "last_used", (old, old))
+
+        self.cache.max_bytes = 1
+        dest = self.cache.checkout(other_url, "refs/heads/main", self.tmp / "jobs" / "busy")
+        removed = self.cache.evict()
+        self.assertEqual(removed, [RepoCache.repo_key(self.url)])
+        self.assertFalse(self.cache.mirror_path(self.url).exists())
+        self.assertTrue(self.cache.mirror_path(other_url).exists())  # tiene un worktree activo
+
+        self.cache.release(other_url, dest)
+        self.assertEqual(self.cache.evict(), [RepoCache.repo_key(other_url)])
+
+    def test_sync_checkout_keeps_the_mirror_from_concurrent_eviction(self):
+        other_url = make_git_repo(self.tmp / "other", {"x.py": "x = 1\n"})
+        self.cache.max_bytes = 1
+        dest = self.cache.sync_checkout(self.url, ["refs/heads/missing", "refs/heads/main"], self.tmp / "jobs" / "j1")
+        # el sync de otro repo desaloja lo que puede, pero no el mirror recién usado
+        self.cache.sync(other_url)
+        self.assertTrue(self.cache.mirror_path(self.url).exists())
+        self.assertEqual((dest / "src" / "a.py").read_text(), "a = 1\n")
+        self.cache.release(self.url, dest)
+
+    def test_token_goes_in_the_environment_not_in_the_arguments(self):
+        env = auth_env("https://git.example.com/org/r.git", "u", "secret")
+        self.assertEqual(env["GIT_CONFIG_KEY_0"], "http.https://git.example.com/.extraHeader")
+        self.assertEqual(env["GIT_CONFIG_VALUE_0"], "Authorization: Basic " + base64.b64encode(b"u:secret").decode())
+        self.assertEqual(auth_env("https://git.example.com/org/r.git"), {})
+
+        done = subprocess.CompletedProcess([], 0, stdout="", stderr="")
+        with mock.patch("app.utils.git.subprocess.run", return_value=done) as run:
+            run_git("ls-remote", "https://git.example.com/org/r.git", env=env)
+        args, kwargs = run.call_args
+        self.assertNotIn("secret", " ".join(args[0]))
+        self.assertEqual(kwargs["env"]["GIT_CONFIG_VALUE_0"], env["GIT_CONFIG_VALUE_0"])
+
+    def test_credentials_are_not_persisted_in_mirror_config(self):
+        self.cache.sync(self.url, {"user": "u", "token": "secret"})
+        config = (self.cache.mirror_path(self.url) / "config").read_text()
+        self.assertNotIn("secret", config)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import logging
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.change_feed_service import ChangeFeedService  # noqa: E402
+from app.services.search_service import SearchIndex, SearchService, fold  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.upsert("a", {"kind": "application", "title": "Facturación"}, {"name": "Facturación"})
+        self.index.upsert("b", {"kind": "module", "title": "api"}, {"name": "api", "description": "Servicio de facturas"})
+        self.index.upsert("c", {"kind": "application", "title": "Portal"}, {"name": "Portal clientes"})
+
+    def test_accent_folding_and_prefixes(self):
+        self.assertEqual(fold("Facturación Ñandú"), "facturacion nandu")
+        total, hits = self.index.search("FACTURACION")
+        self.assertEqual((total, [h["key"] for h in hits]), (1, ["a"]))
+        total, hits = self.index.search("factu")
+        self.assertEqual([h["key"] for h in hits], ["a", "b"])  # el nombre pesa más que la descripción
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.index.search("portal cli")[0], 1)
+        self.assertEqual(self.index.search("portal factura")[0], 0)
+
+    def test_pagination_and_removal(self):
+        total, page = self.index.search("f", limit=1, offset=1)
+        self.assertEqual((total, [h["key"] for h in page]), (2, ["b"]))
+        self.index.remove("a")
+        self.assertEqual(self.index.search("facturacion")[0], 0)
+        self.assertNotIn("facturacion", self.index.terms)
+        self.assertEqual(self.index.terms, sorted(self.index.terms))
+
+
+class TestSearchService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        settings = build_settings()
+        self.feed = ChangeFeedService(self.client, settings, logging.getLogger("test"))
+        self.service = SearchService(self.client, settings, logging.getLogger("test"), self.feed)
+
+        self.write("projects", "p1", {"name": "Migración Core"})
+        self.write("apps", "a1", {"project_id": "p1", "name": "Billing", "modules": [
+            {"name": "cobranzas", "description": "Gestión de cobranzas y facturación"},
+            {"name": "batch", "description": "Procesos nocturnos"},
+        ]})
+        self.write("apps", "a2", {"project_id": "p2", "name": "Facturador"})
+        self.service.start()
+
+    def write(self, collection, doc_id, data):
+        self.client.collection(collection).document(doc_id).set({"id": doc_id, **data})
+        self.feed.mark_updated(collection, doc_id)
+
+    def ids(self, result):
+        return [(h["kind"], h["id"]) for h in result["hits"]]
+
+    def test_initial_build_and_filters(self):
+        self.assertEqual(self.ids(self.service.search("migracion")), [("project", "p1")])
+        self.assertEqual(self.ids(self.service.search("factur")), [("application", "a2"), ("module", "cobranzas")])
+        scoped = self.service.search("factur", kinds=["module"], project_id="p1")
+        self.assertEqual(scoped["hits"][0]["application_id"], "a1")
+        self.assertEqual(scoped["total"], 1)
+
+    def test_results_are_limited_to_visible_projects(self):
+        visible = self.service.search("factur", project_ids=frozenset({"p1"}))
+        self.assertEqual(self.ids(visible), [("module", "cobranzas")])
+        self.assertEqual(visible["total"], 1)
+        self.assertEqual(self.service.search("factur", project_ids=frozenset())["hits"], [])
+
+    def test_local_writes_are_visible_on_next_query(self):
+        self.write("apps", "a1", {"project_id": "p1", "name": "Billing", "modules": [
+            {"name": "batch", "description": "Procesos nocturnos de facturación"},
+        ]})
+        self.client.calls.clear()
+        result = self.service.search("factur", project_id="p1")
+        self.assertEqual(self.ids(result), [("module", "batch")])
+        # sincroniza con consultas incrementales, no relistando las colecciones
+        streamed = [c for c in self.client.calls if c[0] == "stream"]
+        self.assertEqual({c[1] for c in streamed}, {"projects", "apps", "tombstones"})
+
+        self.client.calls.clear()
+        self.service.search("factur")
+        self.assertEqual(self.client.calls, [])  # sin cambios pendientes no toca Firestore
+
+    def test_deletes_remove_documents(self):
+        self.client.collection("apps").document("a2").delete()
+        self.feed.mark_deleted("apps", "a2", project_id="p2")
+        self.assertEqual(self.service.search("facturador")["total"], 0)
+
+        self.feed.mark_deleted("projects", "p1")
+        self.assertEqual(self.service.search("cobranzas")["total"], 0)
+        self.assertEqual(len(self.service.index), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
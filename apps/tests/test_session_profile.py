@@ -0,0 +1,67 @@
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.api.routes.auth import me  # noqa: E402
+from app.core.auth_deps import get_current_user  # noqa: E402
+from app.services.auth_service import AuthService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+
+
+class TestSessionProfile(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.users = self.client.collections.setdefault("users", {})
+        self.users["ana"] = {"email": "ana@example.com", "full_name": "Ana", "role": "admin"}
+        self.auth = AuthService(self.client)
+        self.session_id = self.auth.create_session({"id": "ana", **self.users["ana"]})
+
+    def current_user(self, session_id=None):
+        request = SimpleNamespace(
+            cookies={"session": session_id or self.session_id},
+            app=SimpleNamespace(state=SimpleNamespace(settings=SimpleNamespace(session_cookie_name="session"))),
+        )
+        return get_current_user(request, self.auth)
+
+    def test_me_is_served_from_the_session(self):
+        self.client.calls.clear()
+        profile = me(self.current_user())
+        self.assertEqual(profile.model_dump(), {
+            "email": "ana@example.com", "full_name": "Ana", "role": "admin", "id": "ana",
+        })
+        self.assertEqual(self.client.calls, [("get", "sessions", self.session_id)])
+
+    def test_user_changes_are_propagated_to_sessions(self):
+        other = self.auth.create_session({"id": "ana", **self.users["ana"]})
+        touched = self.auth.refresh_user_sessions("ana", {"full_name": "Ana María", "role": "user"})
+        self.assertEqual(touched, 2)
+        self.assertEqual(me(self.current_user(other)).full_name, "Ana María")
+        self.assertEqual(me(self.current_user()).role, "user")
+
+        self.auth.refresh_user_sessions("ana", None)
+        with self.assertRaises(HTTPException) as ctx:
+            self.current_user()
+        self.assertEqual(ctx.exception.status_code, 401)
+
+    def test_legacy_sessions_are_filled_once(self):
+        sessions = self.client.collections["sessions"]
+        del sessions[self.session_id]["full_name"]
+        self.assertEqual(me(self.current_user()).full_name, "Ana")
+        self.assertEqual(sessions[self.session_id]["full_name"], "Ana")
+
+        del sessions[self.session_id]["full_name"]
+        del self.users["ana"]
+        with self.assertRaises(HTTPException):
+            self.current_user()
+        self.assertNotIn(self.session_id, sessions)
+
+
+if __name__ == "__main__":
+    unittest.main()
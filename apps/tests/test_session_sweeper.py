@@ -0,0 +1,51 @@
+import logging
+import sys
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.session_sweeper import SessionSweeper  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+
+class TestSessionSweeper(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.now = datetime.now(timezone.utc)
+        sessions = self.client.collections.setdefault("sessions", {})
+        for i in range(7):
+            sessions[f"old-{i}"] = {"user_id": "ana", "expires_at": self.now - timedelta(hours=i + 1)}
+        sessions["live"] = {"user_id": "ana", "expires_at": self.now + timedelta(hours=1)}
+        settings = replace(build_settings(), session_sweep_page_size=3, session_sweep_max_deletes=5)
+        self.sweeper = SessionSweeper(self.client, settings, logging.getLogger("test"))
+        self.sweeper.page_pause = 0
+
+    def test_sweeps_expired_sessions_in_batched_pages_up_to_the_run_limit(self):
+        run = self.sweeper.sweep(self.now)
+        self.assertEqual((run["removed"], run["pages"], run["truncated"]), (5, 2, True))
+        self.assertEqual(self.client.batch_commits, 2)
+        # se borran primero las más viejas; la vigente no se toca
+        self.assertEqual(sorted(self.client.collections["sessions"]), ["live", "old-0", "old-1"])
+
+        run = self.sweeper.sweep(self.now)
+        self.assertEqual((run["removed"], run["truncated"]), (2, False))
+        self.assertEqual(list(self.client.collections["sessions"]), ["live"])
+
+    def test_stats_report_removed_sessions_per_run(self):
+        self.sweeper.sweep(self.now)
+        self.sweeper.sweep(self.now)
+        self.sweeper.sweep(self.now)
+        stats = self.sweeper.stats()
+        self.assertEqual((stats["runs"], stats["total_removed"]), (3, 7))
+        self.assertEqual([r["removed"] for r in stats["recent_runs"]], [0, 2, 5])
+        self.assertEqual(stats["last_run"]["pages"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import logging
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.graph_service import GraphService  # noqa: E402
+from app.services.summary_service import SummaryService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_graph import GraphFixture, build_settings  # noqa: E402
+
+JAVA = {"name": "Java", "version": "17"}
+PG = {"name": "PostgreSQL", "version": "15", "category": "database"}
+
+
+class TestSummaryService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        settings = build_settings()
+        self.graph = GraphService(self.client, settings, logging.getLogger("test"))
+        self.summary = SummaryService(self.client, settings, logging.getLogger("test"))
+        self.graph.add_fragment_writer(self.summary.write_fragments)
+        self.fx = GraphFixture(self.client, Path(tempfile.mkdtemp()))
+
+        self.billing = self.fx.add_app("Billing", [
+            ("api", self.fx.add_result([JAVA, PG], [{"name": "SAP"}])),
+            ("batch", None),
+        ], summary={"modules": 99, "externalsystems": 99, "technologies": 99})
+        self.portal = self.fx.add_app("Portal", [("web", self.fx.add_result([JAVA]))])
+        self.graph.rebuild_project(self.fx.project_id)
+
+    def app_summary(self, app_id):
+        return self.client.collections["apps"][app_id]["summary"]
+
+    def test_application_summary_is_derived_from_analyses(self):
+        self.assertEqual(self.app_summary(self.billing), {"modules": 2, "externalsystems": 1, "technologies": 2})
+        self.assertEqual(self.summary.get_project_summary(self.fx.project_id), {
+            "project_id": self.fx.project_id,
+            "applications": 2,
+            "modules": 3,
+            "externalsystems": 1,
+            "technologies": 3,
+        })
+
+    def test_changes_apply_deltas_to_project_totals(self):
+        self.fx.add_app("Portal", [], app_id=self.portal)
+        self.graph.on_application_changed(self.portal)
+        self.assertEqual(self.app_summary(self.portal), {"modules": 0, "externalsystems": 0, "technologies": 0})
+        totals = self.summary.get_project_summary(self.fx.project_id)
+        self.assertEqual((totals["applications"], totals["modules"], totals["technologies"]), (2, 2, 2))
+
+        # re-materializar sin cambios no altera los totales
+        self.graph.rebuild_project(self.fx.project_id)
+        self.assertEqual(self.summary.get_project_summary(self.fx.project_id), totals)
+
+    def test_summary_is_written_with_the_graph(self):
+        self.fx.add_app("Portal", [], app_id=self.portal)
+        commits = (self.client.batch_commits, self.client.transaction_commits)
+        graph = self.graph.on_application_changed(self.portal)
+        self.assertEqual((self.client.batch_commits, self.client.transaction_commits), (commits[0], commits[1] + 1))
+        self.assertIsNotNone(self.client.collections["apps"][self.portal]["updated_at"])
+
+        # si el summary no se puede escribir, tampoco cambian el grafo ni los totales
+        totals = self.summary.get_project_summary(self.fx.project_id)
+        original = self.summary.apps.document
+
+        def vanished(app_id):
+            # la app se borra entre la lectura y el commit
+            ref = original(app_id)
+            self.client.collections["apps"].pop(app_id, None)
+            return ref
+
+        self.summary.apps.document = vanished
+        with self.assertRaises(Exception):
+            self.graph.on_application_changed(self.billing)
+        stored = self.client.collections["relation_graphs"][self.fx.project_id]
+        self.assertEqual(stored["version"], graph["version"])
+        self.assertEqual(self.summary.get_project_summary(self.fx.project_id), totals)
+
+    def test_totals_are_spread_across_shards_and_read_with_point_reads(self):
+        shards = [k for k in self.client.collections if k.startswith("project_counters/")]
+        self.assertEqual(shards, [f"project_counters/{self.fx.project_id}/shards"])
+        self.client.calls.clear()
+        self.summary.get_project_summary(self.fx.project_id)
+        self.assertEqual(len(self.client.calls), self.summary.shards)
+        self.assertTrue(all(c[0] == "get" for c in self.client.calls))
+
+    def test_project_deletion_clears_totals(self):
+        self.graph.on_project_deleted(self.fx.project_id)
+        totals = self.summary.get_project_summary(self.fx.project_id)
+        self.assertEqual(set(totals.values()) - {self.fx.project_id}, {0})
+        self.summary.delete_project(self.fx.project_id)
+        self.assertEqual(self.client.collections[f"project_counters/{self.fx.project_id}/shards"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import logging
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.graph_service import GraphService, tech_node_id  # noqa: E402
+from app.services.tech_index_service import TechIndexService  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient, FakeTransaction  # noqa: E402
+from apps.tests.test_graph import GraphFixture, build_settings  # noqa: E402
+
+JAVA_8 = {"name": "Java", "version": "8", "lifecycle": "EOL", "risk": "HIGH"}
+JAVA_17 = {"name": "Java", "version": "17", "lifecycle": "supported", "risk": "LOW"}
+REACT = {"name": "React", "version": "18", "lifecycle": "supported", "risk": "LOW"}
+
+
+class TestTechIndexService(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        settings = build_settings()
+        self.graph = GraphService(self.client, settings, logging.getLogger("test"))
+        self.index = TechIndexService(self.client, settings, logging.getLogger("test"))
+        self.graph.add_fragment_listener(self.index.on_fragment)
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.p1 = GraphFixture(self.client, self.tmp)
+        self.p2 = GraphFixture(self.client, self.tmp)
+        self.billing = self.p1.add_app("Billing", [("api", self.p1.add_result([JAVA_8])), ("web", self.p1.add_result([REACT]))])
+        self.crm = self.p2.add_app("CRM", [("core", self.p2.add_result([JAVA_8, REACT]))])
+        self.graph.rebuild_project(self.p1.project_id)
+        self.graph.rebuild_project(self.p2.project_id)
+
+    def test_query_across_projects_without_scanning_apps(self):
+        self.client.calls.clear()
+        results = self.index.query(lifecycle=["eol"])
+        self.assertEqual([r["id"] for r in results], [tech_node_id("Java", "8")])
+        self.assertEqual(
+            [(a["name"], a["modules"]) for a in results[0]["applications"]],
+            [("Billing", ["api"]), ("CRM", ["core"])],
+        )
+        self.assertEqual({c[1] for c in self.client.calls}, {"tech_index"})
+
+        scoped = self.index.query(risk=["low"], project_id=self.p1.project_id)
+        self.assertEqual([a["app_id"] for a in scoped[0]["applications"]], [self.billing])
+
+    def test_results_are_limited_to_visible_projects(self):
+        visible = frozenset({self.p2.project_id})
+        results = self.index.query(lifecycle=["eol"], project_ids=visible)
+        self.assertEqual([a["app_id"] for a in results[0]["applications"]], [self.crm])
+        java8 = self.index.get_technology(tech_node_id("Java", "8"), project_ids=visible)
+        self.assertEqual((java8["app_count"], java8["applications"][0]["app_id"]), (1, self.crm))
+        with self.assertRaises(ValueError):
+            self.index.get_technology(tech_node_id("Java", "8"), project_ids=frozenset())
+
+    def test_incremental_update_moves_application_between_versions(self):
+        self.p1.add_app("Billing", [("api", self.p1.add_result([JAVA_17]))], app_id=self.billing)
+        self.graph.on_application_changed(self.billing)
+
+        java8 = self.index.get_technology(tech_node_id("Java", "8"))
+        self.assertEqual([a["app_id"] for a in java8["applications"]], [self.crm])
+        java17 = self.index.get_technology(tech_node_id("Java", "17"))
+        self.assertEqual(java17["lifecycle"], "supported")
+        self.assertEqual([a["app_id"] for a in java17["applications"]], [self.billing])
+        react = self.client.collections["tech_index"][tech_node_id("React", "18")]
+        self.assertEqual(react["app_count"], 1)
+
+    def java8(self, lifecycle, risk):
+        return {"id": tech_node_id("Java", "8"), "label": "Java", "category": "language",
+                "metadata": {"version": "8", "lifecycle": lifecycle, "risk": risk}, "modules": ["core"]}
+
+    def test_classification_is_derived_from_every_application(self):
+        self.index.update_application(self.p2.project_id, self.crm, "CRM", [self.java8("supported", "LOW")])
+        java8 = self.index.get_technology(tech_node_id("Java", "8"))
+        # Billing todavía la ve EOL: gana la clasificación más grave
+        self.assertEqual((java8["lifecycle"], java8["risk"]), ("eol", "HIGH"))
+        by_app = {a["app_id"]: a["lifecycle"] for a in java8["applications"]}
+        self.assertEqual(by_app, {self.billing: "eol", self.crm: "supported"})
+
+        self.p1.add_app("Billing", [("api", self.p1.add_result([JAVA_17]))], app_id=self.billing)
+        self.graph.on_application_changed(self.billing)
+        java8 = self.index.get_technology(tech_node_id("Java", "8"))
+        self.assertEqual((java8["lifecycle"], java8["risk"]), ("supported", "LOW"))
+
+    def test_concurrent_updates_of_two_applications_are_not_lost(self):
+        original = FakeTransaction.get
+        interleaved = []
+
+        def get_then_other_app(transaction, ref, **kwargs):
+            result = list(original(transaction, ref, **kwargs))
+            if not interleaved:
+                # otra instancia actualiza CRM entre la lectura y el commit de Billing
+                interleaved.append(True)
+                self.index.update_application(self.p2.project_id, self.crm, "CRM", [self.java8("supported", "LOW")])
+            return iter(result)
+
+        with mock.patch.object(FakeTransaction, "get", get_then_other_app):
+            self.index.update_application(self.p1.project_id, self.billing, "Billing", [self.java8("deprecated", "MEDIUM")])
+        stored = self.client.collections["tech_index"][tech_node_id("Java", "8")]
+        self.assertEqual(stored["apps"][self.crm]["lifecycle"], "supported")
+        self.assertEqual(stored["apps"][self.billing]["lifecycle"], "deprecated")
+        self.assertEqual((stored["lifecycle"], stored["risk"], stored["app_count"]), ("deprecated", "MEDIUM", 2))
+
+    def test_unchanged_fragment_does_not_rewrite_index(self):
+        self.client.calls.clear()
+        self.graph.on_application_changed(self.crm)
+        self.assertNotIn("tech_index", {c[1] for c in self.client.calls if c[0] == "set"})
+
+    def test_project_deletion_removes_its_applications(self):
+        self.graph.on_project_deleted(self.p2.project_id)
+        self.assertEqual(self.index.query(name="react")[0]["app_count"], 1)
+        with self.assertRaises(ValueError):
+            self.index.get_technology("TECH_UNKNOWN")
+        self.assertNotIn(self.crm, self.client.collections["tech_index_by_app"])
+
+
+if __name__ == "__main__":
+    unittest.main()
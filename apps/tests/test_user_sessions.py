@@ -0,0 +1,97 @@
+import logging
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.auth_service import AuthService  # noqa: E402
+from app.services.session_sweeper import SessionSweeper  # noqa: E402
+from apps.tests.fakes import FakeFirestoreClient  # noqa: E402
+from apps.tests.test_change_feed import build_settings  # noqa: E402
+
+ANA = {"id": "ana", "email": "ana@example.com", "full_name": "Ana", "role": "admin"}
+BETO = {"id": "beto", "email": "beto@example.com", "full_name": "Beto", "role": "user"}
+
+
+class TestUserSessionIndex(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeFirestoreClient()
+        self.auth = AuthService(self.client)
+        self.ana_sessions = [self.auth.create_session(ANA) for _ in range(3)]
+        self.beto_session = self.auth.create_session(BETO)
+
+    def indexed(self, user_id):
+        return (self.client.collections["user_sessions"].get(user_id) or {}).get("session_ids")
+
+    def test_sessions_are_indexed_per_user(self):
+        self.assertEqual(self.indexed("ana"), self.ana_sessions)
+        self.auth.delete_session(self.ana_sessions[0])
+        self.assertEqual(self.indexed("ana"), self.ana_sessions[1:])
+
+    def test_role_refresh_uses_one_batch(self):
+        self.client.batch_commits = 0
+        self.assertEqual(self.auth.refresh_user_sessions("ana", {"role": "user"}), 3)
+        self.assertEqual(self.client.batch_commits, 1)
+        sessions = self.client.collections["sessions"]
+        self.assertEqual({sessions[sid]["role"] for sid in self.ana_sessions}, {"user"})
+        self.assertEqual(sessions[self.beto_session]["role"], "user")
+
+    def test_revocation_deletes_sessions_and_index(self):
+        # una sesión que ya no existe sólo se quita del índice
+        del self.client.collections["sessions"][self.ana_sessions[0]]
+        self.assertEqual(self.auth.refresh_user_sessions("ana", {"role": "user"}), 2)
+        self.assertEqual(self.indexed("ana"), self.ana_sessions[1:])
+
+        self.assertEqual(self.auth.refresh_user_sessions("ana", None), 2)
+        self.assertEqual(list(self.client.collections["sessions"]), [self.beto_session])
+        self.assertNotIn("ana", self.client.collections["user_sessions"])
+
+    def test_sessions_opened_before_the_index_are_found_and_indexed(self):
+        expires = datetime.now(timezone.utc) + timedelta(hours=1)
+        self.client.collection("sessions").document("legacy").set(
+            {"user_id": "ana", "email": ANA["email"], "role": "admin", "expires_at": expires}
+        )
+        self.assertEqual(self.auth.refresh_user_sessions("ana", {"role": "user"}), 4)
+        self.assertEqual(self.client.collections["sessions"]["legacy"]["role"], "user")
+        self.assertEqual(self.indexed("ana"), self.ana_sessions + ["legacy"])
+        self.assertTrue(self.client.collections["user_sessions"]["ana"]["backfilled"])
+
+        # con el índice completo ya no se consulta por ``user_id``
+        self.client.calls.clear()
+        self.assertEqual(self.auth.refresh_user_sessions("ana", {"role": "admin"}), 4)
+        self.assertNotIn("stream", [c[0] for c in self.client.calls])
+
+        self.assertEqual(self.auth.refresh_user_sessions("ana", None), 4)
+        self.assertNotIn("legacy", self.client.collections["sessions"])
+
+    def test_session_deleted_before_the_commit_is_skipped(self):
+        get_all = self.client.get_all
+
+        def get_all_then_logout(refs, **kwargs):
+            docs = list(get_all(refs, **kwargs))
+            # logout concurrente entre la lectura y el batch
+            self.client.collections["sessions"].pop(self.ana_sessions[0], None)
+            return iter(docs)
+
+        self.client.get_all = get_all_then_logout
+        self.assertEqual(self.auth.refresh_user_sessions("ana", {"role": "user"}), 3)
+        sessions = self.client.collections["sessions"]
+        self.assertNotIn(self.ana_sessions[0], sessions)
+        self.assertEqual({sessions[sid]["role"] for sid in self.ana_sessions[1:]}, {"user"})
+
+    def test_sweeper_removes_index_entries(self):
+        expired = datetime.now(timezone.utc) - timedelta(hours=1)
+        for sid in self.ana_sessions[:2]:
+            self.client.collections["sessions"][sid]["expires_at"] = expired
+        sweeper = SessionSweeper(self.client, build_settings(), logging.getLogger("test"))
+        self.assertEqual(sweeper.sweep()["removed"], 2)
+        self.assertEqual(self.indexed("ana"), self.ana_sessions[2:])
+        self.assertEqual(self.indexed("beto"), [self.beto_session])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Indexa en ``user_emails`` a los usuarios creados antes del índice de emails.
+
+Uso::
+
+    python scripts/backfill_email_index.py
+
+Recorre ``users`` de a páginas y crea la entrada ``email_key -> user_id`` que falte.
+Si no hay conflictos (dos usuarios cuyos emails sólo difieren en mayúsculas/espacios,
+o emails inválidos) deja la marca ``user_emails/_backfill``: desde ahí el login y la
+importación resuelven los emails sólo con el índice, sin consultar ``users``.
+Con conflictos los lista y sale con código 1; se puede volver a correr tras resolverlos.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.firestore import get_firestore_client  # noqa: E402
+from app.services.email_index import EmailIndex  # noqa: E402
+
+
+def main() -> int:
+    settings = get_settings()
+    db = get_firestore_client(settings.gcp_project or None, settings.firestore_db or None)
+    print("PROJECT:", db.project, "| DATABASE:", db._database)
+
+    index = EmailIndex(db, settings.user_emails_collection, settings.users_collection)
+    if index.is_backfilled():
+        print("✅ El índice de emails ya está completo")
+        return 0
+    result = index.backfill_all(log=lambda line: print(f"⏳ {line}"))
+    if result["conflicts"]:
+        for conflict in result["conflicts"]:
+            print(f"⚠️  {conflict['user_id']} ({conflict['email']!r}) choca con {conflict['indexed_user_id']}")
+        print(f"❌ {len(result['conflicts'])} usuario(s) sin indexar: resolverlos y volver a correr")
+        return 1
+    print(f"🎉 Índice de emails completo ({result['indexed']} usuarios)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
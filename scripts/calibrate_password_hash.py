@@ -0,0 +1,90 @@
+"""Calibra el costo del hash de passwords (pbkdf2_sha256) para este hardware.
+
+Uso::
+
+    python scripts/calibrate_password_hash.py                 # sólo mide y sugiere
+    python scripts/calibrate_password_hash.py --target-ms 250 --write
+
+Mide cuánto tarda un hash con unas rounds de referencia, extrapola (el costo de
+pbkdf2 es lineal en las rounds) y verifica el resultado con una segunda medición.
+Con ``--write`` guarda ``password_hash_rounds`` en la sección ``[General]`` del INI
+(``app/config.ini`` por defecto). La API rehashea en el próximo login los hashes hechos
+con otro costo, sin forzar cambios de password.
+"""
+
+from __future__ import annotations
+
+import argparse
+import configparser
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from passlib.hash import pbkdf2_sha256  # noqa: E402
+
+# Rounds con las que se toma la medición inicial.
+PROBE_ROUNDS = 20000
+# Las rounds sugeridas se redondean a este múltiplo.
+ROUNDS_STEP = 1000
+# Mínimo razonable aunque el hardware sea muy rápido para el presupuesto pedido.
+MIN_ROUNDS = 10000
+DEFAULT_CONFIG = ROOT / "app" / "config.ini"
+
+
+def measure_ms(rounds: int, samples: int = 5) -> float:
+    """Mediana (ms) de ``samples`` hashes con ``rounds``."""
+    hasher = pbkdf2_sha256.using(rounds=rounds)
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibracion-password")
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def calibrate(target_ms: float, samples: int = 5) -> tuple[int, float]:
+    """Rounds cuyo hash tarda aproximadamente ``target_ms`` y su tiempo medido."""
+    per_round = measure_ms(PROBE_ROUNDS, samples) / PROBE_ROUNDS
+    rounds = max(MIN_ROUNDS, int(target_ms / per_round) // ROUNDS_STEP * ROUNDS_STEP)
+    return rounds, measure_ms(rounds, samples)
+
+
+def write_rounds(config_path: Path, rounds: int) -> None:
+    cfg = configparser.ConfigParser()
+    cfg.read(config_path)
+    if not cfg.has_section("General"):
+        cfg.add_section("General")
+    cfg.set("General", "password_hash_rounds", str(rounds))
+    with config_path.open("w", encoding="utf-8") as f:
+        cfg.write(f)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibra las rounds de pbkdf2_sha256 para un presupuesto de latencia.")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="tiempo objetivo por hash (default 250 ms)")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--write", action="store_true", help="guarda las rounds en el INI")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG)
+    args = parser.parse_args(argv)
+
+    default_rounds = pbkdf2_sha256.default_rounds
+    print(f"⏱️  Default de passlib: {default_rounds} rounds -> {measure_ms(default_rounds, args.samples):.1f} ms por hash")
+
+    rounds, elapsed = calibrate(args.target_ms, args.samples)
+    print(f"🎯 Objetivo {args.target_ms:.0f} ms -> {rounds} rounds ({elapsed:.1f} ms medidos)")
+
+    if args.write:
+        write_rounds(args.config, rounds)
+        print(f"✅ password_hash_rounds = {rounds} guardado en {args.config}")
+    else:
+        print(f"Para aplicarlo: PASSWORD_HASH_ROUNDS={rounds} o --write para guardarlo en {args.config}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Importación masiva de usuarios desde CSV o NDJSON.
+
+Uso::
+
+    python scripts/import_users.py usuarios.csv
+    python scripts/import_users.py usuarios.ndjson --workers 8 --batch-size 250
+
+Columnas / claves: ``email``, ``full_name``, ``password``, ``role`` (``admin``/``user``,
+default ``user``) e ``is_active`` (default ``true``).
+
+- El archivo se lee en streaming, de a ``--batch-size`` filas.
+- Los hashes de password se calculan en un pool de procesos (un proceso por core).
+- Los usuarios existentes se resuelven con lecturas en lote del índice ``user_emails``.
+  Si el índice todavía no incorporó a los usuarios previos, antes de importar se corre
+  ``EmailIndex.backfill_all`` (como ``scripts/backfill_email_index.py``): una búsqueda por
+  igualdad en ``users`` no encuentra ``Ana@Example.com`` al importar ``ana@example.com``
+  y el usuario quedaría duplicado.
+- Cada lote se escribe con un único batch (usuario + entrada del índice).
+- A los usuarios existentes se les actualizan las sesiones abiertas (rol, nombre) o se
+  les revocan si quedan inactivos, como al editarlos desde la API.
+- Los errores por fila van a ``<archivo>.errors.ndjson`` y el avance a
+  ``<archivo>.checkpoint.json``: si la corrida se corta, volver a ejecutar el mismo
+  comando retoma desde el último lote escrito (``--restart`` empieza de cero).
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.auth_service import AuthService, get_pwd_context  # noqa: E402
+from app.services.email_index import EmailIndex, email_key, email_variants  # noqa: E402
+
+ROLES = ("admin", "user")
+# Cada usuario son dos escrituras (users + user_emails) y un batch admite 500.
+MAX_BATCH_ROWS = 250
+# Máximo de valores de un filtro ``in`` de Firestore.
+IN_QUERY_LIMIT = 30
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "si", "sí", "s"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+
+# -----------------------------------------------------------------------------
+# Lectura y validación
+# -----------------------------------------------------------------------------
+def read_rows(path: Path, fmt: str | None = None) -> Iterator[tuple[int, dict]]:
+    """Devuelve ``(número de fila, datos)`` sin cargar el archivo en memoria."""
+    fmt = fmt or ("ndjson" if path.suffix.lower() in (".ndjson", ".jsonl") else "csv")
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                yield number, row
+            return
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                yield number, {}
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, {"_error": f"JSON inválido: {e.msg}"}
+                continue
+            yield number, data if isinstance(data, dict) else {"_error": "La línea no es un objeto JSON"}
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else "").strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"is_active inválido: {value!r}")
+
+
+def validate(row: dict) -> dict:
+    """Normaliza una fila; lanza ``ValueError`` con el motivo si no es válida."""
+    if row.get("_error"):
+        raise ValueError(row["_error"])
+    email = str(row.get("email") or "").strip()
+    if "@" not in email or "/" in email or " " in email:
+        raise ValueError(f"Email inválido: {email!r}")
+    full_name = str(row.get("full_name") or "").strip()
+    if not full_name or len(full_name) > 200:
+        raise ValueError("full_name es obligatorio (máx. 200 caracteres)")
+    password = str(row.get("password") or "")
+    if not 6 <= len(password) <= 200:
+        raise ValueError("password debe tener entre 6 y 200 caracteres")
+    role = str(row.get("role") or "user").strip().lower()
+    if role not in ROLES:
+        raise ValueError(f"role inválido: {role!r}")
+    value = row.get("is_active")
+    is_active = True if value is None or value == "" else _parse_bool(value)
+    return {"email": email, "full_name": full_name, "password": password, "role": role, "is_active": is_active}
+
+
+def session_profile(user: dict) -> dict | None:
+    """Perfil a embeber en las sesiones del usuario (``None`` si quedó inactivo)."""
+    if not user["is_active"]:
+        return None
+    return {"email": user["email"], "full_name": user["full_name"], "role": user["role"]}
+
+
+def hash_password(password: str, rounds: int = 0) -> str:
+    return get_pwd_context(rounds).hash(password)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+# -----------------------------------------------------------------------------
+# Checkpoint
+# -----------------------------------------------------------------------------
+class Checkpoint:
+    """Avance persistido (filas ya procesadas y totales) para retomar la importación."""
+
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        self.source = str(source.resolve())
+        self.state = {"source": self.source, "rows_done": 0, "created": 0, "updated": 0, "errors": 0}
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        state = json.loads(self.path.read_text(encoding="utf-8"))
+        if state.get("source") != self.source:
+            raise SystemExit(f"El checkpoint {self.path} es de otro archivo ({state.get('source')}); usá --restart")
+        self.state.update(state)
+        return True
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+# -----------------------------------------------------------------------------
+# Importación
+# -----------------------------------------------------------------------------
+class UserImporter:
+    """Escribe lotes de filas validadas en ``users`` y el índice ``user_emails``."""
+
+    def __init__(
+        self,
+        db,
+        *,
+        hasher: Callable[[list[str]], list[str]],
+        users_collection: str = "users",
+        emails_collection: str = "user_emails",
+        auth: AuthService | None = None,
+    ):
+        self.db = db
+        self.hasher = hasher
+        # Sesiones de los usuarios actualizados (``None``: no se tocan)
+        self.auth = auth
+        self.users = db.collection(users_collection)
+        self.emails = db.collection(emails_collection)
+        self.index = EmailIndex(db, emails_collection, users_collection)
+
+    def resolve(self, emails: list[str]) -> dict[str, str]:
+        """``email_key -> user_id`` de los usuarios que ya existen (lecturas en lote)."""
+        keys = list(dict.fromkeys(email_key(e) for e in emails))
+        found = {}
+        for doc in self.db.get_all([self.emails.document(k) for k in keys]):
+            user_id = (doc.to_dict() or {}).get("user_id") if doc.exists else None
+            if user_id:
+                found[doc.id] = user_id
+
+        if self.index.is_backfilled():
+            return found
+        # Usuarios creados antes del índice de emails (sólo encuentra variantes triviales:
+        # ``main`` completa el índice antes de importar)
+        missing = [e for e in dict.fromkeys(emails) if email_key(e) not in found]
+        variants = list(dict.fromkeys(v for e in missing for v in email_variants(e)))
+        for part in chunked(variants, IN_QUERY_LIMIT):
+            for doc in self.users.where("email", "in", part).stream():
+                found.setdefault(email_key((doc.to_dict() or {}).get("email")), doc.id)
+        return found
+
+    def import_chunk(self, rows: list[tuple[int, dict]]) -> dict:
+        """Valida, hashea y escribe un lote. Devuelve totales y errores por fila."""
+        result = {"created": 0, "updated": 0, "errors": []}
+        valid, seen = [], set()
+        for number, row in rows:
+            try:
+                user = validate(row)
+                key = email_key(user["email"])
+                if key in seen:
+                    raise ValueError("Email repetido en el lote")
+                seen.add(key)
+                valid.append((number, user))
+            except ValueError as e:
+                result["errors"].append({"row": number, "email": row.get("email"), "error": str(e)})
+        if not valid:
+            return result
+
+        existing = self.resolve([user["email"] for _, user in valid])
+        hashes = self.hasher([user["password"] for _, user in valid])
+
+        now = datetime.now(timezone.utc)
+        batch = self.db.batch()
+        updated: dict[str, dict | None] = {}
+        for (_, user), password_hash in zip(valid, hashes):
+            key = email_key(user["email"])
+            data = {
+                "email": user["email"],
+                "full_name": user["full_name"],
+                "role": user["role"],
+                "password_hash": password_hash,
+                "is_active": user["is_active"],
+                "updated_at": now,
+            }
+            user_id = existing.get(key)
+            if user_id:
+                ref = self.users.document(user_id)
+                result["updated"] += 1
+                updated[user_id] = session_profile(user)
+            else:
+                ref = self.users.document()
+                data["created_at"] = now
+                result["created"] += 1
+            batch.set(ref, data, merge=True)
+            batch.set(self.emails.document(key), {"email": key, "user_id": ref.id, "updated_at": now})
+        batch.commit()
+
+        # Después del commit: si algo falla acá el lote no queda en el checkpoint y se
+        # reintenta completo al retomar (las escrituras son idempotentes).
+        if self.auth is not None:
+            for user_id, profile in updated.items():
+                self.auth.refresh_user_sessions(user_id, profile)
+        return result
+
+
+def run_import(
+    importer: UserImporter,
+    rows: Iterable[tuple[int, dict]],
+    checkpoint: Checkpoint,
+    errors_path: Path,
+    *,
+    batch_size: int = MAX_BATCH_ROWS,
+    log: Callable[[str], None] = print,
+) -> dict:
+    """Procesa ``rows`` desde el checkpoint, guardando avance tras cada lote."""
+    state = checkpoint.state
+    skip = state["rows_done"]
+    started = time.monotonic()
+    processed = 0
+    with errors_path.open("a", encoding="utf-8") as errors_file:
+        for chunk in chunked(islice(rows, skip, None), min(batch_size, MAX_BATCH_ROWS)):
+            result = importer.import_chunk(chunk)
+            for error in result["errors"]:
+                errors_file.write(json.dumps(error, ensure_ascii=False) + "\n")
+            errors_file.flush()
+
+            processed += len(chunk)
+            state["rows_done"] += len(chunk)
+            state["created"] += result["created"]
+            state["updated"] += result["updated"]
+            state["errors"] += len(result["errors"])
+            checkpoint.save()
+
+            rate = processed / max(time.monotonic() - started, 1e-6)
+            log(
+                f"⏳ {state['rows_done']} filas | {state['created']} creados | {state['updated']} actualizados | "
+                f"{state['errors']} con error | {rate:.0f} filas/s"
+            )
+    return state
+
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Importa usuarios desde CSV o NDJSON a Firestore.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: según la extensión")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_ROWS, help=f"filas por lote (máx. {MAX_BATCH_ROWS})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos para hashear passwords")
+    parser.add_argument("--restart", action="store_true", help="ignora el checkpoint y empieza de cero")
+    args = parser.parse_args(argv)
+
+    from app.core.config import get_settings
+    from app.core.firestore import get_firestore_client
+
+    settings = get_settings()
+    db = get_firestore_client(settings.gcp_project or None, settings.firestore_db or None)
+    print("PROJECT:", db.project, "| DATABASE:", db._database)
+
+    checkpoint = Checkpoint(args.path.with_name(args.path.name + ".checkpoint.json"), args.path)
+    errors_path = args.path.with_name(args.path.name + ".errors.ndjson")
+    if args.restart:
+        checkpoint.clear()
+        errors_path.unlink(missing_ok=True)
+    elif checkpoint.load():
+        print(f"🔁 Retomando desde la fila {checkpoint.state['rows_done'] + 1}")
+
+    index = EmailIndex(db, settings.user_emails_collection, settings.users_collection)
+    if not index.is_backfilled():
+        print("🔎 Indexando los emails de los usuarios previos al índice...")
+        backfill = index.backfill_all(log=print)
+        if backfill["conflicts"]:
+            for conflict in backfill["conflicts"]:
+                print(f"⚠️  {conflict['user_id']} ({conflict['email']!r}) choca con {conflict['indexed_user_id']}")
+            raise SystemExit("Hay usuarios con emails repetidos o inválidos: resolverlos antes de importar")
+
+    hash_with_rounds = partial(hash_password, rounds=settings.password_hash_rounds)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        def hasher(passwords: list[str]) -> list[str]:
+            chunksize = max(1, len(passwords) // (args.workers * 4))
+            return list(pool.map(hash_with_rounds, passwords, chunksize=chunksize))
+
+        importer = UserImporter(
+            db,
+            hasher=hasher,
+            users_collection=settings.users_collection,
+            emails_collection=settings.user_emails_collection,
+            auth=AuthService(
+                db,
+                users_collection=settings.users_collection,
+                emails_collection=settings.user_emails_collection,
+                user_sessions_collection=settings.user_sessions_collection,
+            ),
+        )
+        state = run_import(
+            importer, read_rows(args.path, args.format), checkpoint, errors_path, batch_size=args.batch_size
+        )
+
+    print(f"🎉 Importación completa: {state['created']} creados, {state['updated']} actualizados, {state['errors']} con error")
+    if state["errors"]:
+        print(f"⚠️  Detalle de errores en {errors_path}")
+    checkpoint.clear()
+    return 1 if state["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,20 @@
+import sys
 from datetime import datetime, timezone
+from pathlib import Path
 
 from google.cloud import firestore
-from passlib.context import CryptContext
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.core.config import get_settings  # noqa: E402
+from app.services.auth_service import get_pwd_context  # noqa: E402
 
 # -----------------------------------------------------------------------------
-# Password hashing (DEBE coincidir con AuthService)
+# Password hashing (el mismo contexto y costo que AuthService)
 # -----------------------------------------------------------------------------
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto"
-)
+pwd_context = get_pwd_context(get_settings().password_hash_rounds)
 
 # -----------------------------------------------------------------------------
 # Firestore client
@@ -24,12 +29,19 @@ print("PROJECT:", db.project, "| DATABASE:", db._database)
 # -----------------------------------------------------------------------------
 def upsert_user(*, email: str, full_name: str, password: str, role: str) -> None:
     users = db.collection("users")
-
-    existing = list(
-        users.where("email", "==", email)
-             .limit(1)
-             .stream()
-    )
+    # Índice único email -> user_id (mismo formato que app/services/email_index.py)
+    email_ref = db.collection("user_emails").document(email.strip().lower())
+
+    entry = email_ref.get()
+    user_id = (entry.to_dict() or {}).get("user_id") if entry.exists else None
+    if not user_id:
+        # Usuarios creados antes del índice
+        existing = list(
+            users.where("email", "==", email)
+                 .limit(1)
+                 .stream()
+        )
+        user_id = existing[0].id if existing else None
 
     now = datetime.now(timezone.utc)
     password_hash = pwd_context.hash(password)
@@ -44,13 +56,18 @@ def upsert_user(*, email: str, full_name: str, password: str, role: str) -> None
         "updated_at": now,
     }
 
-    if existing:
-        doc = existing[0]
-        users.document(doc.id).set(data, merge=True)
-        print(f"🔁 Updated user: {email} (docId={doc.id})")
+    created = user_id is None
+    user_ref = users.document() if created else users.document(user_id)
+
+    batch = db.batch()
+    batch.set(user_ref, data, merge=True)
+    batch.set(email_ref, {"email": email.strip().lower(), "user_id": user_ref.id, "updated_at": now})
+    batch.commit()
+
+    if created:
+        print(f"🆕 Created user: {email} (docId={user_ref.id})")
     else:
-        doc_ref = users.add(data)
-        print(f"🆕 Created user: {email} (docId={doc_ref[1].id})")
+        print(f"🔁 Updated user: {email} (docId={user_ref.id})")
 
 
 # -----------------------------------------------------------------------------